@@ -0,0 +1,77 @@
+import numpy as np
+from quafu import QuantumCircuit
+from quafu import Task
+
+from quafu_runtime.program.batch import BatchedTask
+from quafu_runtime.program.expectation import energy
+from quafu_runtime.program.hamiltonian import PauliHamiltonian
+from quafu_runtime.program.shots import ShotAllocator
+from quafu_runtime.program.templates.parametric import ParametricCircuit
+
+
+HAMILTONIAN = PauliHamiltonian.from_list([-1.0537157499303196, [], 0.3939591228374733, ['Z0'], 0.39395912283747336, ['Z1'],
+    0.011236311320494491, ['Z0', 'Z1'], 0.18129104765420154, ['X0', 'X1']])
+NUM_Q=2
+NUM_LAYER=1
+NUM_PARAMS=NUM_Q * (2 * NUM_LAYER + 1)
+
+# circuit for h2 in 2 qubits
+def ry_cascade(nqubits, nlayer, params):
+    c = QuantumCircuit(nqubits)
+    for i in range(nqubits):
+        c.x(i)
+    count = 0
+    for i in range(nqubits):
+        c.ry(i, params[count])
+        count += 1
+    for _ in range(1, nlayer+1):
+        for i in range(nqubits-1):
+            c.cnot(i, i+1)
+        for i in range(nqubits):
+            c.ry(i, params[count])
+            count += 1
+        for i in range(nqubits-1):
+            c.cnot(i, i+1)
+        for i in range(nqubits):
+            c.ry(i, params[count])
+            count += 1
+    return c
+
+# one measurement circuit per group of qubit-wise commuting terms, built once
+TEMPLATES = [
+    ParametricCircuit(lambda params, g=g: g.apply(ry_cascade(NUM_Q, NUM_LAYER, params)), NUM_PARAMS)
+    for g in HAMILTONIAN.groups()
+]
+
+def measure(points, batched: BatchedTask, allocator: ShotAllocator):
+    """energies of many parameter sets, all circuits sent as one batch"""
+    shots = allocator.allocate()
+    circuits = [t.bind(p) for p in points for t in TEMPLATES]
+    results = batched.run(circuits, shots=shots * len(points))
+    counts = [res.res for res in results]
+    n = len(TEMPLATES)
+    allocator.update(counts[:n])
+    return [energy(HAMILTONIAN, counts[i:i + n]) for i in range(0, len(counts), n)]
+
+def parameter_shift(params, batched, allocator):
+    shifted = np.concatenate((params + np.pi/2 * np.eye(len(params)), params - np.pi/2 * np.eye(len(params))))
+    values = np.array([value for value, _ in measure(shifted, batched, allocator)])
+    amps_grad = 0.5 * (values[:len(params)] - values[len(params):])
+    return params - amps_grad
+
+def run(task: Task, userpub, params):
+    params = np.random.uniform(-2*np.pi, 2*np.pi, NUM_PARAMS)
+
+    # shots of one energy, split across the groups by their variance
+    total_shots = 300
+    task.config(backend="ScQ-P18", shots=total_shots, compile=True)
+    batched = BatchedTask(task, max_in_flight=16)
+    allocator = ShotAllocator(HAMILTONIAN, total_shots=total_shots, min_shots=20)
+
+    energys = []
+    for i in range(10):
+        params = parameter_shift(params, batched, allocator)
+        energy_, error = measure([params], batched, allocator)[0]
+        print(f'{i} iterations, energy: {energy_:.10f} +- {error:.10f}')
+        energys.append(energy_)
+    return energys, params.tolist()
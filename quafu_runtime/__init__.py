@@ -5,9 +5,45 @@ Classes
    RuntimeJob
    RuntimeProgram
    Account
+
+Submodules are loaded lazily, on first access to one of the names above, so
+that importing the package stays cheap for short-lived scripts.
+
+Set the ``QUAFU_RUNTIME_PROFILE`` environment variable to profile the client
+operations, see :mod:`quafu_runtime.profiling`.
 """
-from .quafu_runtime_service import RuntimeService
-from .program.program import RuntimeProgram
-from .job.job import RuntimeJob
-from .clients.account import Account
+import importlib
+import os
+
 from .rtexceptions import rtexceptions
+
+# Public name -> (module, attribute). An attribute of None means the module itself.
+_LAZY_ATTRS = {
+    "RuntimeService": (".quafu_runtime_service", "RuntimeService"),
+    "RuntimeProgram": (".program.program", "RuntimeProgram"),
+    "RuntimeJob": (".job.job", "RuntimeJob"),
+    "Account": (".clients.account", "Account"),
+    "profiling": (".profiling", None),
+}
+
+__all__ = list(_LAZY_ATTRS) + ["rtexceptions"]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_ATTRS[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if os.environ.get("QUAFU_RUNTIME_PROFILE"):
+    from . import profiling
+
+    profiling.enable_from_env()
@@ -1,9 +1,35 @@
 import os
-from typing import Optional
+import threading
+from typing import Dict, List, Optional, Tuple
 
 from ..rtexceptions.rtexceptions import UserException
 from ..utils.base import get_homedir
 
+# Account config file path -> (modification time, lines), shared by all accounts.
+_config_cache: Dict[str, Tuple[int, List[str]]] = {}
+_config_lock = threading.Lock()
+
+
+def _read_config(path: str) -> List[str]:
+    """Read an account config file, reusing the cached lines while it is unchanged.
+
+    Args:
+        path: Path of the config file.
+
+    Returns:
+        Lines of the file.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    with _config_lock:
+        cached = _config_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r") as f:
+        lines = f.readlines()
+    with _config_lock:
+        _config_cache[path] = (mtime, lines)
+    return lines
+
 
 class Account:
     """Class of Account.
@@ -19,17 +45,17 @@ class Account:
         Args:
             api_token: Api Token.
         """
+        # self._url = "http://quafu.baqis.ac.cn/"
+        # self._url = "http://58.205.216.42:5050/"
+        # self._url_ws = "ws://58.205.216.42:8760"
+        # self._url = "http://192.168.220.55:5050/"
+        # self._url_ws = "ws://192.168.220.55:8760"
+        self._url = "http://119.3.224.187:5050/"
+        self._url_ws = "ws://119.3.224.187:8760"
         if api_token is None:
             self.load_account()
         else:
             self._token = api_token
-            # self._url = "http://quafu.baqis.ac.cn/"
-            # self._url = "http://58.205.216.42:5050/"
-            # self._url_ws = "ws://58.205.216.42:8760"
-            # self._url = "http://192.168.220.55:5050/"
-            # self._url_ws = "ws://192.168.220.55:8760"
-            self._url = "http://119.3.224.187:5050/"
-            self._url_ws = "ws://119.3.224.187:8760"
 
     def save_api_token(self, api_token: str):
         """Save your api_token that associates your quafu account.
@@ -45,14 +71,15 @@ class Account:
         with open(file_dir + "api", "w") as f:
             f.write(self._token + "\n")
             # f.write("http://quafu.baqis.ac.cn/")
+        with _config_lock:
+            _config_cache.pop(file_dir + "api", None)
 
     def load_account(self) -> None:
         """Load your Quafu account."""
         homedir = get_homedir()
         file_dir = homedir + "/.quafu/"
         try:
-            f = open(file_dir + "api", "r")
-            data = f.readlines()
+            data = _read_config(file_dir + "api")
             self._token = data[0].strip("\n")
             # self._url = data[1].strip("\n")
         except Exception as e:
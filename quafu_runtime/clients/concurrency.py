@@ -0,0 +1,202 @@
+"""Adaptive concurrency control of the runtime client requests."""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Status codes telling the server is overloaded.
+OVERLOAD_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limiter of the number of requests in flight.
+
+    The limit grows additively, by ``increase`` per ``limit`` healthy
+    requests, so about once per round of requests. It shrinks
+    multiplicatively by ``decrease_factor`` when a request fails, gets an
+    overload status (429, 5xx) or takes longer than ``latency_tolerance``
+    times the baseline latency of its endpoint. The baseline is a moving
+    average of the healthy latencies of the endpoint, so slow endpoints like
+    uploads are not taken for spikes of the fast ones.
+
+    Requests started before the last decrease do not decrease the limit
+    again, so a burst of errors backs off only once.
+
+    Usage::
+
+        limiter = AdaptiveConcurrencyLimiter(max_limit=32)
+        with limiter.slot() as slot:
+            response = send_request()
+            slot.status_code = response.status_code
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        smoothing: float = 0.1,
+    ):
+        """AdaptiveConcurrencyLimiter constructor.
+
+        Args:
+            initial_limit: Initial number of requests allowed in flight.
+            min_limit: Lower bound of the limit.
+            max_limit: Upper bound of the limit.
+            increase: Additive increase per round of healthy requests.
+            decrease_factor: Multiplicative decrease on errors and latency spikes.
+            latency_tolerance: Latency above this multiple of the baseline is a spike.
+            smoothing: Weight of a new sample in the baseline latency average.
+        """
+        if not 0 < min_limit <= max_limit:
+            raise ValueError("Limits must satisfy 0 < min_limit <= max_limit.")
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._increase = increase
+        self._decrease_factor = decrease_factor
+        self._latency_tolerance = latency_tolerance
+        self._smoothing = smoothing
+        self._baselines: Dict[Optional[str], float] = {}
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._successes = 0
+        self._errors = 0
+        self._decreases = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        with self._cond:
+            return int(self._limit)
+
+    @property
+    def max_limit(self) -> int:
+        """Upper bound of the limit."""
+        return self._max_limit
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests in flight."""
+        with self._cond:
+            return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Wait for a free slot.
+
+        Args:
+            timeout: Max seconds to wait. Wait forever if ``None``.
+
+        Returns:
+            Start time of the request, to pass to :meth:`release`.
+
+        Raises:
+            TimeoutError: If no slot was freed in time.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._in_flight < int(self._limit), timeout=timeout
+            ):
+                raise TimeoutError("No request slot available in time.")
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(
+        self,
+        start: float,
+        status_code: Optional[int] = None,
+        error: bool = False,
+        latency_sample: bool = True,
+        endpoint: Optional[str] = None,
+    ) -> None:
+        """Free a slot and adapt the limit to the outcome of the request.
+
+        Args:
+            start: Value returned by :meth:`acquire`.
+            status_code: Status code of the response, the one of the body if
+                the server reports errors there.
+            error: Whether the request failed without a response.
+            latency_sample: Whether the latency of the request reflects the
+                server load. ``False`` for long polls.
+            endpoint: Endpoint of the request, the latency is compared to the
+                baseline of its endpoint.
+        """
+        latency = time.monotonic() - start
+        with self._cond:
+            self._in_flight -= 1
+            overloaded = error or status_code in OVERLOAD_STATUS_CODES
+            baseline = self._baselines.get(endpoint)
+            if latency_sample and not overloaded and baseline is not None:
+                overloaded = latency > self._latency_tolerance * baseline
+            if overloaded:
+                self._errors += 1
+                if start >= self._last_decrease:
+                    self._limit = max(
+                        self._min_limit, self._limit * self._decrease_factor
+                    )
+                    self._last_decrease = time.monotonic()
+                    self._decreases += 1
+            else:
+                self._successes += 1
+                if latency_sample:
+                    self._baselines[endpoint] = (
+                        latency
+                        if baseline is None
+                        else (1 - self._smoothing) * baseline + self._smoothing * latency
+                    )
+                self._limit = min(
+                    self._max_limit, self._limit + self._increase / self._limit
+                )
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self,
+        timeout: Optional[float] = None,
+        latency_sample: bool = True,
+        endpoint: Optional[str] = None,
+    ) -> Iterator["_Slot"]:
+        """Hold a slot during the ``with`` block.
+
+        Set ``status_code`` on the yielded object to report the response.
+        An exception raised in the block counts as an error.
+
+        Args:
+            timeout: Max seconds to wait for the slot.
+            latency_sample: Whether the latency reflects the server load.
+            endpoint: Endpoint of the request.
+        """
+        holder = _Slot()
+        start = self.acquire(timeout=timeout)
+        try:
+            yield holder
+        except BaseException:
+            self.release(start, error=True, latency_sample=latency_sample, endpoint=endpoint)
+            raise
+        self.release(
+            start, holder.status_code, latency_sample=latency_sample, endpoint=endpoint
+        )
+
+    def stats(self) -> dict:
+        """Return the state of the limiter."""
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "baseline_latency": dict(self._baselines),
+                "successes": self._successes,
+                "errors": self._errors,
+                "decreases": self._decreases,
+            }
+
+
+class _Slot:
+    """Outcome of a request holding a limiter slot."""
+
+    def __init__(self):
+        self.status_code: Optional[int] = None
@@ -0,0 +1,439 @@
+"""In-process stand-in of the Quafu runtime server.
+
+:class:`LocalRuntimeServer` implements the runtime HTTP API in memory and
+runs programs in local threads. Plug it into a client through its session
+factory, to develop programs or test drivers without a server::
+
+    server = LocalRuntimeServer()
+    client = RuntimeClient("token", "http://local", session_factory=server.session)
+    service = RuntimeService(Account("token"), api_client=client)
+
+    program_id = service.upload_program("examples/program_source/hello.py",
+                                        metadata={"name": "hello", "backend": "py_simu"})
+    print(service.run(program_id=program_id).result(wait=True))
+
+Programs get ``task_factory()`` as ``task`` (``None`` by default) and a
+:class:`LocalUserPub` as ``userpub``.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import threading
+import time
+import traceback
+import uuid
+from concurrent import futures
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+from .runtime_client import BLOB_NOT_FOUND, IDEMPOTENCY_HEADER
+from ..job.decoder import interim_channel
+from ..utils.jsonutil import encode_checkpoint, params_hash
+
+# Job status codes of the runtime API.
+QUEUED, RUNNING, DONE, CANCELLED, ERROR = range(5)
+
+
+class LocalResponse:
+    """Minimal ``requests.Response`` stand-in."""
+
+    def __init__(
+        self, body: dict, status_code: int = 200, elapsed: Optional[float] = None
+    ):
+        self.status_code = status_code
+        self._body = body
+        self.content = json.dumps(body).encode("utf-8")
+        # Like requests, the time from sending the request to the response headers.
+        self.elapsed = datetime.timedelta(seconds=elapsed or 0.0)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> dict:
+        return json.loads(self.content)
+
+
+class LocalUserPub:
+    """UserPub of the local server, collecting the published messages of a job."""
+
+    def __init__(self, job: dict):
+        self._job = job
+
+    def publish(self, message: bytes):
+        """Store an interim message of the job."""
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        self._job["interim"].append(message)
+
+    def checkpoint(self, state: Any):
+        """Store the checkpoint of the job, replacing the previous one."""
+        encoded = encode_checkpoint(state)
+        self._job["checkpoint"] = encoded
+        self._job["checkpoints"] += 1
+        self._job["checkpoint_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class LocalSession:
+    """``requests.Session`` compatible object sending requests to a :class:`LocalRuntimeServer`."""
+
+    def __init__(self, server: "LocalRuntimeServer"):
+        self._server = server
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict] = None,
+        data: Optional[str] = None,
+        params: Optional[dict] = None,
+    ) -> LocalResponse:
+        return self._server.handle(method, url, headers or {}, data, params or {})
+
+    def close(self) -> None:
+        pass
+
+
+def _ok(data: Any = None) -> dict:
+    return {"status": 200, "data": data}
+
+
+def _error(status: int, msg: str) -> dict:
+    return {"status": status, "data": None, "msg": msg}
+
+
+class LocalRuntimeServer:
+    """In-memory implementation of the runtime server API."""
+
+    def __init__(
+        self,
+        execute: bool = True,
+        task_factory: Callable[[], Any] = lambda: None,
+        max_workers: int = 4,
+    ):
+        """LocalRuntimeServer constructor.
+
+        Args:
+            execute: Whether to run the submitted programs. If ``False``, jobs stay queued.
+            task_factory: Callable returning the ``task`` given to a program.
+            max_workers: Number of programs run at the same time.
+        """
+        self.execute = execute
+        self.task_factory = task_factory
+        # Number of upcoming responses to drop after handling their request,
+        # to simulate a flaky link.
+        self.lost_responses = 0
+        # Number of upcoming requests answered with status 503 in the body,
+        # as the server does when overloaded, without handling them.
+        self.overloaded = 0
+        self.requests: List[tuple] = []
+        self._programs: Dict[str, dict] = {}
+        self._jobs: Dict[str, dict] = {}
+        self._idempotency: Dict[tuple, tuple] = {}
+        self._blobs: Dict[tuple, Any] = {}
+        self._lock = threading.RLock()
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="local_runtime"
+        )
+
+    def session(self) -> LocalSession:
+        """Return a new session bound to this server. Use it as a client session factory."""
+        return LocalSession(self)
+
+    def handle(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        data: Optional[str],
+        params: dict,
+    ) -> LocalResponse:
+        """Handle one request.
+
+        Raises:
+            ConnectionError: If the response is dropped, see :attr:`lost_responses`.
+        """
+        start = time.monotonic()
+        identifier = urlparse(url).path.rsplit("/", 1)[-1]
+        body = json.loads(data) if data else {}
+        with self._lock:
+            self.requests.append((method, identifier))
+            if self.overloaded > 0:
+                self.overloaded -= 1
+                return LocalResponse(_error(503, "Server overloaded."))
+        handler = getattr(self, f"_handle_{identifier}", None)
+        if handler is None:
+            return LocalResponse({}, status_code=404)
+        response = handler(headers, body, params)
+        with self._lock:
+            if self.lost_responses > 0:
+                self.lost_responses -= 1
+                raise ConnectionError(f"Local runtime: response to {identifier} lost.")
+        return LocalResponse(response, elapsed=time.monotonic() - start)
+
+    def interim_results(self, job_id: str, channels: Optional[Sequence[str]] = None) -> List[str]:
+        """Return the interim messages published so far by a job.
+
+        Args:
+            job_id: Job ID.
+            channels: Channels to return, like the ``channels`` header of the
+                websocket. All if ``None``.
+        """
+        with self._lock:
+            messages = list(self._jobs[job_id]["interim"])
+        if channels is None:
+            return messages
+        return [message for message in messages if interim_channel(message) in channels]
+
+    def jobs(self) -> Dict[str, dict]:
+        """Return the jobs known by the server, keyed by job id."""
+        with self._lock:
+            return dict(self._jobs)
+
+    # Programs
+
+    def _program_info(self, program: dict, with_data: bool = True) -> dict:
+        info = {key: value for key, value in program.items() if key != "data"}
+        if with_data:
+            info["data"] = program["data"]
+        return info
+
+    def _handle_programs_upload(self, headers, body, params):
+        with self._lock:
+            if any(p["name"] == body.get("name") for p in self._programs.values()):
+                return _error(409, "Program with the same name already exists.")
+            program_id = uuid.uuid4().hex
+            self._programs[program_id] = {
+                "program_id": program_id,
+                "name": body.get("name"),
+                "data": body.get("data"),
+                "backend": body.get("backend"),
+                "description": body.get("description"),
+                "cost": body.get("cost"),
+                "is_public": body.get("is_public", 0),
+            }
+        return _ok({"id": program_id})
+
+    def _find_program(self, program_id: Optional[str], name: Optional[str]) -> Optional[dict]:
+        if program_id is not None:
+            return self._programs.get(program_id)
+        for program in self._programs.values():
+            if program["name"] == name:
+                return program
+        return None
+
+    def _handle_program_update(self, headers, body, params):
+        with self._lock:
+            program = self._programs.get(body.get("program_id"))
+            if program is None:
+                return _error(404, "Program not found.")
+            for key in ("data", "name", "description", "cost", "group", "backend"):
+                if key in body:
+                    program[key] = body[key]
+            if "is_public" in body:
+                program["is_public"] = body["is_public"][0]
+            return _ok(self._program_info(program))
+
+    def _handle_program_delete(self, headers, body, params):
+        with self._lock:
+            if self._programs.pop(params.get("program_id"), None) is None:
+                return _error(404, "Program not found.")
+        return _ok({})
+
+    def _handle_programs(self, headers, body, params):
+        limit = int(params.get("limit", 0))
+        offset = int(params.get("offset", 0))
+        with self._lock:
+            programs = [self._program_info(p, False) for p in self._programs.values()]
+        page = programs[offset : offset + limit] if limit else programs[offset:]
+        return _ok({"programs": page, "count": len(programs)})
+
+    def _handle_program(self, headers, body, params):
+        with self._lock:
+            program = self._find_program(params.get("program_id"), params.get("name"))
+            if program is None:
+                return _error(404, "Program not found.")
+            return _ok(self._program_info(program))
+
+    # Params blobs
+
+    def _handle_blob_upload(self, headers, body, params):
+        digest = body.get("hash")
+        if digest != params_hash(body.get("data")):
+            return _error(400, "Hash does not match the blob.")
+        with self._lock:
+            self._blobs[(headers.get("api_token"), digest)] = body["data"]
+        return _ok({"hash": digest})
+
+    def _handle_blob_exists(self, headers, body, params):
+        with self._lock:
+            exists = (headers.get("api_token"), params.get("hash")) in self._blobs
+        return _ok({"exists": exists})
+
+    # Jobs
+
+    def _handle_programs_run_deploy(self, headers, body, params):
+        key = headers.get(IDEMPOTENCY_HEADER)
+        fingerprint = hashlib.sha256(
+            json.dumps(body, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            if key is not None:
+                stored = self._idempotency.get((headers.get("api_token"), key))
+                if stored is not None:
+                    if stored[0] != fingerprint:
+                        return _error(422, "Idempotency key reused with another payload.")
+                    return stored[1]
+            program = self._find_program(body.get("program_id"), body.get("program_name"))
+            if program is None:
+                return _error(404, "Program not found.")
+            job_params = body.get("params")
+            if "params_blob" in body:
+                blob = self._blobs.get((headers.get("api_token"), body["params_blob"]))
+                if blob is None:
+                    return _error(BLOB_NOT_FOUND, "Params blob not found.")
+                job_params = blob if job_params is None else {**blob, **job_params}
+            response = _ok(self._create_job(program, body.get("backend"), job_params))
+            if key is not None:
+                self._idempotency[(headers.get("api_token"), key)] = (
+                    fingerprint,
+                    response,
+                )
+        return response
+
+    def _create_job(self, program: dict, backend: Optional[str], params: Any) -> dict:
+        """Create a job and schedule it. Caller holds the lock."""
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "program_id": program["program_id"],
+            "backend": backend or program["backend"],
+            "params": params,
+            "status": QUEUED,
+            "result": None,
+            "logs": "",
+            "interim": [],
+            "checkpoint": None,
+            "checkpoints": 0,
+            "checkpoint_time": None,
+            "creation_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "finish_time": None,
+            "done": threading.Event(),
+        }
+        self._jobs[job_id] = job
+        if self.execute:
+            self._executor.submit(self._execute, job, program["data"])
+        return {
+            "job_id": job_id,
+            "status": QUEUED,
+            "backend": job["backend"],
+            "program_id": job["program_id"],
+            "creation_time": job["creation_time"],
+        }
+
+    def _execute(self, job: dict, program_data: str) -> None:
+        """Run a program in the calling thread."""
+        with self._lock:
+            if job["status"] != QUEUED:
+                return
+            job["status"] = RUNNING
+        try:
+            namespace: Dict[str, Any] = {"__name__": "__runtime_program__"}
+            source = base64.b64decode(program_data).decode("utf-8")
+            exec(compile(source, f"<program {job['program_id']}>", "exec"), namespace)
+            result = namespace["run"](self.task_factory(), LocalUserPub(job), job["params"])
+            status = DONE
+        except Exception:  # pylint: disable=broad-except
+            result = traceback.format_exc()
+            status = ERROR
+        with self._lock:
+            if job["status"] == RUNNING:
+                job["status"] = status
+                job["result"] = result
+                job["finish_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        job["done"].set()
+
+    def _job(self, body: dict, params: dict) -> Optional[dict]:
+        return self._jobs.get(body.get("job_id") or params.get("job_id"))
+
+    def _job_result(self, job: dict) -> dict:
+        return _ok(
+            {
+                "result": job["result"],
+                "status": job["status"],
+                "finish_time": job["finish_time"],
+            }
+        )
+
+    def _handle_get_result_nowait(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            return self._job_result(job)
+
+    def _handle_get_result_wait(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+        if job is None:
+            return _error(404, "Job not found.")
+        job["done"].wait()
+        with self._lock:
+            return self._job_result(job)
+
+    def _handle_job_status(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            return _ok(
+                {
+                    "status": job["status"],
+                    "result": job["result"],
+                    "finished_time": job["finish_time"],
+                }
+            )
+
+    def _handle_job_logs(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            return _ok({"status": job["status"], "logs": job["logs"]})
+
+    def _handle_job_checkpoint(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            return _ok(
+                {
+                    "checkpoint": job["checkpoint"],
+                    "checkpoints": job["checkpoints"],
+                    "checkpoint_time": job["checkpoint_time"],
+                }
+            )
+
+    def _handle_job_cancel(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            if job["status"] in (QUEUED, RUNNING):
+                job["status"] = CANCELLED
+                job["finish_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                job["done"].set()
+                return _ok({"status": CANCELLED})
+            return _ok({"status": -1})
+
+    def _handle_job_delete(self, headers, body, params):
+        with self._lock:
+            job = self._job(body, params)
+            if job is None:
+                return _error(404, "Job not found.")
+            if job["status"] < DONE:
+                return _ok({"status": job["status"], "deleted": False})
+            del self._jobs[job["job_id"]]
+            return _ok({"status": job["status"], "deleted": True})
@@ -0,0 +1,316 @@
+"""Per-endpoint request metrics of the runtime client."""
+
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class EndpointMetrics:
+    """Metrics collected for a single endpoint identifier.
+
+    Attributes:
+        identifier: Endpoint identifier, e.g. ``programs_run_deploy``.
+        calls: Number of requests sent, retries included.
+        errors: Number of requests that failed without a response.
+        retries: Number of retried requests.
+        request_bytes: Total size of the request bodies.
+        response_bytes: Total size of the response bodies.
+        latency_sum: Sum of the request latencies in seconds.
+        status_codes: Number of responses per HTTP status code.
+    """
+
+    def __init__(self, identifier: str, buckets: Sequence[float]):
+        """EndpointMetrics constructor.
+
+        Args:
+            identifier: Endpoint identifier.
+            buckets: Sorted upper bounds of the latency histogram buckets.
+        """
+        self.identifier = identifier
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.0
+        self.status_codes: Dict[int, int] = {}
+        self._buckets = tuple(buckets)
+        # The last slot counts the observations above the largest bound.
+        self._bucket_counts = [0] * (len(self._buckets) + 1)
+
+    def observe(
+        self,
+        latency: float,
+        status_code: Optional[int],
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+    ) -> None:
+        """Record one request.
+
+        Args:
+            latency: Request latency in seconds.
+            status_code: HTTP status code, ``None`` if no response was received.
+            request_bytes: Size of the request body.
+            response_bytes: Size of the response body.
+        """
+        self.calls += 1
+        self.latency_sum += latency
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        self._bucket_counts[bisect.bisect_left(self._buckets, latency)] += 1
+        if status_code is None:
+            self.errors += 1
+        else:
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def histogram(self) -> List[tuple]:
+        """Return the cumulative latency histogram.
+
+        Returns:
+            A list of ``(upper_bound, cumulative_count)`` tuples, the last
+            upper bound is ``float("inf")``.
+        """
+        histogram = []
+        total = 0
+        for bound, count in zip(self._buckets + (float("inf"),), self._bucket_counts):
+            total += count
+            histogram.append((bound, total))
+        return histogram
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate a latency percentile from the histogram.
+
+        The value is linearly interpolated inside the bucket holding the
+        requested rank, so its precision is bounded by the bucket layout.
+
+        Args:
+            q: Percentile in ``[0, 100]``.
+
+        Returns:
+            Estimated latency in seconds, ``None`` if nothing was recorded.
+        """
+        if self.calls == 0:
+            return None
+        rank = q / 100 * self.calls
+        lower = 0.0
+        seen = 0
+        for bound, count in zip(self._buckets, self._bucket_counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * max(rank - seen, 0) / count
+            seen += count
+            lower = bound
+        # Rank falls in the overflow bucket, the largest bound is the best estimate.
+        return self._buckets[-1] if self._buckets else None
+
+    def to_dict(self) -> dict:
+        """Return the metrics as a dictionary."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_sum": self.latency_sum,
+            "latency_avg": self.latency_sum / self.calls if self.calls else None,
+            "latency_p50": self.percentile(50),
+            "latency_p90": self.percentile(90),
+            "latency_p99": self.percentile(99),
+            "status_codes": dict(self.status_codes),
+            "histogram": self.histogram(),
+        }
+
+
+class RequestMetrics:
+    """Thread-safe collection of per-endpoint request metrics.
+
+    One instance can be shared by several :class:`RuntimeClient` objects.
+    Besides reading the metrics with :meth:`snapshot` or exporting them with
+    :meth:`to_prometheus`, you can register hooks receiving every request::
+
+        metrics = RequestMetrics()
+        metrics.add_hook(lambda record: my_collector.push(record))
+        client = RuntimeClient(token, url, metrics=metrics)
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """RequestMetrics constructor.
+
+        Args:
+            buckets: Upper bounds of the latency histogram buckets, in seconds.
+        """
+        self._buckets = tuple(sorted(buckets))
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._hooks: List[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[dict], None]) -> None:
+        """Register a hook called after every request.
+
+        Args:
+            hook: Callable receiving a record dict with the keys ``endpoint``,
+                ``method``, ``latency``, ``status_code``, ``request_bytes``,
+                ``response_bytes`` and ``retry``.
+        """
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[dict], None]) -> None:
+        """Unregister a hook.
+
+        Args:
+            hook: A hook previously registered by :meth:`add_hook`.
+        """
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _endpoint(self, identifier: str) -> EndpointMetrics:
+        """Return the metrics of an endpoint, create it if needed. Caller holds the lock."""
+        endpoint = self._endpoints.get(identifier)
+        if endpoint is None:
+            endpoint = EndpointMetrics(identifier, self._buckets)
+            self._endpoints[identifier] = endpoint
+        return endpoint
+
+    def record(
+        self,
+        identifier: str,
+        method: str,
+        latency: float,
+        status_code: Optional[int],
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+        retry: bool = False,
+    ) -> None:
+        """Record one request and notify the hooks.
+
+        Args:
+            identifier: Endpoint identifier.
+            method: HTTP method.
+            latency: Request latency in seconds.
+            status_code: HTTP status code, ``None`` if no response was received.
+            request_bytes: Size of the request body.
+            response_bytes: Size of the response body.
+            retry: Whether the request is a retry of a previous one.
+        """
+        with self._lock:
+            endpoint = self._endpoint(identifier)
+            endpoint.observe(latency, status_code, request_bytes, response_bytes)
+            if retry:
+                endpoint.retries += 1
+            hooks = list(self._hooks)
+        if not hooks:
+            return
+        record = {
+            "endpoint": identifier,
+            "method": method,
+            "latency": latency,
+            "status_code": status_code,
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "retry": retry,
+        }
+        for hook in hooks:
+            try:
+                hook(record)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Request metrics hook %r failed.", hook, exc_info=True)
+
+    def endpoint(self, identifier: str) -> Optional[dict]:
+        """Return the metrics of one endpoint.
+
+        Args:
+            identifier: Endpoint identifier.
+
+        Returns:
+            The metrics as a dict, ``None`` if the endpoint was never called.
+        """
+        with self._lock:
+            endpoint = self._endpoints.get(identifier)
+            return endpoint.to_dict() if endpoint is not None else None
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Return the metrics of all endpoints, keyed by endpoint identifier."""
+        with self._lock:
+            return {
+                identifier: endpoint.to_dict()
+                for identifier, endpoint in self._endpoints.items()
+            }
+
+    def reset(self) -> None:
+        """Drop all collected metrics. Hooks stay registered."""
+        with self._lock:
+            self._endpoints = {}
+
+    def to_prometheus(self, prefix: str = "quafu_runtime_client") -> str:
+        """Export the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix: Prefix of the metric names.
+
+        Returns:
+            The metrics as text.
+        """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                f"# HELP {prefix}_requests_total Requests sent per endpoint and status code.",
+                f"# TYPE {prefix}_requests_total counter",
+            ]
+            for identifier, endpoint in endpoints:
+                for code, count in sorted(endpoint.status_codes.items()):
+                    lines.append(
+                        f'{prefix}_requests_total{{endpoint="{identifier}",code="{code}"}} {count}'
+                    )
+                if endpoint.errors:
+                    lines.append(
+                        f'{prefix}_requests_total{{endpoint="{identifier}",code="error"}} {endpoint.errors}'
+                    )
+            for name, attr, help_text in (
+                ("retries_total", "retries", "Retried requests per endpoint."),
+                ("request_bytes_total", "request_bytes", "Request body bytes per endpoint."),
+                ("response_bytes_total", "response_bytes", "Response body bytes per endpoint."),
+            ):
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for identifier, endpoint in endpoints:
+                    lines.append(
+                        f'{prefix}_{name}{{endpoint="{identifier}"}} {getattr(endpoint, attr)}'
+                    )
+            lines.append(
+                f"# HELP {prefix}_request_latency_seconds Request latency per endpoint."
+            )
+            lines.append(f"# TYPE {prefix}_request_latency_seconds histogram")
+            for identifier, endpoint in endpoints:
+                for bound, count in endpoint.histogram():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'{prefix}_request_latency_seconds_bucket{{endpoint="{identifier}",le="{le}"}} {count}'
+                    )
+                lines.append(
+                    f'{prefix}_request_latency_seconds_sum{{endpoint="{identifier}"}} {endpoint.latency_sum}'
+                )
+                lines.append(
+                    f'{prefix}_request_latency_seconds_count{{endpoint="{identifier}"}} {endpoint.calls}'
+                )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,92 @@
+"""Process-wide registry of shared runtime clients and accounts.
+
+Services, jobs and websocket clients created with the same token and url
+share one :class:`RuntimeClient`, and so one connection pool and one set of
+request metrics, instead of opening their own connections. Clients of one
+server share one :class:`AdaptiveConcurrencyLimiter`, so all submissions and
+polls of the process adapt to the server load together.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+from .account import Account
+from .concurrency import AdaptiveConcurrencyLimiter
+from .runtime_client import RuntimeClient
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, str], RuntimeClient] = {}
+_accounts: Dict[str, Account] = {}
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_limiter(url: str) -> AdaptiveConcurrencyLimiter:
+    """Return the shared concurrency limiter of a server, create it if needed.
+
+    Args:
+        url: Runtime server url.
+
+    Returns:
+        The shared limiter.
+    """
+    with _lock:
+        limiter = _limiters.get(url)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                max_limit=RuntimeClient.DEFAULT_MAX_CONNECTIONS
+            )
+            _limiters[url] = limiter
+        return limiter
+
+
+def get_client(token: str, url: str) -> RuntimeClient:
+    """Return the shared client of a token and url, create it if needed.
+
+    Args:
+        token: User's api_token.
+        url: Runtime server url.
+
+    Returns:
+        The shared client.
+    """
+    key = (token, url)
+    limiter = get_limiter(url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = RuntimeClient(token=token, url=url, limiter=limiter)
+            _clients[key] = client
+        return client
+
+
+def get_account(api_token: Optional[str] = None) -> Account:
+    """Return the shared account of a token, create it if needed.
+
+    Args:
+        api_token: Api token. If not provided, the token saved locally is
+            used, re-read when the config file changes.
+
+    Returns:
+        The shared account.
+    """
+    if api_token is None:
+        # Keyed by the saved token, so a token saved later gets its own account.
+        # Loading is cheap, the config lines are cached until the file changes.
+        api_token = Account().get_token()
+    with _lock:
+        account = _accounts.get(api_token)
+        if account is None:
+            account = Account(api_token=api_token)
+            _accounts[api_token] = account
+        return account
+
+
+def clear() -> None:
+    """Close and forget every shared client, and forget every shared account."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _accounts.clear()
+        _limiters.clear()
+    for client in clients:
+        client.close()
@@ -1,25 +1,229 @@
 import json
-from typing import Optional
-import requests
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional, TYPE_CHECKING
+
+from .concurrency import AdaptiveConcurrencyLimiter
+from .metrics import RequestMetrics
+from ..rtexceptions.rtexceptions import RequestException
+from ..utils.jsonutil import ParamsEncoder, canonical_json, params_hash
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the client-generated idempotency key of a job submission.
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+# Status codes of transient server errors, the request can be retried.
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+# Long-poll endpoints, held open by the server until the job finishes.
+# They bypass the concurrency limiter so they never starve other requests.
+LONG_POLL_ENDPOINTS = ("get_result_wait",)
+
+# Status of a run referencing a params blob unknown to the server.
+BLOB_NOT_FOUND = 412
 
 
 class RuntimeClient:
-    """Class for accessing Quafu runtime server."""
+    """Class for accessing Quafu runtime server.
+
+    The client is safe to share between threads. Each request checks an
+    HTTP session out of a pool and returns it once answered, and the number
+    of requests in flight across all threads is adapted by an
+    :class:`AdaptiveConcurrencyLimiter`, up to ``max_connections``: it grows
+    while the server answers fast and backs off on 429/5xx, connection
+    errors and latency spikes. At most ``max_connections`` idle sessions,
+    and so keep-alive connections, are kept whatever the number of threads.
+    """
+
+    DEFAULT_MAX_CONNECTIONS = 10
+    BACKOFF_MAX = 8
 
-    def __init__(self, token: str, url: str):
+    def __init__(
+        self,
+        token: str,
+        url: str,
+        metrics: Optional[RequestMetrics] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        session_factory: Optional[Callable[[], Any]] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
         """RuntimeClient constructor
 
         Args:
             token: user's api_token.
             url: Runtime client api url.
+            metrics: Request metrics to record into. Several clients can share one instance.
+                A new one is created if not provided.
+            max_connections: Maximum number of requests in flight, shared by all threads.
+                Ignored if ``limiter`` is provided.
+            session_factory: Callable returning a new ``requests.Session`` compatible object,
+                e.g. :meth:`LocalRuntimeServer.session`. Default to ``requests.Session``.
+            limiter: Concurrency limiter of the requests. Several clients of a server can share one.
         """
         self._token = token
         self._url = url + "/runtime"
-        self._session = requests.session()
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(max_limit=max_connections)
+        self.limiter = limiter
+        # Idle sessions, created on demand so requests is only imported then.
+        self._idle_sessions = []
+        self._max_idle_sessions = limiter.max_limit
+        self._open_sessions = 0
+        # Bumped by close(), sessions checked out before are closed when returned.
+        self._generation = 0
+        self._sessions_lock = threading.Lock()
+        self._session_factory = session_factory
         self.headers = {
             "Content-Type": "application/json;charset=UTF-8",
             "api_token": self._token,
         }
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        # Hashes of the params blobs known to be on the server.
+        self._blobs = set()
+        self._blobs_lock = threading.Lock()
+
+    def _request(
+        self,
+        method: str,
+        identifier: str,
+        data: Optional[str] = None,
+        params: Optional[dict] = None,
+        retry: bool = False,
+        headers: Optional[dict] = None,
+    ) -> "requests.Response":
+        """Send a request to an endpoint and record its metrics.
+
+        Args:
+            method: HTTP method.
+            identifier: Internal identifier of the endpoint.
+            data: Request body.
+            params: Query parameters.
+            retry: Whether the request is a retry of a previous one.
+            headers: Headers added to the default ones.
+
+        Returns:
+            The response of the server.
+        """
+        if headers:
+            headers = {**self.headers, **headers}
+        else:
+            headers = self.headers
+        url = self.get_url(identifier)
+        status_code = None
+        response_bytes = 0
+        slot_start = None
+        if identifier not in LONG_POLL_ENDPOINTS:
+            slot_start = self.limiter.acquire()
+        generation, session = self._checkout_session()
+        start = time.perf_counter()
+        try:
+            res = session.request(
+                method, url, headers=headers, data=data, params=params
+            )
+            status_code = res.status_code
+            response_bytes = len(res.content)
+            return res
+        finally:
+            self._checkin_session(generation, session)
+            if slot_start is not None:
+                self.limiter.release(
+                    slot_start,
+                    self._body_status(res) if status_code == 200 else status_code,
+                    error=status_code is None,
+                    endpoint=identifier,
+                )
+            self.metrics.record(
+                identifier,
+                method,
+                time.perf_counter() - start,
+                status_code,
+                request_bytes=len(data.encode("utf-8")) if data else 0,
+                response_bytes=response_bytes,
+                retry=retry,
+            )
+
+    @staticmethod
+    def _json(res: "requests.Response") -> Any:
+        """Return the parsed JSON body of a response, parsed once."""
+        body = getattr(res, "_runtime_json", None)
+        if body is None:
+            body = res._runtime_json = res.json()
+        return body
+
+    def _body_status(self, res: "requests.Response") -> Optional[int]:
+        """Return the status the server reports in the body of a 200 response.
+
+        The server answers errors, overload included, with HTTP 200 and the
+        error status in the body.
+        """
+        try:
+            body = self._json(res)
+        except ValueError:
+            return 200
+        status = body.get("status") if isinstance(body, dict) else None
+        return status if isinstance(status, int) else 200
+
+    @property
+    def open_sessions(self) -> int:
+        """Number of HTTP sessions open, idle or serving a request."""
+        with self._sessions_lock:
+            return self._open_sessions
+
+    def _checkout_session(self) -> tuple:
+        """Return an idle HTTP session, or a new one, with the pool generation."""
+        with self._sessions_lock:
+            generation = self._generation
+            if self._idle_sessions:
+                return generation, self._idle_sessions.pop()
+            self._open_sessions += 1
+        try:
+            return generation, self._new_session()
+        except BaseException:
+            with self._sessions_lock:
+                self._open_sessions -= 1
+            raise
+
+    def _checkin_session(self, generation: int, session: "requests.Session") -> None:
+        """Return a session to the pool, close it if the pool is full or was closed."""
+        with self._sessions_lock:
+            if (
+                generation == self._generation
+                and len(self._idle_sessions) < self._max_idle_sessions
+            ):
+                self._idle_sessions.append(session)
+                return
+            self._open_sessions -= 1
+        session.close()
+
+    def _new_session(self) -> "requests.Session":
+        if self._session_factory is not None:
+            session = self._session_factory()
+        else:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            # A session serves one request at a time, a single pooled
+            # connection per host is enough.
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+    def close(self) -> None:
+        """Close the idle HTTP sessions, and the others once their request is answered."""
+        with self._sessions_lock:
+            sessions, self._idle_sessions = self._idle_sessions, []
+            self._open_sessions -= len(sessions)
+            self._generation += 1
+        for session in sessions:
+            session.close()
 
     def program_upload(
         self,
@@ -45,7 +249,6 @@ class RuntimeClient:
         Returns:
             Server response in json. Contains program id generated by server if upload successfully.
         """
-        url = self.get_url("programs_upload")
         payload = {
             "name": name,
             "data": program_data,
@@ -56,9 +259,9 @@ class RuntimeClient:
             "is_public": 1 if is_public is True else 0,
         }
         data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
+        res = self._request("POST", "programs_upload", data=data)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -91,7 +294,6 @@ class RuntimeClient:
         """
         # update data
         payload = {"program_id": program_id}
-        url = self.get_url("program_update")
         if program_data:
             payload["data"] = program_data
         # update metadata
@@ -110,9 +312,9 @@ class RuntimeClient:
                 payload["backend"] = backend
         # print('program_id:', payload['program_id'])
         data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
+        res = self._request("POST", "program_update", data=data)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -126,12 +328,11 @@ class RuntimeClient:
         Return:
             'success' if delete program successfully.
         """
-        url = self.get_url("program_delete")
-        res = self._session.delete(
-            url, headers=self.headers, params={"program_id": program_id}
+        res = self._request(
+            "DELETE", "program_delete", params={"program_id": program_id}
         )
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -142,32 +343,175 @@ class RuntimeClient:
         name: str = None,
         backend: str = None,
         params: dict = None,
+        idempotency_key: Optional[str] = None,
+        max_retries: int = 0,
+        backoff_factor: float = 0.5,
+        params_blob: Optional[str] = None,
     ):
         """Run a program on the runtime server.
 
+        Every submission carries an idempotency key in the ``Idempotency-Key``
+        header, and retries reuse it. The server contract is:
+
+            * The first request with a key creates the job and stores its
+              response under ``(api_token, key)`` for at least 24 hours.
+            * A later request with the same key and the same payload creates
+              nothing and returns the stored response, so it has the same job id.
+            * A later request with the same key and a different payload is
+              rejected with status 422.
+
+        So a request whose response was lost can be retried without running
+        the program twice.
+
+        With ``params_blob``, the job params are the params blob of that hash,
+        see :meth:`blob_upload`, updated with the keys of ``params``. The blob
+        must then be a JSON object, unless ``params`` is ``None``. The server
+        answers with status 412 if the blob is unknown.
+
         Args:
             program_id: Program ID.
             name: Program name.
             backend: Name of the backend to run the program.
-            params: Parameters to use.
+            params: Parameters to use, or overrides of the blob params. Values of
+                the types registered in :mod:`jsonutil`, like NumPy arrays, are
+                encoded with :class:`ParamsEncoder`.
+            idempotency_key: Key identifying the submission. A random one is generated if not provided.
+            max_retries: Max number of retries on connection errors and transient server errors.
+            backoff_factor: Backoff factor used to calculate the time to wait between retries.
+            params_blob: Hash of a params blob uploaded to the server.
 
         Returns:
             Json response. Contains msg about job created by server if run successfully.
 
         """
-        url = self.get_url("programs_run_deploy")
         payload = {"program_id": program_id, "program_name": name}
         if backend is not None:
             payload["backend"] = backend
         if params is not None:
             payload["params"] = params
-        data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
-        if res.status_code == 200:
-            res = res.json()
-            return res["status"], res
-        else:
+        if params_blob is not None:
+            payload["params_blob"] = params_blob
+        data = json.dumps(payload, cls=ParamsEncoder)
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
+        headers = {IDEMPOTENCY_HEADER: idempotency_key}
+        attempt = 0
+        while True:
+            try:
+                res = self._request(
+                    "POST",
+                    "programs_run_deploy",
+                    data=data,
+                    retry=attempt > 0,
+                    headers=headers,
+                )
+                if res.status_code == 200:
+                    res = self._json(res)
+                    status = res["status"]
+                    if status not in RETRY_STATUS_CODES or attempt >= max_retries:
+                        return status, res
+                elif res.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                    return res.status_code, None
+            except OSError:
+                # requests exceptions are OSError too.
+                if attempt >= max_retries:
+                    raise
+                logger.info(
+                    "Submission %s failed, retrying.", idempotency_key, exc_info=True
+                )
+            attempt += 1
+            time.sleep(self._backoff_time(backoff_factor, attempt))
+
+    def blob_upload(self, data: Any) -> tuple:
+        """Upload a params blob under its content hash.
+
+        The server contract is:
+
+            * ``blob_upload`` stores the JSON ``data`` under ``hash``, the
+              SHA-256 hex digest of its canonical JSON (sorted keys, no
+              whitespace), see :func:`params_hash`. It answers status 400 if
+              the hash does not match, and 200 if the blob already exists.
+            * ``blob_exists`` answers ``{"exists": bool}`` for a ``hash``.
+            * Blobs are private to the api_token. They are kept at least 7
+              days after their last upload or reference by a run.
+            * ``programs_run_deploy`` accepts ``params_blob``, see :meth:`program_run`.
+
+        Args:
+            data: JSON serializable params.
+
+        Returns:
+            Status and json response. The response data holds the ``hash``.
+        """
+        digest = params_hash(data)
+        body = '{"hash":"%s","data":%s}' % (digest, canonical_json(data))
+        res = self._request("POST", "blob_upload", data=body)
+        if res.status_code != 200:
             return res.status_code, None
+        res = self._json(res)
+        if res["status"] == 200:
+            with self._blobs_lock:
+                self._blobs.add(digest)
+        return res["status"], res
+
+    def blob_exists(self, digest: str) -> bool:
+        """Return whether the server has a params blob.
+
+        Args:
+            digest: Hash of the blob.
+        """
+        res = self._request("GET", "blob_exists", params={"hash": digest})
+        if res.status_code != 200:
+            return False
+        res = self._json(res)
+        exists = res["status"] == 200 and bool(res["data"]["exists"])
+        if exists:
+            with self._blobs_lock:
+                self._blobs.add(digest)
+        return exists
+
+    def ensure_blob(self, data: Any) -> str:
+        """Upload a params blob unless the server already has it.
+
+        Args:
+            data: JSON serializable params.
+
+        Returns:
+            Hash of the blob.
+
+        Raises:
+            RequestException: If the upload failed.
+        """
+        digest = params_hash(data)
+        with self._blobs_lock:
+            if digest in self._blobs:
+                return digest
+        if self.blob_exists(digest):
+            return digest
+        status, _ = self.blob_upload(data)
+        if status != 200:
+            raise RequestException("Failed to upload params blob.", status)
+        return digest
+
+    def forget_blob(self, digest: str) -> None:
+        """Forget that the server has a params blob, e.g. after a 412 answer."""
+        with self._blobs_lock:
+            self._blobs.discard(digest)
+
+    def _backoff_time(self, backoff_factor: float, current_retry_attempt: int) -> float:
+        """Calculate the backoff time to wait for.
+
+        Exponential backoff time formula::
+            {backoff_factor} * (2 ** (current_retry_attempt - 1))
+
+        Args:
+            backoff_factor: Backoff factor, in seconds.
+            current_retry_attempt: Current number of retry attempts.
+
+        Returns:
+            The number of seconds to wait for, before making the next retry attempt.
+        """
+        backoff_time = backoff_factor * (2 ** (current_retry_attempt - 1))
+        return min(self.BACKOFF_MAX, backoff_time)
 
     def get_programs(self, limit: int = 0, skip: int = 0):
         """Return a list of metadata of runtime programs.
@@ -179,11 +523,10 @@ class RuntimeClient:
         Returns:
             A list of metadata of runtime programs.
         """
-        url = self.get_url("programs")
         payload = {"limit": limit, "offset": skip}
-        res = self._session.get(url, headers=self.headers, params=payload)
+        res = self._request("GET", "programs", params=payload)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             # TODO(zhaoyilun): this is just a temperal fix
             # unify return code as "code" in the future
             try:
@@ -202,11 +545,10 @@ class RuntimeClient:
         Returns:
             Program's all msg.
         """
-        url = self.get_url("program")
         payload = {"program_id": program_id, "name": name}
-        res = self._session.get(url, headers=self.headers, params=payload)
+        res = self._request("GET", "program", params=payload)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -215,27 +557,34 @@ class RuntimeClient:
         """Before upload to server, check the program."""
         pass
 
-    def job_result(self, job_id: str, wait: bool = False):
+    def job_result(
+        self, job_id: str, wait: bool = False, timings: Optional[dict] = None
+    ):
         """Try to get result of a job.
 
         Args:
             job_id: Program job ID.
             wait: Weather waiting for result. If set to 'False', return immediately.
+            timings: If given, ``elapsed`` is set to the seconds between
+                sending the request and receiving the response headers, the
+                rest of the request being the download of the body.
 
         Returns:
             Job result.
         """
         if wait:
-            url = self.get_url("get_result_wait")
+            identifier = "get_result_wait"
         else:
-            url = self.get_url("get_result_nowait")
+            identifier = "get_result_nowait"
         payload = {
             "job_id": job_id,
         }
         data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
+        res = self._request("POST", identifier, data=data)
+        if timings is not None and getattr(res, "elapsed", None) is not None:
+            timings["elapsed"] = res.elapsed.total_seconds()
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -249,14 +598,13 @@ class RuntimeClient:
         Returns:
             Job result if job's done.
         """
-        url = self.get_url("get_result_nowait")
         payload = {
             "job_id": job_id,
         }
         data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
+        res = self._request("POST", "get_result_nowait", data=data)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -270,14 +618,13 @@ class RuntimeClient:
         Returns:
             Json response.
         """
-        url = self.get_url("job_cancel")
         payload = {
             "job_id": job_id,
         }
         data = json.dumps(payload)
-        res = self._session.post(url, headers=self.headers, data=data)
+        res = self._request("POST", "job_cancel", data=data)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -291,13 +638,12 @@ class RuntimeClient:
         Returns:
             Json response.
         """
-        url = self.get_url("job_status")
         payload = {
             "job_id": job_id,
         }
-        res = self._session.get(url, headers=self.headers, params=payload)
+        res = self._request("GET", "job_status", params=payload)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -311,13 +657,12 @@ class RuntimeClient:
         Returns:
             Job logs.
         """
-        url = self.get_url("job_logs")
         payload = {
             "job_id": job_id,
         }
-        res = self._session.get(url, headers=self.headers, params=payload)
+        res = self._request("GET", "job_logs", params=payload)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -331,13 +676,34 @@ class RuntimeClient:
         Returns:
             Job logs.
         """
-        url = self.get_url("job_delete")
         payload = {
             "job_id": job_id,
         }
-        res = self._session.get(url, headers=self.headers, params=payload)
+        res = self._request("GET", "job_delete", params=payload)
+        if res.status_code == 200:
+            res = self._json(res)
+            return res["status"], res
+        else:
+            return res.status_code, None
+
+    def job_checkpoint(self, job_id: str):
+        """Get the last checkpoint saved by a job.
+
+        The server answers with the encoded state, ``None`` if the job saved
+        none, the number of checkpoints saved and the time of the last one.
+
+        Args:
+            job_id: Program job ID.
+
+        Returns:
+            Json response.
+        """
+        payload = {
+            "job_id": job_id,
+        }
+        res = self._request("GET", "job_checkpoint", params=payload)
         if res.status_code == 200:
-            res = res.json()
+            res = self._json(res)
             return res["status"], res
         else:
             return res.status_code, None
@@ -3,12 +3,13 @@ import logging
 import time
 import traceback
 from abc import ABC
-from typing import Optional, Any
+from typing import Optional, Any, Sequence
 from queue import Queue
 from websocket import WebSocketApp, STATUS_ABNORMAL_CLOSED, STATUS_NORMAL
 from ..rtexceptions.rtexceptions import WebsocketError, WebsocketTimeoutError
 
 from ..clients.account import Account
+from ..clients.registry import get_account
 
 logger = logging.getLogger(__name__)
 
@@ -46,21 +47,29 @@ class RuntimeWebsocketClient(ABC):
     def __init__(
         self,
         job_id: str,
-        account: Account,
+        account: Optional[Account] = None,
         message_queue: Optional[Queue] = None,
+        channels: Optional[Sequence[str]] = None,
     ) -> None:
         """WebsocketClient constructor.
 
         Args:
-            account: Account used to get token.
+            account: Account used to get token. Default to the shared local account.
             job_id: Job ID.
             message_queue: Queue used to hold received messages.
+            channels: Interim result channels to receive, all if ``None``. They
+                are sent comma separated in the ``channels`` header, and the
+                server only forwards the messages of these channels.
         """
+        if account is None:
+            account = get_account()
         self._websocket_url = account.get_url_ws()
         self._access_token = account.get_token()
         self._job_id = job_id
         self._message_queue = message_queue
         self._header = {"api_token": self._access_token, "job_id": self._job_id}
+        if channels is not None:
+            self._header["channels"] = ",".join(channels)
         self._ws: Optional[WebSocketApp] = None
         self._authenticated = False
         self._cancelled = False
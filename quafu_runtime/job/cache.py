@@ -0,0 +1,279 @@
+"""Client-side cache of the results of deterministic runs."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, Optional, Sequence, TYPE_CHECKING
+
+from ..job.jobstatus import JobStatus
+from ..utils.jsonutil import canonical_json
+
+if TYPE_CHECKING:
+    from ..job.job import RuntimeJob
+
+logger = logging.getLogger(__name__)
+
+# Backends whose runs give the same result for the same program and params.
+DETERMINISTIC_BACKENDS = ("py_simu",)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    program_id TEXT,
+    job_id TEXT NOT NULL,
+    backend TEXT,
+    result TEXT,
+    finish_time TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def source_hash(source: str) -> str:
+    """Return the SHA-256 hex digest of a program source."""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class CachePolicy:
+    """Whether and how long the runs of a program are cached.
+
+    Attributes:
+        enabled: Whether the runs are cached.
+        ttl: Seconds a result stays valid. ``None`` means until evicted.
+        backends: Backends whose runs are cached. ``None`` means every backend.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: Optional[float] = None,
+        backends: Optional[Sequence[str]] = DETERMINISTIC_BACKENDS,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.backends = tuple(backends) if backends is not None else None
+
+    def applies(self, backend: Optional[str]) -> bool:
+        """Return whether a run on a backend is cached."""
+        return self.enabled and (self.backends is None or backend in self.backends)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} enabled={self.enabled} ttl={self.ttl} "
+            f"backends={self.backends}>"
+        )
+
+
+class RunCache:
+    """Cache of run results keyed by program, program source, backend and params.
+
+    Give it to :class:`RuntimeService` to have :meth:`RuntimeService.run`
+    return a completed job from the cache instead of submitting a run
+    already done. Only runs ending ``DONE`` are stored. By default only runs
+    on deterministic simulators are cached, set a :class:`CachePolicy` per
+    program to change it::
+
+        cache = RunCache("runs.db", max_entries=10000)
+        cache.set_policy("vqe", CachePolicy(ttl=24 * 3600))
+        cache.set_policy("sampler", CachePolicy(enabled=False))
+        service = RuntimeService(account, run_cache=cache)
+
+        job = service.run(name="vqe", params=params)  # cached once done
+        job = service.run(name="vqe", params=params, use_cache=False)  # always submitted
+
+    The key includes the hash of the program source, so updating a program
+    invalidates its cached runs. The least recently used results are evicted
+    beyond ``max_entries``. The cache can be shared between threads, and
+    between processes through its file.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        default_policy: Optional[CachePolicy] = None,
+    ):
+        """RunCache constructor.
+
+        Args:
+            path: Path of the SQLite database. In memory by default.
+            max_entries: Max number of cached results.
+            ttl: Seconds a result stays valid, unless its program policy sets one.
+            default_policy: Policy of the programs without their own. Caches
+                the runs on :data:`DETERMINISTIC_BACKENDS` by default.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.default_policy = default_policy or CachePolicy()
+        self._policies = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(_SCHEMA)
+
+    def set_policy(self, program: str, policy: CachePolicy) -> None:
+        """Set the policy of a program.
+
+        Args:
+            program: Program id or name.
+            policy: Cache policy of its runs.
+        """
+        self._policies[program] = policy
+
+    def policy(self, program_id: Optional[str], name: Optional[str] = None) -> CachePolicy:
+        """Return the policy of a program, looked up by id then by name."""
+        for program in (program_id, name):
+            if program is not None and program in self._policies:
+                return self._policies[program]
+        return self.default_policy
+
+    @staticmethod
+    def key(program_id: str, program_hash: str, backend: Optional[str], params: Any) -> str:
+        """Return the cache key of a run.
+
+        Args:
+            program_id: Program ID.
+            program_hash: Hash of the program source, see :func:`source_hash`.
+            backend: Backend of the run.
+            params: Program input parameters.
+
+        Returns:
+            The key.
+        """
+        return hashlib.sha256(
+            canonical_json([program_id, program_hash, backend, params]).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached run of a key, ``None`` if missing or expired.
+
+        Returns:
+            Dict with ``job_id``, ``backend``, ``result`` and ``finish_time``.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, backend, result, finish_time, expires_at "
+                "FROM runs WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and row[4] is not None and row[4] <= now:
+                self._conn.execute("DELETE FROM runs WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._misses += 1
+                return None
+            self._conn.execute("UPDATE runs SET last_used = ? WHERE key = ?", (now, key))
+            self._hits += 1
+        return {
+            "job_id": row[0],
+            "backend": row[1],
+            "result": json.loads(row[2]),
+            "finish_time": row[3],
+        }
+
+    def put(self, key: str, job: "RuntimeJob", ttl: Optional[float] = None) -> bool:
+        """Store the result of a finished job.
+
+        Args:
+            key: Cache key of the run, see :meth:`key`.
+            job: The job.
+            ttl: Seconds the result stays valid. Default to the cache ttl.
+
+        Returns:
+            Whether the result was stored. Only ``DONE`` jobs are stored.
+        """
+        if job._status != JobStatus.DONE:
+            return False
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    job.program_id(),
+                    job.job_id(),
+                    job.backend,
+                    json.dumps(job._result),
+                    job._finish_time,
+                    now,
+                    now + ttl if ttl is not None else None,
+                    now,
+                ),
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            excess -= self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM runs WHERE key IN "
+                    "(SELECT key FROM runs ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._evictions += excess
+        return True
+
+    def watch(self, key: str, job: "RuntimeJob", ttl: Optional[float] = None) -> None:
+        """Store the result of a job once it is seen done."""
+
+        def _store(job: "RuntimeJob") -> None:
+            try:
+                self.put(key, job, ttl)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Failed to cache the result of job %s:\n%s",
+                    job.job_id(),
+                    traceback.format_exc(),
+                )
+
+        job.add_done_callback(_store)
+
+    def invalidate(self, program_id: Optional[str] = None) -> int:
+        """Remove cached results.
+
+        Args:
+            program_id: Program whose results are removed. All of them if ``None``.
+
+        Returns:
+            Number of removed results.
+        """
+        with self._lock:
+            if program_id is None:
+                cursor = self._conn.execute("DELETE FROM runs")
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM runs WHERE program_id = ?", (program_id,)
+                )
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        """Return the hits, misses, evictions and number of entries of the cache."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            return {
+                "entries": entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "RunCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
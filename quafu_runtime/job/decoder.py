@@ -1,5 +1,56 @@
 import json
-from typing import Any
+from typing import Any, List, Tuple
+
+from ..utils.keywords import CHANNEL, DEFAULT_CHANNEL, INTERIM_BATCH
+
+_ENVELOPE_PREFIXES = ('{"%s"' % INTERIM_BATCH, '{"%s"' % CHANNEL)
+_CHANNEL_PREFIX = '{"%s":' % CHANNEL
+_JSON_DECODER = json.JSONDecoder()
+
+
+def unpack_interim(message: Any) -> Tuple[str, List[Any]]:
+    """Return the channel of one websocket message and the interim messages it carries.
+
+    A batch of a :class:`CoalescingUserPub` is unpacked into its messages, in
+    publication order. Any other message is alone in the default channel.
+
+    Args:
+        message: Websocket message.
+
+    Returns:
+        The channel and the interim messages.
+    """
+    if isinstance(message, bytes):
+        message = message.decode("utf-8")
+    if not isinstance(message, str) or not message.startswith(_ENVELOPE_PREFIXES):
+        return DEFAULT_CHANNEL, [message]
+    try:
+        envelope = json.loads(message)
+        return envelope.get(CHANNEL, DEFAULT_CHANNEL), envelope[INTERIM_BATCH]
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return DEFAULT_CHANNEL, [message]
+
+
+def interim_channel(message: Any) -> str:
+    """Return the channel of one websocket message, without parsing its messages.
+
+    This is all a server needs to forward only the subscribed channels.
+
+    Args:
+        message: Websocket message.
+
+    Returns:
+        The channel name.
+    """
+    if isinstance(message, bytes):
+        message = message.decode("utf-8")
+    if not isinstance(message, str) or not message.startswith(_CHANNEL_PREFIX):
+        return DEFAULT_CHANNEL
+    try:
+        channel, _ = _JSON_DECODER.raw_decode(message, len(_CHANNEL_PREFIX))
+    except json.JSONDecodeError:
+        return DEFAULT_CHANNEL
+    return channel if isinstance(channel, str) else DEFAULT_CHANNEL
 
 
 class ResultDecoder:
@@ -1,12 +1,15 @@
 import logging
 import queue
+import threading
+import time
 import traceback
 from concurrent import futures
-from typing import Optional, Callable, Type
+from typing import Any, Dict, Optional, Callable, Sequence, Type
 from ..clients.runtime_client import RuntimeClient
-from ..clients.runtime_client_ws import WebsocketClientCloseCode, RuntimeWebsocketClient
-from ..job.decoder import ResultDecoder
+from ..job.decoder import ResultDecoder, unpack_interim
 from ..job.jobstatus import JOB_FINAL_STATES, JobStatus
+from ..job.timeline import JobTimeline
+from ..utils.jsonutil import decode_checkpoint
 from ..rtexceptions.rtexceptions import (
     ArgsException,
     JobNotFoundException,
@@ -16,6 +19,7 @@ from ..rtexceptions.rtexceptions import (
     CheckApiTokenError,
 )
 from ..clients.account import Account
+from ..clients.registry import get_account, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +47,9 @@ class RuntimeJob:
 
     _POISON_PILL = "_poison_pill"
 
+    # Max seconds between two status polls of :meth:`result` while queued.
+    MAX_POLL_INTERVAL = 10.0
+
     _executor = futures.ThreadPoolExecutor(thread_name_prefix="runtime_job")
 
     def __init__(
@@ -55,6 +62,9 @@ class RuntimeJob:
         creation_date: Optional[str] = None,
         program_id: Optional[str] = None,
         params: Optional[str] = None,
+        timeline: Optional[JobTimeline] = None,
+        result: Any = None,
+        finish_time: Optional[str] = None,
     ):
         """Job constructor.
         If you want to retrieve a job instance in this way,
@@ -69,18 +79,19 @@ class RuntimeJob:
             api_client: Instance for connecting to the server.
             program_id: Program ID this job is for.
             params: The params used by run method of program.
+            timeline: Timeline of the job, holding its submission time if known.
+            result: Result of the job, if already known.
+            finish_time: Finish time of the job, if already known.
 
         Returns:
             An instance of job.
         """
         if account is None:
-            account = Account()
+            account = get_account()
         self._job_id = job_id
         self._client = api_client
         if self._client is None:
-            self._client = RuntimeClient(
-                token=account.get_token(), url=account.get_url()
-            )
+            self._client = get_client(account.get_token(), account.get_url())
         self.params = params
         self.backend = backend
         self._status_map = {
@@ -92,10 +103,14 @@ class RuntimeJob:
         }
         self._program_id = program_id
         self._creation_date = creation_date
-        self._status = self._status_map[status]
+        self._timeline = timeline if timeline is not None else JobTimeline()
+        self._done_callbacks = []
+        self._done_lock = threading.Lock()
+        self._status = None
+        self._update_status(status)
         self._error_msg = None
-        self._result = None
-        self._finish_time = None
+        self._result = result
+        self._finish_time = finish_time
         self._logs = None
         self._final_interim_results = False
         self._interim_result_decoder = ResultDecoder
@@ -103,17 +118,22 @@ class RuntimeJob:
         # used for streaming result
         self._ws_client_future = None  # type: Optional[futures.Future]
         self._result_queue = queue.Queue()  # type: queue.Queue
-        self._ws_client = RuntimeWebsocketClient(
-            account=account,
-            job_id=job_id,
-            message_queue=self._result_queue,
-        )
+        # Created when streaming starts, so websocket code is only imported then.
+        self._account = account
+        self._ws_client = None
+        self._channels = None  # type: Optional[Sequence[str]]
 
-    def result(self, wait: bool):
+    def result(self, wait: bool, poll_interval: Optional[float] = 0.5):
         """Get the result from server.
 
+        While waiting for the result, the status of a queued job is polled in
+        the background, so its timeline records when it started running.
+
         Args:
             wait: Weather wait if job is not done. Wait if set to True, otherwise return immediately.
+            poll_interval: Seconds between the first status polls while the job
+                is queued, doubled after each poll up to :attr:`MAX_POLL_INTERVAL`.
+                ``None`` to not poll.
 
         Returns:
             Result of the job.
@@ -127,7 +147,26 @@ class RuntimeJob:
                 "finished_time": self._finish_time,
                 "status": self._status,
             }
-        status_code, response = self._client.job_result(job_id=job_id, wait=wait)
+        long_poll = wait and self._status not in JOB_FINAL_STATES
+        stop_polling = threading.Event()
+        if long_poll and poll_interval is not None and self._status == JobStatus.QUEUED:
+            threading.Thread(
+                target=self._poll_running,
+                args=(stop_polling, poll_interval),
+                name="runtime_job_poll",
+                daemon=True,
+            ).start()
+        timings = {}
+        requested_at = time.monotonic()
+        try:
+            status_code, response = self._client.job_result(
+                job_id=job_id, wait=long_poll, timings=timings
+            )
+        finally:
+            stop_polling.set()
+        # The server answers a long poll once the job is final, the rest of
+        # the request is the download of the result.
+        answered_at = requested_at + timings.get("elapsed", 0.0)
         if status_code == 201:
             raise CheckApiTokenError("API_TOKEN ERROR.") from None
         if status_code == 404:
@@ -137,20 +176,32 @@ class RuntimeJob:
         response = response["data"]
         # self._result = response[]
         self._result = response["result"]
-        self._status = self._status_map[response["status"]]
         self._finish_time = response["finish_time"]
         if response["status"] != 2:
             del response["finish_time"]
             self._finish_time = None
         if response["status"] == 4:
             self._error_msg = response["result"]
+        if long_poll and self._status_map[response["status"]] in JOB_FINAL_STATES:
+            self._timeline.mark("final", answered_at)
+        # Done callbacks see the finish time and error set above.
+        self._update_status(response["status"])
+        if self._status in JOB_FINAL_STATES:
+            self._timeline.mark("result_requested", answered_at if long_poll else requested_at)
+            self._timeline.mark("result_fetched")
+        if response["status"] == 4:
             response["error_msg"] = self._error_msg
             del response["result"]
         response["status"] = self._status
         return response
 
     def interim_results(
-        self, callback: Callable, decoder: Optional[Type[ResultDecoder]] = None
+        self,
+        callback: Callable,
+        decoder: Optional[Type[ResultDecoder]] = None,
+        channels: Optional[Sequence[str]] = None,
+        decoders: Optional[Dict[str, Type[ResultDecoder]]] = None,
+        with_channel: bool = False,
     ) -> None:
         """Start streaming interim job results.
 
@@ -158,9 +209,17 @@ class RuntimeJob:
             callback: Callback function to be invoked for any interim results and final result.
                 The callback function will receive 1 parameters:
                     1. Job result data.
+                With ``with_channel``, it receives 2 parameters:
+                    1. Channel name.
+                    2. Job result data.
             decoder: A :class:`decoder.ResultDecoder` subclass used to decode job results and interim result.
                 The result will be jsonfy before send to client,
                 so you should encode your data, and decode it with `decoder` when you get it.
+            channels: Names of the channels to receive, all if ``None``. The
+                server filters the messages, so the other channels are not downloaded.
+                Messages published without a channel are in the ``"default"`` channel.
+            decoders: Decoder of each channel, ``decoder`` for the channels not in it.
+            with_channel: Whether the callback also receives the channel name.
 
         Raises:
             RuntimeInvalidStateError: If a callback function is already streaming results or
@@ -172,6 +231,16 @@ class RuntimeJob:
             raise RuntimeInvalidStateError(
                 "A callback function is already streaming results."
             )
+        if self._ws_client is None or channels != self._channels:
+            from ..clients.runtime_client_ws import RuntimeWebsocketClient
+
+            self._ws_client = RuntimeWebsocketClient(
+                account=self._account,
+                job_id=self._job_id,
+                message_queue=self._result_queue,
+                channels=channels,
+            )
+            self._channels = channels
         self._ws_client_future = self._executor.submit(self._start_websocket_client)
         # self._stream_results(
         #     result_queue=self._result_queue,
@@ -182,6 +251,9 @@ class RuntimeJob:
             result_queue=self._result_queue,
             user_callback=callback,
             decoder=decoder,
+            channels=channels,
+            decoders=decoders,
+            with_channel=with_channel,
         )
 
     def _is_streaming(self) -> bool:
@@ -215,6 +287,8 @@ class RuntimeJob:
         """Cancel result streaming."""
         if not self._is_streaming():
             return
+        from ..clients.runtime_client_ws import WebsocketClientCloseCode
+
         self._ws_client.disconnect(WebsocketClientCloseCode.CANCEL)
 
     def _stream_results(
@@ -222,6 +296,9 @@ class RuntimeJob:
         result_queue: queue.Queue,
         user_callback: Callable,
         decoder: Optional[Type[ResultDecoder]] = None,
+        channels: Optional[Sequence[str]] = None,
+        decoders: Optional[Dict[str, Type[ResultDecoder]]] = None,
+        with_channel: bool = False,
     ) -> None:
         """Stream results.
 
@@ -229,6 +306,9 @@ class RuntimeJob:
             result_queue: Queue used to pass websocket messages.
             user_callback: User callback function.
             decoder: A :class:`ResultDecoder` (sub)class used to decode job results.
+            channels: Channels to deliver, all if ``None``.
+            decoders: Decoder of each channel.
+            with_channel: Whether the callback receives the channel name first.
         """
         print("Start interim result streaming for job", self.job_id())
         _decoder = decoder or self._interim_result_decoder
@@ -239,15 +319,28 @@ class RuntimeJob:
                     self._empty_result_queue(result_queue)
                     print("Interim result streaming finished")
                     return
-                user_callback(_decoder.decode(response))
+                self._timeline.mark("first_interim")
             except queue.Empty:
-                pass
-            except Exception:  # pylint: disable=broad-except
-                logger.warning(
-                    "An error occurred while streaming results " "for job %s:\n%s",
-                    self.job_id(),
-                    traceback.format_exc(),
-                )
+                continue
+            # Batches of a CoalescingUserPub give one callback per message.
+            channel, messages = unpack_interim(response)
+            # Also filtered here, in case the server does not filter channels.
+            if channels is not None and channel not in channels:
+                continue
+            channel_decoder = (decoders or {}).get(channel, _decoder)
+            for message in messages:
+                try:
+                    data = channel_decoder.decode(message)
+                    if with_channel:
+                        user_callback(channel, data)
+                    else:
+                        user_callback(data)
+                except Exception:  # pylint: disable=broad-except
+                    logger.warning(
+                        "An error occurred while streaming results " "for job %s:\n%s",
+                        self.job_id(),
+                        traceback.format_exc(),
+                    )
 
     def _empty_result_queue(self, result_queue: queue.Queue) -> None:
         """Empty the result queue.
@@ -287,7 +380,7 @@ class RuntimeJob:
             raise RunFailedException(f"Failed to cancel job: {job_id}") from None
         response = response["data"]
         if response["status"] != -1:
-            self._status = self._status_map[response["status"]]
+            self._update_status(response["status"])
             response["status"] = self._status
         else:
             print("Job cancel failed")
@@ -301,6 +394,33 @@ class RuntimeJob:
         if self._status in JOB_FINAL_STATES:
             print(f"Job {self._job_id} status: {self._status}")
             return self._status
+        self._refresh_status()
+        print(f"Job status: {self._status}")
+        return self._status
+
+    def _poll_running(self, stop: threading.Event, poll_interval: float) -> None:
+        """Poll the status of the queued job and mark when it is seen running.
+
+        Runs beside the request waiting for the result, until it is answered.
+        """
+        while not stop.wait(poll_interval):
+            try:
+                status_code, response = self._client.job_status(job_id=self._job_id)
+            except Exception:  # pylint: disable=broad-except
+                return
+            if status_code != 200:
+                return
+            status = response["data"]["status"]
+            if status == 1 and not stop.is_set():
+                self._timeline.mark("running")
+            if status != 0:
+                return
+            poll_interval = min(2 * poll_interval, self.MAX_POLL_INTERVAL)
+
+    def _refresh_status(self) -> JobStatus:
+        """Fetch the status of the job from the server, without printing it."""
+        if self._status in JOB_FINAL_STATES:
+            return self._status
         job_id = self._job_id
         status_code, response = self._client.job_status(job_id=job_id)
         if status_code == 201:
@@ -310,15 +430,14 @@ class RuntimeJob:
         elif status_code != 200:
             raise RunFailedException(f"Failed to get job: {job_id} status") from None
         response = response["data"]
-        self._status = self._status_map[response["status"]]
         self._result = response["result"]
         self._finish_time = response["finished_time"]
-        if self._status == JobStatus.ERROR:
+        if response["status"] == 4:
             self._error_msg = self._result
             self._result = None
         if response["status"] < 2:
             self._finish_time = None
-        print(f"Job status: {self._status}")
+        self._update_status(response["status"])
         return self._status
 
     def logs(self):
@@ -338,11 +457,39 @@ class RuntimeJob:
         elif status_code != 200:
             raise RunFailedException(f"Failed to get job: {job_id} logs") from None
         response = response["data"]
-        self._status = self._status_map[response["status"]]
+        self._update_status(response["status"])
         self._logs = response["logs"]
         print(f"Job status: {self._status}")
         return response["logs"]
 
+    def checkpoint(self, decode: bool = True) -> Any:
+        """Return the last checkpoint saved by the program with ``userpub.checkpoint``.
+
+        Pass the job to :meth:`RuntimeService.run` as ``resume_from`` to
+        start a new job from it.
+
+        Args:
+            decode: Whether to decode the state. If ``False``, return it as
+                encoded by :func:`~quafu_runtime.utils.jsonutil.encode_checkpoint`.
+
+        Returns:
+            The checkpoint state, ``None`` if the job saved none.
+        """
+        if self._job_id is None:
+            raise ArgsException("job_id is needed.")
+        job_id = self._job_id
+        status_code, response = self._client.job_checkpoint(job_id=job_id)
+        if status_code == 201:
+            raise CheckApiTokenError("API_TOKEN ERROR.") from None
+        if status_code == 404:
+            raise JobNotFoundException(f"Job not found: {job_id}") from None
+        elif status_code != 200:
+            raise RunFailedException(f"Failed to get job: {job_id} checkpoint") from None
+        checkpoint = response["data"]["checkpoint"]
+        if checkpoint is None or not decode:
+            return checkpoint
+        return decode_checkpoint(checkpoint)
+
     def delete(self) -> bool:
         """Delete the job.
         Only if the status of job is in 'Canceled', 'Failed' and 'Completed', delete successfully.
@@ -365,7 +512,7 @@ class RuntimeJob:
         elif status_code != 200:
             raise RunFailedException(f"Failed to get job: {job_id} logs") from None
         response = response["data"]
-        self._status = self._status_map[response["status"]]
+        self._update_status(response["status"])
         deleted = response["deleted"]
         err = None
         if response["status"] < 2:
@@ -373,6 +520,53 @@ class RuntimeJob:
         print(f"Job deleted: {deleted}, Error: {err}")
         return deleted
 
+    def _update_status(self, status: int) -> None:
+        """Set the job status from a server status code and record it in the timeline.
+
+        Args:
+            status: Status code returned by the server.
+        """
+        self._status = self._status_map[status]
+        if self._status == JobStatus.RUNNING:
+            self._timeline.mark("running")
+        elif self._status in JOB_FINAL_STATES:
+            self._timeline.mark("final")
+            with self._done_lock:
+                callbacks, self._done_callbacks = self._done_callbacks, []
+            for callback in callbacks:
+                self._run_done_callback(callback)
+
+    def add_done_callback(self, callback: Callable[["RuntimeJob"], None]) -> None:
+        """Register a callback invoked once the job is seen in a final state.
+
+        The job does not poll by itself: the callback runs in the thread that
+        observes the final state, through :meth:`status`, :meth:`result`,
+        :meth:`cancel` or :meth:`logs`. If the job is already final, it runs
+        immediately.
+
+        Args:
+            callback: Callable receiving the job.
+        """
+        with self._done_lock:
+            if self._status not in JOB_FINAL_STATES:
+                self._done_callbacks.append(callback)
+                return
+        self._run_done_callback(callback)
+
+    def _run_done_callback(self, callback: Callable[["RuntimeJob"], None]) -> None:
+        try:
+            callback(self)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning(
+                "Done callback of job %s failed:\n%s",
+                self._job_id,
+                traceback.format_exc(),
+            )
+
+    def timeline(self) -> JobTimeline:
+        """Return the client-measured lifecycle timeline of the job."""
+        return self._timeline
+
     def program_id(self):
         """Return program id."""
         return self._program_id
@@ -0,0 +1,309 @@
+"""Local journal of submitted jobs, to reattach to them after a crash."""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, List, Optional, TYPE_CHECKING
+
+from ..job.jobstatus import JobStatus
+from ..utils.jsonutil import canonical_json, decode_params, params_hash
+
+if TYPE_CHECKING:
+    from ..job.job import RuntimeJob
+
+logger = logging.getLogger(__name__)
+
+# Server status code of each job status.
+_STATUS_CODES = {
+    JobStatus.QUEUED: 0,
+    JobStatus.RUNNING: 1,
+    JobStatus.DONE: 2,
+    JobStatus.CANCELLED: 3,
+    JobStatus.ERROR: 4,
+}
+
+# Events of the journal, in the order of a submission lifecycle.
+SUBMITTING = "submitting"
+SUBMITTED = "submitted"
+REJECTED = "rejected"
+FINAL = "final"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    event TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    job_id TEXT,
+    program_id TEXT,
+    program_name TEXT,
+    backend TEXT,
+    params_hash TEXT,
+    params TEXT,
+    params_blob TEXT,
+    base_params TEXT,
+    status INTEGER,
+    result TEXT,
+    finish_time TEXT,
+    error TEXT
+)
+"""
+
+_COLUMNS = (
+    "job_id",
+    "program_id",
+    "program_name",
+    "backend",
+    "params_hash",
+    "params",
+    "params_blob",
+    "base_params",
+    "status",
+    "result",
+    "finish_time",
+    "error",
+)
+
+
+class JournalEntry:
+    """State of one submission, folded from its journal events.
+
+    Attributes:
+        idempotency_key: Idempotency key of the submission.
+        event: Last event of the submission, ``submitting``, ``submitted``,
+            ``rejected`` or ``final``.
+        job_id: Job id, ``None`` until the server answered the submission.
+        program_id: Program ID.
+        program_name: Program name, if submitted by name.
+        backend: Backend of the job.
+        params_hash: Hash of the params, see :func:`params_hash`.
+        params_blob: Hash of the params blob the params update, if any.
+        status: Last known server status code of the job.
+        finish_time: Finish time of the job, if done.
+        error: Error message of the job, if failed.
+        recorded_at: Time of the last event.
+    """
+
+    def __init__(self, idempotency_key: str):
+        self.idempotency_key = idempotency_key
+        self.event = None  # type: Optional[str]
+        self.job_id = None  # type: Optional[str]
+        self.program_id = None  # type: Optional[str]
+        self.program_name = None  # type: Optional[str]
+        self.backend = None  # type: Optional[str]
+        self.params_hash = None  # type: Optional[str]
+        self.params_blob = None  # type: Optional[str]
+        self.status = None  # type: Optional[int]
+        self.finish_time = None  # type: Optional[str]
+        self.error = None  # type: Optional[str]
+        self.recorded_at = None  # type: Optional[float]
+        self._params = None  # type: Optional[str]
+        self._base_params = None  # type: Optional[str]
+        self._result = None  # type: Optional[str]
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job was seen in a final state."""
+        return self.event == FINAL
+
+    def params(self) -> Any:
+        """Return the params of the submission, with arrays and circuits decoded."""
+        return decode_params(self._params) if self._params is not None else None
+
+    def base_params(self) -> Any:
+        """Return the base params uploaded as the params blob, ``None`` if not a blob run."""
+        return decode_params(self._base_params) if self._base_params is not None else None
+
+    def result(self) -> Any:
+        """Return the recorded result of the job, ``None`` if not finished."""
+        return json.loads(self._result) if self._result is not None else None
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} key={self.idempotency_key} "
+            f"job_id={self.job_id} event={self.event}>"
+        )
+
+
+class JobJournal:
+    """Append-only SQLite journal of job submissions and final states.
+
+    Pass it to :meth:`RuntimeService.run` to record each submission before
+    it is sent, its job id once created, and its final state and result
+    once the job is seen finished. After a crash of the driver,
+    :meth:`RuntimeService.reattach` restores the handles of the jobs still
+    alive from the journal, and finished results are read back without a
+    request::
+
+        journal = JobJournal("jobs.db")
+        for params in sweep:
+            service.run(name="vqe", params=params, journal=journal)
+
+        # In a new process
+        journal = JobJournal("jobs.db")
+        jobs = service.reattach(journal)
+        done = {entry.job_id: entry.result() for entry in journal.finished()}
+
+    Rows are only appended, never updated, so a crash can at worst lose the
+    last event. The journal can be shared between threads.
+    """
+
+    def __init__(self, path: str):
+        """JobJournal constructor.
+
+        Args:
+            path: Path of the SQLite database, created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        # Journals written before the base_params column was added.
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "base_params" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN base_params TEXT")
+
+    def _append(self, event: str, idempotency_key: str, **values: Any) -> None:
+        columns = ["recorded_at", "event", "idempotency_key"] + list(values)
+        row = [time.time(), event, idempotency_key] + list(values.values())
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO entries ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                row,
+            )
+
+    def record_submitting(
+        self,
+        idempotency_key: str,
+        program_id: Optional[str],
+        name: Optional[str],
+        backend: Optional[str],
+        params: Any,
+        params_blob: Optional[str] = None,
+        base_params: Any = None,
+    ) -> None:
+        """Record a submission before it is sent.
+
+        Args:
+            idempotency_key: Idempotency key of the submission.
+            program_id: Program ID.
+            name: Program name.
+            backend: Backend.
+            params: Program input parameters, JSON serializable.
+            params_blob: Hash of the params blob updated by ``params``.
+            base_params: Params of the blob, kept to upload it again if the
+                server dropped it when the submission is resent.
+        """
+        self._append(
+            SUBMITTING,
+            idempotency_key,
+            program_id=program_id,
+            program_name=name,
+            backend=backend,
+            params_hash=params_hash(params),
+            params=canonical_json(params),
+            params_blob=params_blob,
+            base_params=canonical_json(base_params) if base_params is not None else None,
+        )
+
+    def record_rejected(self, idempotency_key: str, error: str) -> None:
+        """Record a submission refused by the server."""
+        self._append(REJECTED, idempotency_key, error=error)
+
+    def record_submitted(self, idempotency_key: str, job: "RuntimeJob") -> None:
+        """Record the job created by a submission."""
+        self._append(
+            SUBMITTED,
+            idempotency_key,
+            job_id=job.job_id(),
+            program_id=job.program_id(),
+            backend=job.backend,
+            status=_STATUS_CODES[job._status],
+        )
+
+    def record_final(self, idempotency_key: str, job: "RuntimeJob") -> None:
+        """Record the final state and result of a job."""
+        self._append(
+            FINAL,
+            idempotency_key,
+            job_id=job.job_id(),
+            status=_STATUS_CODES[job._status],
+            result=json.dumps(job._result) if job._status == JobStatus.DONE else None,
+            finish_time=job._finish_time,
+            error=job._error_msg,
+        )
+
+    def watch(self, idempotency_key: str, job: "RuntimeJob") -> None:
+        """Record the final state of a job once it is seen finished."""
+
+        def _record(job: "RuntimeJob") -> None:
+            try:
+                self.record_final(idempotency_key, job)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Failed to journal the final state of job %s:\n%s",
+                    job.job_id(),
+                    traceback.format_exc(),
+                )
+
+        job.add_done_callback(_record)
+
+    def entries(self) -> List[JournalEntry]:
+        """Return the state of every submission, in submission order."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT event, idempotency_key, recorded_at, {', '.join(_COLUMNS)} "
+                "FROM entries ORDER BY seq"
+            ).fetchall()
+        entries = {}
+        for event, key, recorded_at, *values in rows:
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = JournalEntry(key)
+            if entry.event == FINAL:
+                continue
+            entry.event = event
+            entry.recorded_at = recorded_at
+            for column, value in zip(_COLUMNS, values):
+                if value is None:
+                    continue
+                if column in ("params", "base_params", "result"):
+                    setattr(entry, f"_{column}", value)
+                else:
+                    setattr(entry, column, value)
+        return list(entries.values())
+
+    def pending(self) -> List[JournalEntry]:
+        """Return the submissions sent but not answered, e.g. because of a crash."""
+        return [entry for entry in self.entries() if entry.event == SUBMITTING]
+
+    def live(self) -> List[JournalEntry]:
+        """Return the jobs created and not seen finished."""
+        return [entry for entry in self.entries() if entry.event == SUBMITTED]
+
+    def finished(self) -> List[JournalEntry]:
+        """Return the jobs seen finished, with their results."""
+        return [entry for entry in self.entries() if entry.event == FINAL]
+
+    def get(self, job_id: str) -> Optional[JournalEntry]:
+        """Return the entry of a job, ``None`` if not journaled."""
+        for entry in self.entries():
+            if entry.job_id == job_id:
+                return entry
+        return None
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "JobJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,365 @@
+"""Client-side priority scheduler of runtime jobs."""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import traceback
+from concurrent import futures
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledRun:
+    """A run waiting in, or released by, a :class:`JobScheduler`.
+
+    Attributes:
+        future: Future resolved with the :class:`RuntimeJob` once submitted,
+            or with the submission error.
+        priority: Priority of the run, higher runs first.
+        backend: Backend of the run.
+        program: Program id of the run.
+    """
+
+    def __init__(
+        self, run_kwargs: Dict[str, Any], priority: int, backend: str, program: str
+    ):
+        self.future: futures.Future = futures.Future()
+        self.priority = priority
+        self.backend = backend
+        self.program = program
+        self.enqueued_at = time.monotonic()
+        self._run_kwargs = run_kwargs
+
+    def job(self, timeout: Optional[float] = None):
+        """Wait for the submission and return the :class:`RuntimeJob`."""
+        return self.future.result(timeout=timeout)
+
+    def cancel(self) -> bool:
+        """Remove the run from the queue if it was not submitted yet.
+
+        Returns:
+            Whether the run was cancelled.
+        """
+        return self.future.cancel()
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} program={self.program} backend={self.backend} "
+            f"priority={self.priority}>"
+        )
+
+
+class JobScheduler:
+    """Queue runs and release them as backend and program capacity frees up.
+
+    Runs wait in a priority queue, higher priority first, then first in first
+    out. A run is submitted only while its backend and its program have less
+    jobs in flight than their caps. Runs wait in one queue per backend and
+    program, so the runs of a capped program stay aside until it has
+    capacity again and releasing a run costs no scan of the queue. A job stops being in flight once it is
+    seen in a final state, by the scheduler polling or by your own calls of
+    :meth:`RuntimeJob.status` or :meth:`RuntimeJob.result`::
+
+        scheduler = JobScheduler(service, backend_limits={"ScQ-P10": 2, "py_simu": 20})
+        runs = [scheduler.submit(name="vqe", backend="ScQ-P10", params=p) for p in sweep]
+        urgent = scheduler.submit(name="vqe", backend="ScQ-P10", priority=10)
+        print(scheduler.stats())
+        results = [run.job().result(wait=True) for run in runs]
+        scheduler.shutdown()
+    """
+
+    def __init__(
+        self,
+        service,
+        backend_limits: Optional[Dict[str, int]] = None,
+        program_limits: Optional[Dict[str, int]] = None,
+        default_backend_limit: int = 4,
+        default_program_limit: Optional[int] = None,
+        poll_interval: float = 2.0,
+        submit_workers: int = 4,
+    ):
+        """JobScheduler constructor.
+
+        Args:
+            service: :class:`RuntimeService` used to submit the runs.
+            backend_limits: Max jobs in flight per backend.
+            program_limits: Max jobs in flight per program id or name. A program
+                submitted by id or by name shares one cap.
+            default_backend_limit: Max jobs in flight of a backend missing from ``backend_limits``.
+            default_program_limit: Max jobs in flight of a program missing from
+                ``program_limits``. ``None`` means no limit.
+            poll_interval: Seconds between two polls of the jobs in flight.
+            submit_workers: Number of submissions sent at the same time.
+        """
+        self._service = service
+        self._backend_limits = dict(backend_limits or {})
+        self._program_limits = dict(program_limits or {})
+        self._default_backend_limit = default_backend_limit
+        self._default_program_limit = default_program_limit
+        self._poll_interval = poll_interval
+        # Backend -> program id -> heap of (-priority, sequence, run).
+        self._queues: Dict[str, Dict[str, List[tuple]]] = {}
+        self._sequence = itertools.count()
+        self._backend_in_flight: Dict[str, int] = {}
+        self._program_in_flight: Dict[str, int] = {}
+        # Job id -> (run, job) of the submitted jobs not seen final yet.
+        self._in_flight: Dict[str, tuple] = {}
+        # (program_id, name) given to submit -> (program id, program name).
+        self._programs: Dict[tuple, tuple] = {}
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._shutdown = False
+        self._lock = threading.RLock()
+        # Notified when jobs finish, waited on by the poller and by shutdown.
+        self._cond = threading.Condition(self._lock)
+        # Notified when a run may be dispatched, waited on by the dispatcher only.
+        self._work = threading.Condition(self._lock)
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=submit_workers, thread_name_prefix="job_scheduler"
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, name="job_scheduler_dispatch", daemon=True
+        )
+        self._poller = threading.Thread(
+            target=self._poll_loop, name="job_scheduler_poll", daemon=True
+        )
+        self._dispatcher.start()
+        self._poller.start()
+
+    def submit(
+        self,
+        program_id: str = None,
+        name: str = None,
+        backend: str = None,
+        params: dict = None,
+        priority: int = 0,
+        **run_kwargs: Any,
+    ) -> ScheduledRun:
+        """Queue a run.
+
+        Args:
+            program_id: Program ID.
+            name: Program name, if ``program_id`` is not given.
+            backend: Backend to run on. Runs without a backend share the ``None`` caps.
+            params: Program input parameters.
+            priority: Priority of the run, higher runs first.
+            **run_kwargs: Other arguments of :meth:`RuntimeService.run`.
+
+        Returns:
+            The queued run.
+
+        Raises:
+            ProgramNotFoundException: If the program is not found.
+        """
+        run_kwargs.update(
+            program_id=program_id, name=name, backend=backend, params=params
+        )
+        # Keyed by program ID, so runs by ID and by name share the program cap.
+        program_key, program_name = self._program(program_id, name)
+        run = ScheduledRun(run_kwargs, priority, backend, program_key)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("The scheduler is shut down.")
+            if program_key not in self._program_limits and program_name in self._program_limits:
+                self._program_limits[program_key] = self._program_limits[program_name]
+            heapq.heappush(
+                self._queues.setdefault(backend, {}).setdefault(program_key, []),
+                (-priority, next(self._sequence), run),
+            )
+            self._work.notify()
+        return run
+
+    def _program(self, program_id: Optional[str], name: Optional[str]) -> tuple:
+        """Return the id and name of a program, only looked up on the first submission."""
+        key = (program_id, name)
+        program = self._programs.get(key)
+        if program is None:
+            resolved = self._service.resolve_program(program_id, name)
+            program = (resolved.program_id or name, resolved.name)
+            self._programs[key] = program
+        return program
+
+    def _backend_limit(self, backend: str) -> int:
+        return self._backend_limits.get(backend, self._default_backend_limit)
+
+    def _program_limit(self, program: str) -> Optional[int]:
+        return self._program_limits.get(program, self._default_program_limit)
+
+    def _has_capacity(self, program: str) -> bool:
+        limit = self._program_limit(program)
+        return limit is None or self._program_in_flight.get(program, 0) < limit
+
+    def _next_run(self) -> Optional[ScheduledRun]:
+        """Pop the best run that has capacity. Caller holds the lock.
+
+        Only the heads of the queues of the backends and programs with
+        capacity are compared, so it costs the number of queues plus a heap pop.
+        """
+        best = None
+        for backend, programs in self._queues.items():
+            if self._backend_in_flight.get(backend, 0) >= self._backend_limit(backend):
+                continue
+            for program, queue in programs.items():
+                if not self._has_capacity(program):
+                    continue
+                while queue and queue[0][2].future.cancelled():
+                    heapq.heappop(queue)
+                if queue and (best is None or queue[0][:2] < best[0][:2]):
+                    best = queue[0], queue
+        if best is None:
+            return None
+        return heapq.heappop(best[1])[2]
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._lock:
+                run = None
+                while not self._shutdown:
+                    run = self._next_run()
+                    if run is not None:
+                        break
+                    self._work.wait()
+                if run is None:
+                    return
+                if not run.future.set_running_or_notify_cancel():
+                    continue
+                self._backend_in_flight[run.backend] = (
+                    self._backend_in_flight.get(run.backend, 0) + 1
+                )
+                self._program_in_flight[run.program] = (
+                    self._program_in_flight.get(run.program, 0) + 1
+                )
+            self._executor.submit(self._submit_run, run)
+
+    def _submit_run(self, run: ScheduledRun) -> None:
+        try:
+            job = self._service.run(**run._run_kwargs)
+        except BaseException as err:  # pylint: disable=broad-except
+            with self._cond:
+                self._failed += 1
+            self._release(run)
+            run.future.set_exception(err)
+            return
+        with self._cond:
+            self._submitted += 1
+            self._in_flight[job.job_id()] = (run, job)
+        run.future.set_result(job)
+        job.add_done_callback(lambda _: self._complete(run, job))
+
+    def _complete(self, run: ScheduledRun, job) -> None:
+        with self._cond:
+            if self._in_flight.pop(job.job_id(), None) is None:
+                return
+            self._completed += 1
+        self._release(run)
+
+    def _release(self, run: ScheduledRun) -> None:
+        with self._lock:
+            self._backend_in_flight[run.backend] -= 1
+            self._program_in_flight[run.program] -= 1
+            self._work.notify()
+            self._cond.notify_all()
+
+    def _poll_loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._shutdown and not self._in_flight:
+                    return
+                jobs = [job for _, job in self._in_flight.values()]
+            for job in jobs:
+                try:
+                    # Final states are reported through the done callback.
+                    job._refresh_status()
+                except Exception:  # pylint: disable=broad-except
+                    logger.warning(
+                        "Failed to poll job %s:\n%s", job.job_id(), traceback.format_exc()
+                    )
+            with self._cond:
+                self._cond.wait(timeout=self._poll_interval)
+
+    def _queued_runs(self):
+        """Yield the backend and the run of every queued entry. Caller holds the lock."""
+        for backend, programs in self._queues.items():
+            for queue in programs.values():
+                for _, _, run in queue:
+                    yield backend, run
+
+    def queue_depth(self, backend: Optional[str] = None) -> int:
+        """Return the number of queued runs, of one backend or of all of them."""
+        with self._cond:
+            if backend is not None:
+                programs = [self._queues.get(backend, {})]
+            else:
+                programs = list(self._queues.values())
+            return sum(
+                1
+                for queues in programs
+                for queue in queues.values()
+                for entry in queue
+                if not entry[2].future.cancelled()
+            )
+
+    def stats(self) -> dict:
+        """Return the queue depth and jobs in flight per backend and per program, and totals."""
+        with self._cond:
+            queued_backends: Dict[str, int] = {}
+            queued_programs: Dict[str, int] = {}
+            oldest = None
+            for backend, run in self._queued_runs():
+                if run.future.cancelled():
+                    continue
+                queued_backends[backend] = queued_backends.get(backend, 0) + 1
+                queued_programs[run.program] = queued_programs.get(run.program, 0) + 1
+                if oldest is None or run.enqueued_at < oldest:
+                    oldest = run.enqueued_at
+            return {
+                "queued": sum(queued_backends.values()),
+                "queued_per_backend": queued_backends,
+                "queued_per_program": queued_programs,
+                "in_flight_per_backend": {
+                    k: v for k, v in self._backend_in_flight.items() if v
+                },
+                "in_flight_per_program": {
+                    k: v for k, v in self._program_in_flight.items() if v
+                },
+                "oldest_wait": time.monotonic() - oldest if oldest is not None else 0.0,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self, wait: bool = True, cancel_queued: bool = False) -> None:
+        """Stop releasing runs.
+
+        Args:
+            wait: Whether to wait for the queued runs to be submitted and the
+                jobs in flight to finish.
+            cancel_queued: Whether to cancel the runs still queued.
+        """
+        if cancel_queued:
+            with self._lock:
+                for _, run in self._queued_runs():
+                    run.cancel()
+                self._queues = {}
+        if wait:
+            with self._lock:
+                self._cond.wait_for(
+                    lambda: not self._in_flight
+                    and not any(self._backend_in_flight.values())
+                    and all(run.future.cancelled() for _, run in self._queued_runs())
+                )
+        with self._lock:
+            self._shutdown = True
+            self._work.notify()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self) -> "JobScheduler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown(wait=exc[0] is None, cancel_queued=exc[0] is not None)
@@ -0,0 +1,179 @@
+"""Client-measured lifecycle timeline of runtime jobs."""
+
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+class JobTimeline:
+    """Monotonic-clock timeline of a job, as observed by the client.
+
+    Every event is recorded once, at the first time the client observes it:
+
+        * ``submitted``: the run request was sent.
+        * ``running``: the job was first seen running.
+        * ``first_interim``: the first interim result was received.
+        * ``final``: the job was first seen in a final state.
+        * ``result_requested`` / ``result_fetched``: the download of the
+          final result started / ended. For a request waiting for the job
+          to finish, it starts when the server answers, so the wait counts
+          in the run time and not in the fetch time.
+
+    Timestamps come from :func:`time.monotonic`, so only differences between
+    them are meaningful.
+    """
+
+    EVENTS = (
+        "submitted",
+        "running",
+        "first_interim",
+        "final",
+        "result_requested",
+        "result_fetched",
+    )
+
+    def __init__(self):
+        """JobTimeline constructor."""
+        self._events: Dict[str, float] = {}
+
+    def mark(self, event: str, when: Optional[float] = None) -> None:
+        """Record an event unless it was already recorded.
+
+        Args:
+            event: Name of the event, one of :attr:`EVENTS`.
+            when: Monotonic timestamp of the event. Default to now.
+        """
+        if event not in self.EVENTS:
+            raise ValueError(f"Unknown job timeline event: {event}")
+        if event not in self._events:
+            self._events[event] = time.monotonic() if when is None else when
+
+    def get(self, event: str) -> Optional[float]:
+        """Return the timestamp of an event, ``None`` if not recorded."""
+        return self._events.get(event)
+
+    def events(self) -> Dict[str, float]:
+        """Return all recorded events, in lifecycle order."""
+        return {
+            event: self._events[event] for event in self.EVENTS if event in self._events
+        }
+
+    def _delta(self, start: str, end: str) -> Optional[float]:
+        if start in self._events and end in self._events:
+            return self._events[end] - self._events[start]
+        return None
+
+    def queue_time(self) -> Optional[float]:
+        """Seconds between submission and the job first seen running."""
+        return self._delta("submitted", "running")
+
+    def run_time(self) -> Optional[float]:
+        """Seconds between the job first seen running and first seen final."""
+        return self._delta("running", "final")
+
+    def time_to_first_interim(self) -> Optional[float]:
+        """Seconds between submission and the first interim result."""
+        return self._delta("submitted", "first_interim")
+
+    def result_fetch_time(self) -> Optional[float]:
+        """Seconds spent downloading the final result, without waiting for the job."""
+        return self._delta("result_requested", "result_fetched")
+
+    def total_time(self) -> Optional[float]:
+        """Seconds between submission and the result downloaded."""
+        return self._delta("submitted", "result_fetched")
+
+    def durations(self) -> Dict[str, Optional[float]]:
+        """Return all the derived durations, keyed by name."""
+        return {name: getattr(self, name)() for name in TimelineSummary.DURATIONS}
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__}({self.durations()})>"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of sorted values."""
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+class TimelineSummary:
+    """Aggregated latency distributions of a collection of jobs.
+
+    Example::
+
+        summary = TimelineSummary(jobs)
+        print(summary.to_table())
+    """
+
+    DURATIONS = (
+        "queue_time",
+        "run_time",
+        "time_to_first_interim",
+        "result_fetch_time",
+        "total_time",
+    )
+
+    def __init__(self, jobs: Iterable):
+        """TimelineSummary constructor.
+
+        Args:
+            jobs: :class:`RuntimeJob` instances or :class:`JobTimeline` instances.
+        """
+        self._timelines = []
+        for job in jobs:
+            timeline = job if isinstance(job, JobTimeline) else job.timeline()
+            job_id = None if isinstance(job, JobTimeline) else job.job_id()
+            self._timelines.append((job_id, timeline))
+
+    def stats(self) -> Dict[str, dict]:
+        """Return the distribution of every duration.
+
+        Returns:
+            A dict keyed by duration name. Each value holds ``count``, ``mean``,
+            ``min``, ``p50``, ``p90``, ``p99`` and ``max``, in seconds. Jobs
+            missing the events of a duration are not counted for it.
+        """
+        stats = {}
+        for name in self.DURATIONS:
+            values = sorted(
+                value
+                for value in (getattr(t, name)() for _, t in self._timelines)
+                if value is not None
+            )
+            if not values:
+                stats[name] = {"count": 0}
+                continue
+            stats[name] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "min": values[0],
+                "p50": _percentile(values, 50),
+                "p90": _percentile(values, 90),
+                "p99": _percentile(values, 99),
+                "max": values[-1],
+            }
+        return stats
+
+    def to_rows(self) -> List[dict]:
+        """Return one row per job with its durations, suitable for a dataframe."""
+        rows = []
+        for job_id, timeline in self._timelines:
+            row = {"job_id": job_id}
+            row.update(timeline.durations())
+            rows.append(row)
+        return rows
+
+    def to_table(self) -> str:
+        """Return the distributions as a plain text table."""
+        columns = ("count", "mean", "min", "p50", "p90", "p99", "max")
+        header = f"{'duration':<24}" + "".join(f"{c:>10}" for c in columns)
+        lines = [header, "-" * len(header)]
+        for name, stat in self.stats().items():
+            line = f"{name:<24}{stat['count']:>10}"
+            for column in columns[1:]:
+                value = stat.get(column)
+                line += f"{value:>10.3f}" if value is not None else f"{'-':>10}"
+            lines.append(line)
+        return "\n".join(lines)
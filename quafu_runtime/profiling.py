@@ -0,0 +1,360 @@
+"""Opt-in profiling of quafu_runtime client operations.
+
+While a profile is active, the public methods of :class:`RuntimeService`,
+:class:`RuntimeJob` and :class:`RuntimeClient` are captured with
+:mod:`cProfile`, one profile per operation. Time is also broken down into
+network wait, JSON/base64/zlib codecs, pyflakes validation and user
+callbacks::
+
+    from quafu_runtime import profiling
+
+    with profiling.profile() as prof:
+        job = service.run(name="hello", backend="py_simu")
+        job.result(wait=True)
+    print(prof.report())
+    prof.stats("RuntimeService.run").print_stats(10)
+
+Setting the ``QUAFU_RUNTIME_PROFILE`` environment variable profiles the whole
+process and prints the report at exit. If its value is a directory, the
+per-operation profiles are also dumped there as ``.prof`` files.
+"""
+
+import atexit
+import cProfile
+import functools
+import importlib
+import inspect
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+ENV_VAR = "QUAFU_RUNTIME_PROFILE"
+
+CATEGORIES = ("network", "codec", "validation", "callbacks", "other")
+
+# Classes whose public methods are profiled, as (module, class name).
+_TARGETS = (
+    ("quafu_runtime.quafu_runtime_service", "RuntimeService"),
+    ("quafu_runtime.job.job", "RuntimeJob"),
+    ("quafu_runtime.clients.runtime_client", "RuntimeClient"),
+)
+
+# Operations taking a user callback, and the name of the callback argument.
+_CALLBACK_ARGS = {"RuntimeJob.interim_results": "callback"}
+
+# Substrings of file or function names, checked in order, attributing self time to a category.
+_CATEGORY_PATTERNS = (
+    ("validation", ("pyflakes", "check_python", "built-in method builtins.compile")),
+    (
+        "network",
+        ("requests", "urllib3", "http", "socket", "ssl", "websocket", "select"),
+    ),
+    ("codec", ("json", "base64", "binascii", "zlib")),
+)
+
+_lock = threading.Lock()
+_local = threading.local()
+_active: Optional["Profile"] = None
+_originals: Dict[tuple, Callable] = {}
+
+
+def _categorize(filename: str, funcname: str) -> str:
+    """Return the category of a profiled function."""
+    name = f"{filename}:{funcname}"
+    for category, patterns in _CATEGORY_PATTERNS:
+        if any(pattern in name for pattern in patterns):
+            return category
+    return "other"
+
+
+class OperationProfile:
+    """Profile of every call of one operation, e.g. ``RuntimeJob.result``.
+
+    Attributes:
+        name: Operation name.
+        calls: Number of calls.
+        wall_time: Total wall time of the calls, in seconds.
+        categories: Time spent per category, in seconds.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.categories = {category: 0.0 for category in CATEGORIES}
+        self._stats: Optional[pstats.Stats] = None
+
+    def add(self, wall_time: float, profiler: Optional[cProfile.Profile]) -> None:
+        """Merge one call into the operation profile.
+
+        Args:
+            wall_time: Wall time of the call.
+            profiler: Profiler that captured the call, ``None`` if it could not be enabled.
+        """
+        self.calls += 1
+        self.wall_time += wall_time
+        if profiler is None:
+            self.categories["other"] += wall_time
+            return
+        stats = pstats.Stats(profiler)
+        for (filename, _, funcname), entry in stats.stats.items():
+            self.categories[_categorize(filename, funcname)] += entry[2]
+        if self._stats is None:
+            self._stats = stats
+        else:
+            self._stats.add(stats)
+
+    def to_dict(self) -> dict:
+        """Return the operation profile as a dict."""
+        return {
+            "calls": self.calls,
+            "wall_time": self.wall_time,
+            "categories": dict(self.categories),
+        }
+
+
+class Profile:
+    """Profiling session collecting per-operation profiles."""
+
+    def __init__(self):
+        self._operations: Dict[str, OperationProfile] = {}
+        self._callback_time = 0.0
+        self._lock = threading.Lock()
+
+    def _operation(self, name: str) -> OperationProfile:
+        operation = self._operations.get(name)
+        if operation is None:
+            operation = OperationProfile(name)
+            self._operations[name] = operation
+        return operation
+
+    def _record(
+        self, name: str, wall_time: float, profiler: Optional[cProfile.Profile]
+    ) -> None:
+        with self._lock:
+            self._operation(name).add(wall_time, profiler)
+
+    def _record_callback(self, wall_time: float) -> None:
+        with self._lock:
+            self._callback_time += wall_time
+
+    def operations(self) -> Dict[str, dict]:
+        """Return the profile of every captured operation, keyed by name."""
+        with self._lock:
+            return {
+                name: operation.to_dict()
+                for name, operation in self._operations.items()
+            }
+
+    def stats(self, operation: str) -> Optional[pstats.Stats]:
+        """Return the :class:`pstats.Stats` of an operation.
+
+        Args:
+            operation: Operation name, e.g. ``RuntimeService.run``.
+
+        Returns:
+            The merged statistics of all the calls, ``None`` if not captured.
+        """
+        with self._lock:
+            op = self._operations.get(operation)
+            return op._stats if op is not None else None
+
+    def summary(self) -> Dict[str, float]:
+        """Return the total time spent per category, in seconds.
+
+        User callbacks run in the streaming threads, they are timed apart from
+        the operations.
+        """
+        with self._lock:
+            summary = {category: 0.0 for category in CATEGORIES}
+            for operation in self._operations.values():
+                for category, seconds in operation.categories.items():
+                    summary[category] += seconds
+            summary["callbacks"] += self._callback_time
+            return summary
+
+    def report(self) -> str:
+        """Return a text report of the operations and the category summary."""
+        header = f"{'operation':<36}{'calls':>8}{'wall(s)':>10}" + "".join(
+            f"{category:>12}" for category in CATEGORIES
+        )
+        lines = [header, "-" * len(header)]
+        for name, operation in sorted(self.operations().items()):
+            line = f"{name:<36}{operation['calls']:>8}{operation['wall_time']:>10.3f}"
+            for category in CATEGORIES:
+                line += f"{operation['categories'][category]:>12.3f}"
+            lines.append(line)
+        lines.append("-" * len(header))
+        summary = self.summary()
+        line = f"{'total':<54}"
+        for category in CATEGORIES:
+            line += f"{summary[category]:>12.3f}"
+        lines.append(line)
+        return "\n".join(lines)
+
+    def dump(self, directory: str) -> List[str]:
+        """Dump the statistics of every operation into ``<directory>/<operation>.prof``.
+
+        Args:
+            directory: Output directory, created if needed.
+
+        Returns:
+            Paths of the written files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self._lock:
+            for name, operation in self._operations.items():
+                if operation._stats is None:
+                    continue
+                path = os.path.join(directory, f"{name}.prof")
+                operation._stats.dump_stats(path)
+                paths.append(path)
+        return paths
+
+
+def _wrap_callback(profile: Profile, callback: Callable) -> Callable:
+    """Wrap a user callback to time it."""
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            profile._record_callback(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _wrap(name: str, method: Callable) -> Callable:
+    """Wrap a method to profile its calls under the operation ``name``."""
+    callback_arg = _CALLBACK_ARGS.get(name)
+    signature = inspect.signature(method) if callback_arg else None
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        prof = _active
+        # Only the outermost operation of a thread is profiled.
+        if prof is None or getattr(_local, "depth", 0):
+            return method(*args, **kwargs)
+        if callback_arg:
+            bound = signature.bind(*args, **kwargs)
+            if bound.arguments.get(callback_arg) is not None:
+                bound.arguments[callback_arg] = _wrap_callback(
+                    prof, bound.arguments[callback_arg]
+                )
+            args, kwargs = bound.args, bound.kwargs
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active, e.g. in another thread on Python 3.12+.
+            profiler = None
+        _local.depth = 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            wall_time = time.perf_counter() - start
+            _local.depth = 0
+            if profiler is not None:
+                profiler.disable()
+            prof._record(name, wall_time, profiler)
+
+    return wrapper
+
+
+def _patch() -> None:
+    """Replace the public methods of the target classes with profiling wrappers."""
+    for module_name, class_name in _TARGETS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or not inspect.isfunction(value):
+                continue
+            _originals[(cls, attr)] = value
+            setattr(cls, attr, _wrap(f"{class_name}.{attr}", value))
+
+
+def _unpatch() -> None:
+    """Restore the original methods of the target classes."""
+    for (cls, attr), value in _originals.items():
+        setattr(cls, attr, value)
+    _originals.clear()
+
+
+def start() -> Profile:
+    """Start profiling client operations.
+
+    Returns:
+        The active profile.
+
+    Raises:
+        RuntimeError: If a profile is already active.
+    """
+    global _active
+    with _lock:
+        if _active is not None:
+            raise RuntimeError("A quafu_runtime profile is already active.")
+        _patch()
+        _active = Profile()
+        return _active
+
+
+def stop() -> Optional[Profile]:
+    """Stop profiling client operations.
+
+    Returns:
+        The profile that was active, ``None`` if there was none.
+    """
+    global _active
+    with _lock:
+        profile = _active
+        _active = None
+        _unpatch()
+        return profile
+
+
+@contextmanager
+def profile() -> Iterator[Profile]:
+    """Profile the client operations run inside the ``with`` block.
+
+    Yields:
+        The :class:`Profile` collecting the operations.
+    """
+    prof = start()
+    try:
+        yield prof
+    finally:
+        stop()
+
+
+def _report_at_exit(directory: Optional[str]) -> None:
+    prof = stop()
+    if prof is None:
+        return
+    if directory:
+        prof.dump(directory)
+    print(prof.report(), file=sys.stderr)
+
+
+def enable_from_env() -> Optional[Profile]:
+    """Start a process-wide profile if the ``QUAFU_RUNTIME_PROFILE`` variable is set.
+
+    The report is printed to stderr at exit. Any value other than ``0``,
+    ``1`` or ``true`` is used as the directory to dump the profiles into.
+
+    Returns:
+        The started profile, ``None`` if profiling is not enabled.
+    """
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value.lower() in ("", "0", "false"):
+        return None
+    directory = None if value.lower() in ("1", "true") else value
+    prof = start()
+    atexit.register(_report_at_exit, directory)
+    return prof
@@ -0,0 +1,207 @@
+"""Batched circuit execution for runtime programs.
+
+Sending circuits one by one with ``task.send(qc, wait=True)`` pays a full
+backend round-trip per circuit. :class:`BatchedTask` submits a whole list
+of circuits without waiting, keeps up to ``max_in_flight`` of them queued
+on the backend, and collects their results in order::
+
+    from quafu_runtime.program.batch import BatchedTask
+
+    def run(task, userpub, params):
+        task.config(backend="ScQ-P18", shots=1000)
+        batched = BatchedTask(task, max_in_flight=16)
+        results = batched.run([build_circuit(theta) for theta in thetas])
+        return [res.counts for res in results]
+"""
+
+import logging
+import time
+from typing import Any, List, Optional, Sequence, Union
+
+from ..rtexceptions.rtexceptions import CircuitFailedException
+
+logger = logging.getLogger(__name__)
+
+# Task statuses of quafu results.
+_COMPLETED = "Completed"
+_FAILED_STATUSES = ("Failed", "Canceled")
+
+
+class _Pending:
+    """A circuit of a batch and its submission state."""
+
+    def __init__(self, index: int, circuit: Any, shots: Optional[int]):
+        self.index = index
+        self.circuit = circuit
+        self.shots = shots
+        self.attempts = 0
+        self.task_id = None  # type: Optional[str]
+
+
+class BatchedTask:
+    """Run many circuits through a quafu ``Task`` without waiting for each.
+
+    Circuits are sent with ``wait=False`` and their results polled with
+    ``task.retrieve``. A circuit whose submission raises, or whose task ends
+    ``Failed`` or ``Canceled``, is resubmitted up to ``max_retries`` times.
+
+    The task is only used from the calling thread, so its configuration,
+    e.g. ``task.shots``, is safe to change between circuits.
+
+    Attributes:
+        task: The wrapped task.
+        stats: Counts of submissions, retries and polls since creation.
+    """
+
+    def __init__(
+        self,
+        task: Any,
+        max_in_flight: int = 8,
+        max_retries: int = 2,
+        poll_interval: float = 1.0,
+        timeout: Optional[float] = None,
+    ):
+        """BatchedTask constructor.
+
+        Args:
+            task: Configured quafu ``Task``.
+            max_in_flight: Max number of circuits submitted and not finished.
+            max_retries: Max number of resubmissions of a circuit.
+            poll_interval: Seconds between two polls when no result arrived.
+            timeout: Max seconds a batch may take. Wait forever if ``None``.
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.task = task
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.stats = {"submitted": 0, "retries": 0, "polls": 0}
+
+    def run(
+        self,
+        circuits: Sequence[Any],
+        shots: Union[int, Sequence[int], None] = None,
+        name: str = "",
+    ) -> List[Any]:
+        """Run circuits and return their results.
+
+        Args:
+            circuits: Quafu circuits.
+            shots: Shots of every circuit, or of each circuit. Default to the
+                shots configured on the task.
+            name: Task name of the circuits.
+
+        Returns:
+            The ``ExecResult`` of each circuit, in the order of ``circuits``.
+
+        Raises:
+            CircuitFailedException: If a circuit still fails after its retries.
+            TimeoutError: If the batch takes longer than ``timeout``.
+        """
+        if shots is None or isinstance(shots, int):
+            shots = [shots] * len(circuits)
+        elif len(shots) != len(circuits):
+            raise ValueError("shots must have one value per circuit.")
+        queued = [
+            _Pending(index, circuit, count)
+            for index, (circuit, count) in enumerate(zip(circuits, shots))
+        ]
+        queued.reverse()
+        in_flight = []  # type: List[_Pending]
+        results = [None] * len(circuits)  # type: List[Any]
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        default_shots = getattr(self.task, "shots", None)
+        try:
+            while queued or in_flight:
+                while queued and len(in_flight) < self.max_in_flight:
+                    pending = queued.pop()
+                    result = self._submit(pending, name, default_shots)
+                    if result is None:
+                        self._retry_or_raise(pending, queued, "submission failed")
+                        time.sleep(self.poll_interval)
+                    elif not self._collect(pending, result, results, queued):
+                        in_flight.append(pending)
+                if not in_flight:
+                    continue
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(
+                        f"Batch of {len(circuits)} circuits timed out, "
+                        f"{len(in_flight) + len(queued)} not finished."
+                    )
+                finished = self._poll(in_flight, results, queued)
+                if not finished:
+                    time.sleep(self.poll_interval)
+        finally:
+            if default_shots is not None:
+                self.task.shots = default_shots
+        return results
+
+    def _submit(self, pending: _Pending, name: str, default_shots: Optional[int]) -> Any:
+        """Send a circuit without waiting, return ``None`` if it raised."""
+        pending.attempts += 1
+        self.task.shots = pending.shots if pending.shots is not None else default_shots
+        try:
+            result = self.task.send(pending.circuit, name=name, wait=False)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning(
+                "Submission of circuit %d failed.", pending.index, exc_info=True
+            )
+            return None
+        self.stats["submitted"] += 1
+        pending.task_id = result.taskid
+        return result
+
+    def _collect(
+        self, pending: _Pending, result: Any, results: List[Any], queued: List[_Pending]
+    ) -> bool:
+        """Store a finished result or requeue a failed circuit.
+
+        Returns:
+            Whether the circuit left the backend, finished or failed.
+        """
+        if result.task_status == _COMPLETED:
+            results[pending.index] = result
+            return True
+        if result.task_status in _FAILED_STATUSES:
+            self._retry_or_raise(pending, queued, f"task {result.task_status}")
+            return True
+        return False
+
+    def _poll(
+        self, in_flight: List[_Pending], results: List[Any], queued: List[_Pending]
+    ) -> int:
+        """Retrieve the circuits in flight once.
+
+        Returns:
+            Number of circuits that left the backend.
+        """
+        finished = 0
+        for pending in list(in_flight):
+            self.stats["polls"] += 1
+            try:
+                result = self.task.retrieve(pending.task_id)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Polling task %s failed.", pending.task_id, exc_info=True
+                )
+                continue
+            if self._collect(pending, result, results, queued):
+                in_flight.remove(pending)
+                finished += 1
+        return finished
+
+    def _retry_or_raise(self, pending: _Pending, queued: List[_Pending], reason: str) -> None:
+        if pending.attempts > self.max_retries:
+            raise CircuitFailedException(
+                f"Circuit {pending.index} failed after {pending.attempts} attempts: {reason}."
+            )
+        self.stats["retries"] += 1
+        # Retried next, before the circuits not submitted yet.
+        queued.append(pending)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "task":
+            raise AttributeError(name)
+        return getattr(self.task, name)
@@ -0,0 +1,171 @@
+"""Compact measurement counts for runtime programs.
+
+:class:`Counts` stores the distinct outcomes of an experiment as a uint64
+array of integer outcomes, bit ``j`` being classical bit ``j``, and an int64
+array of counts. That is 16 bytes per outcome instead of a Python string
+and int per outcome in a dict::
+
+    from quafu_runtime.program.counts import Counts
+
+    counts = Counts.from_dict(task.send(qc, wait=True).res)
+    pair = counts.marginal([0, 3])  # counts of bits 0 and 3
+    total = Counts.merge([counts, more_counts])
+    probabilities = total.normalize()
+
+Conversions from and to dicts are done on first use and cached.
+Registers of up to 64 classical bits are supported.
+"""
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+
+def _aggregate(outcomes: np.ndarray, counts: np.ndarray):
+    """Sum the counts of equal outcomes, sorted by outcome."""
+    unique, inverse = np.unique(outcomes, return_inverse=True)
+    return unique, np.bincount(inverse.reshape(-1), weights=counts, minlength=unique.size).astype(
+        np.int64
+    )
+
+
+class Counts:
+    """Counts of the outcomes of an experiment, backed by NumPy arrays."""
+
+    def __init__(
+        self,
+        outcomes: Optional[np.ndarray] = None,
+        counts: Optional[np.ndarray] = None,
+        num_bits: int = 0,
+    ):
+        """Counts constructor.
+
+        Args:
+            outcomes: Distinct integer outcomes, bit ``j`` being classical bit ``j``.
+            counts: Count of each outcome.
+            num_bits: Number of classical bits.
+        """
+        if num_bits > 64:
+            raise ValueError("At most 64 bits are supported.")
+        self._outcomes = (
+            np.asarray(outcomes, dtype=np.uint64) if outcomes is not None else None
+        )
+        self._counts = np.asarray(counts, dtype=np.int64) if counts is not None else None
+        self.num_bits = num_bits
+        self._dict = None  # type: Optional[Dict[str, int]]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> "Counts":
+        """Wrap a dict of counts keyed by bitstring, character ``j`` being bit ``j``.
+
+        The arrays are built on first use.
+        """
+        counts = cls(num_bits=len(next(iter(data))) if data else 0)
+        counts._dict = data
+        return counts
+
+    @classmethod
+    def from_result(cls, result) -> "Counts":
+        """Wrap the counts of a quafu ``ExecResult``."""
+        return cls.from_dict(result.res)
+
+    def _build_arrays(self) -> None:
+        data = self._dict or {}
+        keys = list(data)
+        bits = np.frombuffer("".join(keys).encode("ascii"), dtype=np.uint8)
+        bits = (bits.reshape(len(keys), self.num_bits) - ord("0")).astype(np.uint64)
+        self._outcomes = bits @ (np.uint64(1) << np.arange(self.num_bits, dtype=np.uint64))
+        self._counts = np.fromiter(data.values(), dtype=np.int64, count=len(keys))
+
+    @property
+    def outcomes(self) -> np.ndarray:
+        """Integer outcomes, uint64."""
+        if self._outcomes is None:
+            self._build_arrays()
+        return self._outcomes
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Count of each outcome, int64."""
+        if self._counts is None:
+            self._build_arrays()
+        return self._counts
+
+    @property
+    def shots(self) -> int:
+        """Total number of shots."""
+        if self._counts is None and self._dict is not None:
+            return sum(self._dict.values())
+        return int(self.counts.sum())
+
+    def __len__(self) -> int:
+        if self._outcomes is None and self._dict is not None:
+            return len(self._dict)
+        return self.outcomes.size
+
+    def bitstrings(self) -> np.ndarray:
+        """Return the outcomes as bitstrings, character ``j`` being bit ``j``."""
+        if not self.num_bits:
+            return np.full(len(self), "", dtype="<U1")
+        bits = (self.outcomes[:, None] >> np.arange(self.num_bits, dtype=np.uint64)) & np.uint64(1)
+        chars = (bits.astype(np.uint8) + ord("0")).tobytes()
+        return np.frombuffer(chars, dtype=f"S{self.num_bits}").astype(str)
+
+    def to_dict(self) -> Dict[str, int]:
+        """Return the counts as a dict keyed by bitstring."""
+        if self._dict is None:
+            self._dict = dict(zip(self.bitstrings().tolist(), self.counts.tolist()))
+        return self._dict
+
+    def __getitem__(self, bitstring: str) -> int:
+        if self._dict is not None:
+            return self._dict.get(bitstring, 0)
+        outcome = int(bitstring[::-1], 2)
+        found = self.outcomes == np.uint64(outcome)
+        return int(self.counts[found].sum())
+
+    def marginal(self, bits: Sequence[int]) -> "Counts":
+        """Return the counts of a subset of the bits.
+
+        Args:
+            bits: Bits to keep. Bit ``bits[j]`` becomes bit ``j``.
+
+        Returns:
+            The marginal counts.
+        """
+        bits = np.asarray(bits, dtype=np.uint64)
+        if bits.size and int(bits.max()) >= self.num_bits:
+            raise ValueError(f"Bits out of range of {self.num_bits} bits.")
+        kept = (self.outcomes[:, None] >> bits[None, :]) & np.uint64(1)
+        outcomes = kept @ (np.uint64(1) << np.arange(bits.size, dtype=np.uint64))
+        return Counts(*_aggregate(outcomes, self.counts), num_bits=bits.size)
+
+    @classmethod
+    def merge(cls, items: Iterable["Counts"]) -> "Counts":
+        """Return the sum of counts of the same bits, e.g. of several batches."""
+        items = [c if isinstance(c, Counts) else Counts.from_dict(c) for c in items]
+        if not items:
+            return cls()
+        num_bits = items[0].num_bits
+        if any(c.num_bits != num_bits for c in items):
+            raise ValueError("Counts must have the same number of bits to be merged.")
+        return cls(
+            *_aggregate(
+                np.concatenate([c.outcomes for c in items]),
+                np.concatenate([c.counts for c in items]),
+            ),
+            num_bits=num_bits,
+        )
+
+    def __add__(self, other: "Counts") -> "Counts":
+        return Counts.merge([self, other])
+
+    def normalize(self) -> np.ndarray:
+        """Return the probability of each outcome, in the order of :attr:`outcomes`."""
+        return self.counts / self.counts.sum()
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} bits={self.num_bits} "
+            f"outcomes={len(self)} shots={self.shots}>"
+        )
@@ -0,0 +1,176 @@
+"""Vectorized expectation values from measurement counts for runtime programs.
+
+Counts dicts map bitstrings to counts, character ``j`` of a bitstring being
+classical bit ``j``. They are converted once to arrays of integer outcomes,
+bit ``j`` of an outcome being classical bit ``j``, and the parities of all
+terms are computed at once with bit operations::
+
+    from quafu_runtime.program.expectation import energy
+
+    groups = hamiltonian.groups()
+    results = batched.run(hamiltonian.measurement_circuits(lambda: ansatz(theta)))
+    value, error = energy(hamiltonian, [res.res for res in results])
+
+Registers of up to 64 classical bits are supported.
+"""
+
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from .counts import Counts
+from .hamiltonian import MeasurementGroup, PauliHamiltonian
+
+CountsLike = Union[Dict[str, int], Counts]
+
+
+def counts_to_arrays(counts: CountsLike) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Convert counts to arrays.
+
+    Args:
+        counts: :class:`Counts`, or dict keyed by bitstrings all of the same length.
+
+    Returns:
+        The integer outcomes (uint64), their counts (int64) and the number of bits.
+    """
+    if not isinstance(counts, Counts):
+        counts = Counts.from_dict(counts)
+    return counts.outcomes, counts.counts, counts.num_bits
+
+
+def pack_masks(masks: np.ndarray) -> np.ndarray:
+    """Pack boolean masks of shape ``(terms, bits)`` into uint64, bit ``j`` from column ``j``."""
+    masks = np.atleast_2d(np.asarray(masks, dtype=np.uint64))
+    return masks @ (np.uint64(1) << np.arange(masks.shape[1], dtype=np.uint64))
+
+
+def parity(values: np.ndarray) -> np.ndarray:
+    """Return the parity of the set bits of each uint64 value, 0 or 1."""
+    values = np.array(values, dtype=np.uint64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        values ^= values >> np.uint64(shift)
+    return (values & np.uint64(1)).astype(np.int8)
+
+
+def eigenvalues(outcomes: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """Return the +1/-1 eigenvalue of each Z-basis term on each outcome.
+
+    Args:
+        outcomes: Integer outcomes, shape ``(outcomes,)``.
+        masks: Boolean masks of the terms, shape ``(terms, bits)``.
+
+    Returns:
+        Array of shape ``(outcomes, terms)``.
+    """
+    packed = pack_masks(masks)
+    return 1 - 2 * parity(outcomes[:, None] & packed[None, :])
+
+
+def expectation_values(
+    counts: CountsLike, masks: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the expectation values of many Z-basis terms and their standard errors.
+
+    Args:
+        counts: Counts, or dict keyed by bitstring.
+        masks: Boolean masks of the terms over the bits, shape ``(terms, bits)``.
+
+    Returns:
+        The expectation value and the standard error of each term.
+    """
+    outcomes, weights, _ = counts_to_arrays(counts)
+    shots = weights.sum()
+    values = weights @ eigenvalues(outcomes, masks) / shots
+    return values, np.sqrt(np.maximum(1 - values**2, 0) / shots)
+
+
+def group_statistics(
+    group: MeasurementGroup, counts: CountsLike
+) -> Tuple[float, float, int]:
+    """Return the mean and the single-shot variance of the observable of a group.
+
+    The observable is the weighted sum of the terms of the group, so the
+    variance accounts for the correlations of the terms, measured on the
+    same shots.
+
+    Args:
+        group: Measurement group.
+        counts: Counts of the group circuit.
+
+    Returns:
+        The mean, the variance and the number of shots.
+    """
+    outcomes, weights, _ = counts_to_arrays(counts)
+    shots = int(weights.sum())
+    # Value of the group observable on each outcome.
+    observable = eigenvalues(outcomes, group.masks) @ group.coeffs
+    mean = weights @ observable / shots
+    variance = max(weights @ observable**2 / shots - mean**2, 0.0)
+    return float(mean), float(variance), shots
+
+
+def group_expectation(
+    group: MeasurementGroup, counts: CountsLike
+) -> Tuple[float, float]:
+    """Return the weighted sum of the terms of a group and its standard error.
+
+    Args:
+        group: Measurement group.
+        counts: Counts of the group circuit.
+
+    Returns:
+        Sum of coefficient times expectation value over the terms, and its standard error.
+    """
+    mean, variance, shots = group_statistics(group, counts)
+    return mean, float(np.sqrt(variance / shots))
+
+
+def energy(
+    hamiltonian: PauliHamiltonian, counts: Sequence[CountsLike]
+) -> Tuple[float, float]:
+    """Return the expectation value of a Hamiltonian and its standard error.
+
+    Args:
+        hamiltonian: The Hamiltonian.
+        counts: Counts of the circuits of :meth:`PauliHamiltonian.measurement_circuits`,
+            in the order of the groups.
+
+    Returns:
+        The energy and its standard error.
+    """
+    groups = hamiltonian.groups()
+    if len(counts) != len(groups):
+        raise ValueError(f"Expected the counts of {len(groups)} groups.")
+    values = np.array([group_expectation(g, c) for g, c in zip(groups, counts)])
+    if not len(values):
+        return hamiltonian.constant, 0.0
+    return (
+        hamiltonian.constant + float(values[:, 0].sum()),
+        float(np.sqrt((values[:, 1] ** 2).sum())),
+    )
+
+
+def term_expectations(
+    hamiltonian: PauliHamiltonian, counts: Sequence[CountsLike]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the expectation value and standard error of every term.
+
+    Identity terms have value 1 and error 0.
+
+    Args:
+        hamiltonian: The Hamiltonian.
+        counts: Counts of the group circuits, in the order of the groups.
+
+    Returns:
+        Arrays of the values and errors, in the order of the terms.
+    """
+    groups = hamiltonian.groups()
+    if len(counts) != len(groups):
+        raise ValueError(f"Expected the counts of {len(groups)} groups.")
+    values = np.ones(hamiltonian.num_terms)
+    errors = np.zeros(hamiltonian.num_terms)
+    for group, group_counts in zip(groups, counts):
+        values[group.terms], errors[group.terms] = expectation_values(
+            group_counts, group.masks
+        )
+    return values, errors
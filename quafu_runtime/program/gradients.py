@@ -0,0 +1,183 @@
+"""Batched gradients of circuit expectation values for runtime programs.
+
+Gradients evaluate all their parameter sets as one batch, so all their
+circuits are submitted together through a :class:`BatchedTask`::
+
+    from quafu_runtime.program.batch import BatchedTask
+    from quafu_runtime.program.gradients import SPSA, make_evaluator, parameter_shift_gradient
+
+    def run(task, userpub, params):
+        batched = BatchedTask(task, max_in_flight=16)
+        # build(theta) returns the circuits of one energy, reduce(results) the energy.
+        evaluate = make_evaluator(batched, build, reduce)
+        theta = np.zeros(6)
+        for _ in range(10):
+            theta = theta - 0.1 * parameter_shift_gradient(evaluate, theta)
+
+An evaluator takes a 2D array of parameter sets, one per row, and returns
+the 1D array of their values.
+"""
+
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+Evaluator = Callable[[np.ndarray], np.ndarray]
+
+
+def make_evaluator(
+    batched: Any,
+    build: Callable[[np.ndarray], Sequence[Any]],
+    reduce: Callable[[List[Any]], float],
+    shots: Optional[int] = None,
+) -> Evaluator:
+    """Return an evaluator running all circuits of all parameter sets as one batch.
+
+    Args:
+        batched: :class:`BatchedTask` running the circuits.
+        build: Returns the circuits of one parameter set.
+        reduce: Returns the value of one parameter set from the results of its circuits.
+        shots: Shots of every circuit. Default to the shots of the task.
+
+    Returns:
+        The evaluator.
+    """
+
+    def evaluate(points: np.ndarray) -> np.ndarray:
+        points = np.atleast_2d(points)
+        circuits = [list(build(point)) for point in points]
+        results = batched.run([qc for group in circuits for qc in group], shots=shots)
+        values = np.empty(len(points))
+        start = 0
+        for index, group in enumerate(circuits):
+            values[index] = reduce(results[start : start + len(group)])
+            start += len(group)
+        return values
+
+    return evaluate
+
+
+def parameter_shift_points(params: np.ndarray, shift: float = np.pi / 2) -> np.ndarray:
+    """Return the shifted parameter sets of a parameter shift gradient.
+
+    Args:
+        params: Parameters, 1D.
+        shift: Shift of each parameter.
+
+    Returns:
+        Array of shape ``(2 * n, n)``: the ``n`` sets shifted up, then the ``n``
+        sets shifted down.
+    """
+    params = np.asarray(params, dtype=float)
+    offsets = shift * np.eye(params.size)
+    return np.concatenate((params + offsets, params - offsets))
+
+
+def parameter_shift_gradient(
+    evaluate: Evaluator, params: np.ndarray, shift: float = np.pi / 2
+) -> np.ndarray:
+    """Return the parameter shift gradient, with all ``2 * n`` evaluations in one batch.
+
+    Exact for gates generated by Pauli rotations, e.g. ``ry``, with ``shift = pi / 2``.
+
+    Args:
+        evaluate: Evaluator of the expectation value.
+        params: Parameters, 1D.
+        shift: Shift of each parameter.
+
+    Returns:
+        The gradient, same shape as ``params``.
+    """
+    params = np.asarray(params, dtype=float)
+    values = np.asarray(evaluate(parameter_shift_points(params, shift)), dtype=float)
+    plus, minus = values[: params.size], values[params.size :]
+    return (plus - minus) / (2 * np.sin(shift))
+
+
+class SPSA:
+    """Simultaneous perturbation stochastic approximation.
+
+    Each step estimates the gradient from two evaluations, at
+    ``params + c_k * delta`` and ``params - c_k * delta`` with a random
+    ``delta`` of +1 and -1, whatever the number of parameters. The gains
+    decay as ``a_k = a / (k + 1 + A) ** alpha`` and ``c_k = c / (k + 1) ** gamma``::
+
+        spsa = SPSA(a=0.2, c=0.1, seed=7)
+        for _ in range(100):
+            theta = spsa.step(evaluate, theta)
+    """
+
+    def __init__(
+        self,
+        a: float = 0.2,
+        c: float = 0.1,
+        alpha: float = 0.602,
+        gamma: float = 0.101,
+        stability: float = 0.0,
+        resamplings: int = 1,
+        seed: Optional[int] = None,
+    ):
+        """SPSA constructor.
+
+        Args:
+            a: Learning rate scale.
+            c: Perturbation scale.
+            alpha: Decay exponent of the learning rate.
+            gamma: Decay exponent of the perturbation.
+            stability: Stability constant ``A`` of the learning rate.
+            resamplings: Number of perturbations averaged per step, all
+                evaluated in the same batch.
+            seed: Seed of the perturbations.
+        """
+        self.a = a
+        self.c = c
+        self.alpha = alpha
+        self.gamma = gamma
+        self.stability = stability
+        self.resamplings = resamplings
+        self.iteration = 0
+        self._rng = np.random.default_rng(seed)
+
+    def learning_rate(self, k: Optional[int] = None) -> float:
+        """Return the learning rate of step ``k``, the current one by default."""
+        k = self.iteration if k is None else k
+        return self.a / (k + 1 + self.stability) ** self.alpha
+
+    def perturbation(self, k: Optional[int] = None) -> float:
+        """Return the perturbation size of step ``k``, the current one by default."""
+        k = self.iteration if k is None else k
+        return self.c / (k + 1) ** self.gamma
+
+    def gradient(self, evaluate: Evaluator, params: np.ndarray) -> np.ndarray:
+        """Estimate the gradient at the current step, with ``2 * resamplings`` evaluations.
+
+        Args:
+            evaluate: Evaluator of the expectation value.
+            params: Parameters, 1D.
+
+        Returns:
+            The gradient estimate.
+        """
+        params = np.asarray(params, dtype=float)
+        ck = self.perturbation()
+        deltas = self._rng.choice((-1.0, 1.0), size=(self.resamplings, params.size))
+        points = np.concatenate((params + ck * deltas, params - ck * deltas))
+        values = np.asarray(evaluate(points), dtype=float)
+        differences = values[: self.resamplings] - values[self.resamplings :]
+        # 1 / delta == delta for +-1 entries.
+        return (differences[:, None] * deltas).mean(axis=0) / (2 * ck)
+
+    def step(self, evaluate: Evaluator, params: np.ndarray) -> np.ndarray:
+        """Do one descent step.
+
+        Args:
+            evaluate: Evaluator of the expectation value.
+            params: Parameters, 1D.
+
+        Returns:
+            The new parameters.
+        """
+        gradient = self.gradient(evaluate, params)
+        params = np.asarray(params, dtype=float) - self.learning_rate() * gradient
+        self.iteration += 1
+        return params
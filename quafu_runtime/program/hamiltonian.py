@@ -0,0 +1,242 @@
+"""Pauli Hamiltonians and their measurement groups for runtime programs.
+
+A :class:`PauliHamiltonian` stores its terms as boolean ``x`` and ``z``
+masks, one row per term and one column per qubit: ``X`` is ``x`` only,
+``Z`` is ``z`` only and ``Y`` is both. Terms that commute qubit-wise are
+measured with one circuit::
+
+    from quafu_runtime.program.hamiltonian import PauliHamiltonian
+
+    hamiltonian = PauliHamiltonian.from_list(
+        [-1.05, [], 0.39, ["Z0"], 0.39, ["Z1"], 0.01, ["Z0", "Z1"], 0.18, ["X0", "X1"]]
+    )
+    groups = hamiltonian.groups()  # [ZZ group of 3 terms, XX group of 1 term]
+    circuits = hamiltonian.measurement_circuits(lambda: ansatz(theta))
+"""
+
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+_PAULIS = {"X": (True, False), "Y": (True, True), "Z": (False, True)}
+
+
+class MeasurementGroup:
+    """Qubit-wise commuting terms of a Hamiltonian, measured with one circuit.
+
+    Attributes:
+        terms: Indices of the terms in the Hamiltonian.
+        coeffs: Coefficients of the terms.
+        qubits: Measured qubits. Qubit ``qubits[j]`` is measured into classical bit ``j``.
+        bases: Measurement basis of each measured qubit, ``"X"``, ``"Y"`` or ``"Z"``.
+        masks: Boolean array of shape ``(len(terms), len(qubits))``, whether a
+            term acts on a measured qubit. The eigenvalue of a term on an
+            outcome is -1 to the number of its qubits measured 1.
+    """
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        coeffs: np.ndarray,
+        qubits: np.ndarray,
+        bases: str,
+        masks: np.ndarray,
+    ):
+        self.terms = terms
+        self.coeffs = coeffs
+        self.qubits = qubits
+        self.bases = bases
+        self.masks = masks
+
+    def apply(self, circuit: Any) -> Any:
+        """Append the basis change and the measurements of the group to a circuit.
+
+        Args:
+            circuit: Quafu circuit preparing the state, modified in place.
+
+        Returns:
+            The circuit.
+        """
+        for qubit, basis in zip(self.qubits.tolist(), self.bases):
+            if basis == "X":
+                circuit.h(qubit)
+            elif basis == "Y":
+                circuit.sdg(qubit)
+                circuit.h(qubit)
+        circuit.measure(self.qubits.tolist(), cbits=list(range(len(self.qubits))))
+        return circuit
+
+    def __repr__(self) -> str:
+        basis = "".join(
+            f"{b}{q}" for q, b in zip(self.qubits.tolist(), self.bases)
+        )
+        return f"<{self.__class__.__name__} basis={basis} terms={len(self.terms)}>"
+
+
+class PauliHamiltonian:
+    """Weighted sum of Pauli strings.
+
+    The arrays are read-only copies, so the cached measurement groups stay
+    valid. Build a new Hamiltonian to change the terms.
+
+    Attributes:
+        x: Boolean array of shape ``(num_terms, num_qubits)``, X part of each term.
+        z: Boolean array of shape ``(num_terms, num_qubits)``, Z part of each term.
+        coeffs: Real coefficients of the terms.
+    """
+
+    def __init__(self, x: np.ndarray, z: np.ndarray, coeffs: np.ndarray):
+        """PauliHamiltonian constructor.
+
+        Args:
+            x: X masks, one row per term.
+            z: Z masks, one row per term.
+            coeffs: Coefficients, one per term.
+        """
+        self.x = np.atleast_2d(np.array(x, dtype=bool))
+        self.z = np.atleast_2d(np.array(z, dtype=bool))
+        self.coeffs = np.array(coeffs, dtype=float).reshape(-1)
+        if self.x.shape != self.z.shape or self.x.shape[0] != self.coeffs.size:
+            raise ValueError("x, z and coeffs must have one row per term.")
+        for array in (self.x, self.z, self.coeffs):
+            array.flags.writeable = False
+        self._groups = None  # type: Optional[List[MeasurementGroup]]
+
+    @classmethod
+    def from_list(
+        cls, terms: Sequence[Any], num_qubits: Optional[int] = None
+    ) -> "PauliHamiltonian":
+        """Build a Hamiltonian from a flat list of coefficients and Pauli labels.
+
+        Args:
+            terms: ``[coeff, labels, coeff, labels, ...]``, labels being a list
+                like ``["X0", "Z3"]``. ``[]`` is the identity.
+            num_qubits: Number of qubits. Default to the highest qubit index plus one.
+
+        Returns:
+            The Hamiltonian.
+        """
+        coeffs = list(terms[0::2])
+        labels = [[(label[0].upper(), int(label[1:])) for label in term] for term in terms[1::2]]
+        if len(coeffs) != len(labels):
+            raise ValueError("terms must alternate coefficients and labels.")
+        if num_qubits is None:
+            num_qubits = 1 + max((q for term in labels for _, q in term), default=-1)
+        x = np.zeros((len(coeffs), num_qubits), dtype=bool)
+        z = np.zeros_like(x)
+        for row, term in enumerate(labels):
+            for pauli, qubit in term:
+                if pauli not in _PAULIS:
+                    raise ValueError(f"Unknown Pauli {pauli}{qubit}.")
+                x[row, qubit], z[row, qubit] = _PAULIS[pauli]
+        return cls(x, z, coeffs)
+
+    def to_list(self) -> list:
+        """Return the Hamiltonian in the flat list form of :meth:`from_list`."""
+        terms = []
+        for coeff, xs, zs in zip(self.coeffs.tolist(), self.x, self.z):
+            labels = [
+                f"{'Y' if xs[q] and zs[q] else 'X' if xs[q] else 'Z'}{q}"
+                for q in np.flatnonzero(xs | zs)
+            ]
+            terms += [coeff, labels]
+        return terms
+
+    @property
+    def num_qubits(self) -> int:
+        """Number of qubits."""
+        return self.x.shape[1]
+
+    @property
+    def num_terms(self) -> int:
+        """Number of terms, identity included."""
+        return self.coeffs.size
+
+    def identity_terms(self) -> np.ndarray:
+        """Return whether each term is the identity."""
+        return ~(self.x | self.z).any(axis=1)
+
+    @property
+    def constant(self) -> float:
+        """Sum of the coefficients of the identity terms."""
+        return float(self.coeffs[self.identity_terms()].sum())
+
+    def simplify(self, atol: float = 0.0) -> "PauliHamiltonian":
+        """Return the Hamiltonian with duplicate terms summed and null terms dropped.
+
+        Args:
+            atol: Terms with a coefficient not above it in magnitude are dropped.
+        """
+        rows = np.concatenate((self.x, self.z), axis=1)
+        unique, inverse = np.unique(rows, axis=0, return_inverse=True)
+        coeffs = np.zeros(len(unique))
+        np.add.at(coeffs, inverse.reshape(-1), self.coeffs)
+        keep = np.abs(coeffs) > atol
+        n = self.num_qubits
+        return PauliHamiltonian(unique[keep, :n], unique[keep, n:], coeffs[keep])
+
+    def groups(self) -> List[MeasurementGroup]:
+        """Return the measurement groups of the non-identity terms.
+
+        Terms are grouped greedily, largest coefficients first, so each
+        group has terms acting as the same Pauli on each shared qubit. The
+        result is cached.
+        """
+        if self._groups is not None:
+            return self._groups
+        support = self.x | self.z
+        order = [i for i in np.argsort(-np.abs(self.coeffs), kind="stable") if support[i].any()]
+        group_x = np.zeros((0, self.num_qubits), dtype=bool)
+        group_z = np.zeros_like(group_x)
+        group_support = np.zeros_like(group_x)
+        members = []  # type: List[List[int]]
+        for term in order:
+            tx, tz, ts = self.x[term], self.z[term], support[term]
+            conflicts = (group_support & ts & ((group_x != tx) | (group_z != tz))).any(axis=1)
+            free = np.flatnonzero(~conflicts)
+            if free.size:
+                index = free[0]
+                group_x[index] |= tx
+                group_z[index] |= tz
+                group_support[index] |= ts
+                members[index].append(term)
+            else:
+                group_x = np.vstack((group_x, tx))
+                group_z = np.vstack((group_z, tz))
+                group_support = np.vstack((group_support, ts))
+                members.append([term])
+        groups = []
+        for gx, gz, gs, terms in zip(group_x, group_z, group_support, members):
+            qubits = np.flatnonzero(gs)
+            terms = np.array(sorted(terms))
+            bases = "".join(
+                "Y" if gx[q] and gz[q] else "X" if gx[q] else "Z" for q in qubits
+            )
+            groups.append(
+                MeasurementGroup(
+                    terms=terms,
+                    coeffs=self.coeffs[terms],
+                    qubits=qubits,
+                    bases=bases,
+                    masks=support[np.ix_(terms, qubits)],
+                )
+            )
+        self._groups = groups
+        return groups
+
+    def measurement_circuits(self, prepare: Callable[[], Any]) -> List[Any]:
+        """Return one measurement circuit per group.
+
+        Args:
+            prepare: Returns a new circuit preparing the state, called once per group.
+
+        Returns:
+            The circuits, in the order of :meth:`groups`.
+        """
+        return [group.apply(prepare()) for group in self.groups()]
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} qubits={self.num_qubits} "
+            f"terms={self.num_terms}>"
+        )
@@ -0,0 +1,171 @@
+"""Variance-aware shot allocation for runtime programs.
+
+The variance of an energy estimate is ``sum(sigma_i ** 2 / n_i)`` over the
+measurement groups, ``sigma_i`` being the single-shot standard deviation of
+group ``i`` and ``n_i`` its shots. For a fixed budget it is minimal with
+``n_i`` proportional to ``sigma_i``. :class:`ShotAllocator` estimates the
+``sigma_i`` from the counts of previous rounds, starting from the bound
+``sum(abs(coeffs))`` of each group::
+
+    from quafu_runtime.program.shots import ShotAllocator
+
+    allocator = ShotAllocator(hamiltonian, total_shots=3000, min_shots=50)
+    for theta in thetas:
+        circuits = hamiltonian.measurement_circuits(lambda: ansatz(theta))
+        results = allocator.run(batched, circuits)
+        value, error = energy(hamiltonian, [res.res for res in results])
+"""
+
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from .expectation import CountsLike, group_statistics
+from .hamiltonian import PauliHamiltonian
+
+
+def allocate_shots(
+    sigmas: Sequence[float], total_shots: int, min_shots: int = 1
+) -> np.ndarray:
+    """Split a shot budget proportionally to standard deviations.
+
+    Every group gets at least ``min_shots``. The rest of the budget is split
+    proportionally to ``sigmas`` and rounded with the largest remainders, so
+    the shots sum to ``total_shots``.
+
+    Args:
+        sigmas: Single-shot standard deviation of each group.
+        total_shots: Shot budget.
+        min_shots: Minimum shots of a group, at least 1.
+
+    Returns:
+        The shots of each group, int64.
+
+    Raises:
+        ValueError: If ``min_shots`` is less than 1 or the budget is less
+            than ``min_shots`` for each group.
+    """
+    if min_shots < 1:
+        raise ValueError(f"min_shots must be at least 1, got {min_shots}.")
+    sigmas = np.maximum(np.asarray(sigmas, dtype=float).reshape(-1), 0.0)
+    if not sigmas.size:
+        return np.zeros(0, dtype=np.int64)
+    if min_shots * sigmas.size > total_shots:
+        raise ValueError(
+            f"A budget of {total_shots} shots is less than {min_shots} "
+            f"shots for each of {sigmas.size} groups."
+        )
+    weights = sigmas if sigmas.sum() > 0 else np.ones_like(sigmas)
+    shots = np.full(sigmas.size, min_shots, dtype=np.int64)
+    # Give the budget to the groups below their proportional share, until the
+    # share of the others is above the floor.
+    fixed = np.zeros(sigmas.size, dtype=bool)
+    while True:
+        budget = total_shots - min_shots * fixed.sum()
+        ideal = np.where(fixed, 0.0, budget * weights / weights[~fixed].sum())
+        below = ~fixed & (ideal < min_shots)
+        if not below.any():
+            break
+        fixed |= below
+    shots[~fixed] = np.floor(ideal[~fixed])
+    remainders = np.where(fixed, -1.0, ideal - shots)
+    missing = total_shots - int(shots.sum())
+    shots[np.argsort(-remainders, kind="stable")[:missing]] += 1
+    return shots
+
+
+class ShotAllocator:
+    """Allocate the shots of the measurement groups of a Hamiltonian.
+
+    Attributes:
+        hamiltonian: The Hamiltonian.
+        total_shots: Shot budget of one energy evaluation.
+        min_shots: Minimum shots of a group.
+        decay: Weight of the previous variance estimates in an update.
+        variances: Current single-shot variance estimate of each group.
+    """
+
+    def __init__(
+        self,
+        hamiltonian: PauliHamiltonian,
+        total_shots: int,
+        min_shots: int = 10,
+        decay: float = 0.5,
+    ):
+        """ShotAllocator constructor.
+
+        Args:
+            hamiltonian: The Hamiltonian.
+            total_shots: Shot budget of one energy evaluation.
+            min_shots: Minimum shots of a group, at least 1, so every
+                group is measured and its variance estimated.
+            decay: Weight of the previous variance estimates in an update,
+                between 0, only the last counts, and 1, never updated.
+
+        Raises:
+            ValueError: If ``min_shots`` is less than 1.
+        """
+        if min_shots < 1:
+            raise ValueError(f"min_shots must be at least 1, got {min_shots}.")
+        self.hamiltonian = hamiltonian
+        self.total_shots = total_shots
+        self.min_shots = min_shots
+        self.decay = decay
+        groups = hamiltonian.groups()
+        # The observable of a group is within -sum(|c|) and sum(|c|).
+        self.variances = np.array([np.abs(g.coeffs).sum() ** 2 for g in groups])
+        self._observed = np.zeros(len(groups), dtype=bool)
+
+    @property
+    def sigmas(self) -> np.ndarray:
+        """Current single-shot standard deviation estimate of each group."""
+        return np.sqrt(self.variances)
+
+    def allocate(self, total_shots: Optional[int] = None) -> List[int]:
+        """Return the shots of each group, in the order of ``hamiltonian.groups()``.
+
+        Args:
+            total_shots: Shot budget. Default to ``total_shots``.
+        """
+        total = self.total_shots if total_shots is None else total_shots
+        return allocate_shots(self.sigmas, total, self.min_shots).tolist()
+
+    def update(self, counts: Sequence[CountsLike]) -> None:
+        """Update the variance estimates from the counts of the groups.
+
+        Args:
+            counts: Counts of the group circuits, in the order of the groups.
+        """
+        groups = self.hamiltonian.groups()
+        if len(counts) != len(groups):
+            raise ValueError(f"Expected the counts of {len(groups)} groups.")
+        for index, (group, group_counts) in enumerate(zip(groups, counts)):
+            _, variance, _ = group_statistics(group, group_counts)
+            if self._observed[index]:
+                variance = self.decay * self.variances[index] + (1 - self.decay) * variance
+            self.variances[index] = variance
+            self._observed[index] = True
+
+    def predicted_error(self, shots: Optional[Sequence[int]] = None) -> float:
+        """Return the standard error of the energy expected with an allocation.
+
+        Args:
+            shots: Shots of each group. Default to :meth:`allocate`.
+        """
+        shots = np.asarray(self.allocate() if shots is None else shots, dtype=float)
+        return float(np.sqrt((self.variances / shots).sum()))
+
+    def run(self, batched: Any, circuits: Sequence[Any], name: str = "") -> List[Any]:
+        """Run the group circuits with allocated shots and update the estimates.
+
+        Args:
+            batched: :class:`BatchedTask` running the circuits.
+            circuits: Circuits of the groups, in the order of the groups.
+            name: Task name of the circuits.
+
+        Returns:
+            The ``ExecResult`` of each circuit.
+        """
+        results = batched.run(circuits, shots=self.allocate(), name=name)
+        self.update([res.res for res in results])
+        return results
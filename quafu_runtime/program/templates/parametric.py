@@ -0,0 +1,190 @@
+"""Parametric circuits for runtime programs.
+
+A variational program sends the same circuit structure many times with
+different angles. :class:`ParametricCircuit` builds the circuit once with
+probe values, finds which gate angles are parameters, and caches the OpenQASM
+of the circuit with placeholders for them. Binding a parameter vector then only
+formats the cached text::
+
+    from quafu_runtime.program.templates.parametric import ParametricCircuit
+
+    def ansatz(theta):
+        qc = QuantumCircuit(2)
+        qc.ry(0, theta[0])
+        qc.cnot(0, 1)
+        qc.ry(1, theta[1])
+        qc.measure([0, 1], cbits=[0, 1])
+        return qc
+
+    template = ParametricCircuit(ansatz, num_params=2)
+    res = task.send(template.bind(theta), wait=True)
+
+Parameters must be used directly as gate angles, e.g. ``qc.ry(0, theta[0])``,
+not ``qc.ry(0, 2 * theta[0])``, and the structure of the circuit must not
+depend on their values.
+"""
+
+from typing import Any, Callable, List, Sequence, Tuple
+
+import numpy as np
+
+# Probe values of the parameters, distinct and unlikely to be constants of a circuit.
+_PROBE_SEEDS = (20240601, 20240602)
+
+
+def _probe_values(seed: int, num_params: int) -> np.ndarray:
+    return np.random.default_rng(seed).uniform(-10.0, 10.0, num_params)
+
+
+def _structure(circuit: Any) -> List[Tuple[str, Tuple[int, ...]]]:
+    return [(gate.name, tuple(gate.pos)) for gate in circuit.gates]
+
+
+def _angles(gate: Any) -> List[Any]:
+    return list(getattr(gate, "paras", None) or [])
+
+
+class BoundCircuit:
+    """A parametric circuit with values bound, ready to be sent with ``task.send``.
+
+    It has the attributes ``task.send`` uses: ``num``, ``gates`` and
+    ``to_openqasm``. ``gates`` are the gates of the template circuit and
+    only describe the structure, their angles are not the bound values. Use
+    :meth:`ParametricCircuit.circuit` to get a full ``QuantumCircuit``.
+
+    Attributes:
+        values: The bound parameter values.
+        openqasm: The OpenQASM of the circuit.
+    """
+
+    def __init__(self, template: "ParametricCircuit", values: np.ndarray, qasm: str):
+        self._template = template
+        self.values = values
+        self.openqasm = qasm
+
+    @property
+    def num(self) -> int:
+        """Number of qubits."""
+        return self._template.num_qubits
+
+    @property
+    def gates(self) -> List[Any]:
+        """Gates of the template circuit."""
+        return self._template.gates
+
+    def to_openqasm(self, with_para: bool = False) -> str:  # pylint: disable=unused-argument
+        """Return the cached OpenQASM of the circuit."""
+        return self.openqasm
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} qubits={self.num} "
+            f"params={self.values.size}>"
+        )
+
+
+class ParametricCircuit:
+    """A circuit structure built once and rebound from parameter vectors.
+
+    Attributes:
+        build: Returns the quafu circuit of a parameter vector.
+        num_params: Number of parameters.
+        template: OpenQASM of the circuit, parameter ``k`` being the
+            placeholder ``{k!r}`` of ``str.format``.
+    """
+
+    def __init__(self, build: Callable[[np.ndarray], Any], num_params: int):
+        """ParametricCircuit constructor.
+
+        The builder is called twice with probe values to find where the
+        parameters are used.
+
+        Args:
+            build: Returns the quafu circuit of a parameter vector.
+            num_params: Number of parameters.
+
+        Raises:
+            ValueError: If the structure of the circuit depends on the
+                parameters, or a gate angle depends on them other than by
+                being one of them.
+        """
+        self.build = build
+        self.num_params = num_params
+        probes = [_probe_values(seed, num_params) for seed in _PROBE_SEEDS]
+        first, second = [build(probe.copy()) for probe in probes]
+        if _structure(first) != _structure(second) or first.measures != second.measures:
+            raise ValueError("The structure of the circuit depends on its parameters.")
+        self._circuit = first
+        self.num_qubits = first.num
+        self.template = self._make_template(first, second, probes)
+
+    @property
+    def gates(self) -> List[Any]:
+        """Gates of the circuit built with probe values."""
+        return self._circuit.gates
+
+    def _make_template(self, first: Any, second: Any, probes: Sequence[np.ndarray]) -> str:
+        """Return the OpenQASM of ``first`` with placeholders for the parameters."""
+        qasm = first.to_openqasm()
+        parts = []  # type: List[str]
+        position = 0
+        for gate, other in zip(first.gates, second.gates):
+            line = gate.to_qasm()
+            slots = self._slots(_angles(gate), _angles(other), probes)
+            if slots is None:
+                if line != other.to_qasm():
+                    raise ValueError(f"Gate {gate.name} depends on the parameters.")
+                continue
+            start = qasm.index(line, position)
+            parts.append(qasm[position:start].replace("{", "{{").replace("}", "}}"))
+            # The angles of a gate are formatted as "name(a,b,...) qubits".
+            tail = line[line.index(")") + 1 :]
+            parts.append(f"{gate.name.lower()}({','.join(slots)}){tail}")
+            position = start + len(line)
+        parts.append(qasm[position:].replace("{", "{{").replace("}", "}}"))
+        return "".join(parts)
+
+    @staticmethod
+    def _slots(angles: List[Any], others: List[Any], probes: Sequence[np.ndarray]):
+        """Return the placeholders of the angles of a gate, ``None`` if all are constant."""
+        if angles == others:
+            return None
+        slots = []
+        for angle, other in zip(angles, others):
+            if angle == other:
+                slots.append(repr(float(angle)))
+                continue
+            matches = np.flatnonzero((probes[0] == angle) & (probes[1] == other))
+            if not matches.size:
+                raise ValueError(
+                    "Gate angles must be parameters or constants, "
+                    f"got {angle} for probe values."
+                )
+            slots.append(f"{{{matches[0]}!r}}")
+        return slots
+
+    def qasm(self, values: Sequence[float]) -> str:
+        """Return the OpenQASM of the circuit with the parameters bound."""
+        values = np.asarray(values, dtype=float).reshape(-1)
+        if values.size != self.num_params:
+            raise ValueError(f"Expected {self.num_params} parameters, got {values.size}.")
+        return self.template.format(*values.tolist())
+
+    def bind(self, values: Sequence[float]) -> BoundCircuit:
+        """Return the circuit with the parameters bound, to be sent with ``task.send``."""
+        values = np.array(values, dtype=float).reshape(-1)
+        return BoundCircuit(self, values, self.qasm(values))
+
+    def bind_many(self, points: np.ndarray) -> List[BoundCircuit]:
+        """Return the bound circuits of parameter sets, one per row."""
+        return [self.bind(point) for point in np.atleast_2d(points)]
+
+    def circuit(self, values: Sequence[float]) -> Any:
+        """Return a full quafu circuit with the parameters bound, calling the builder."""
+        return self.build(np.array(values, dtype=float).reshape(-1))
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} qubits={self.num_qubits} "
+            f"params={self.num_params} gates={len(self.gates)}>"
+        )
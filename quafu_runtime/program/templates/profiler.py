@@ -0,0 +1,260 @@
+"""Profiler helper for runtime programs.
+
+It measures how much wall time a program spends in ``task`` round-trips and
+in sections you mark yourself, and publishes a compact summary through
+``userpub.publish``::
+
+    from quafu_runtime.program.templates.profiler import ProgramProfiler
+
+    def run(task, userpub, params):
+        profiler = ProgramProfiler(userpub, publish_interval=30)
+        task = profiler.wrap_task(task)
+        for i in range(10):
+            with profiler.section("build"):
+                qc = build_circuit(params)
+            res = task.send(qc, wait=True)  # timed as "task.send"
+            with profiler.section("postprocess"):
+                energy = compute_energy(res)
+        profiler.publish()
+        return energy
+
+On the client, decode the interim results with :class:`ProfileDecoder` to get
+:class:`ProgramProfile` objects::
+
+    job.interim_results(callback=print, decoder=ProfileDecoder)
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from ...job.decoder import ResultDecoder
+from ...utils.keywords import PROFILE
+
+# Task methods timed by the task wrapper.
+_TASK_METHODS = ("send", "retrieve", "retrieve_group", "submit", "run")
+
+
+class SectionStats:
+    """Timing statistics of one profiled section.
+
+    Attributes:
+        count: Number of times the section ran.
+        total: Total wall time, in seconds.
+        max: Longest single run, in seconds.
+    """
+
+    def __init__(self, count: int = 0, total: float = 0.0, max_time: float = 0.0):
+        self.count = count
+        self.total = total
+        self.max = max_time
+
+    def add(self, seconds: float) -> None:
+        """Record one run of the section."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        """Average wall time of a run, in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self) -> str:
+        return f"SectionStats(count={self.count}, total={self.total:.3f}, max={self.max:.3f})"
+
+
+class ProgramProfile:
+    """Profile summary published by a program.
+
+    Attributes:
+        wall_time: Wall time of the program when the summary was published, in seconds.
+        sections: :class:`SectionStats` keyed by section name.
+        final: Whether this is the last summary of the program.
+    """
+
+    def __init__(
+        self,
+        wall_time: float,
+        sections: Dict[str, SectionStats],
+        final: bool = False,
+    ):
+        self.wall_time = wall_time
+        self.sections = sections
+        self.final = final
+
+    def to_dict(self) -> dict:
+        """Return the compact message form of the profile."""
+        return {
+            PROFILE: {
+                "wall": round(self.wall_time, 6),
+                "final": self.final,
+                "sections": {
+                    name: [stats.count, round(stats.total, 6), round(stats.max, 6)]
+                    for name, stats in self.sections.items()
+                },
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProgramProfile":
+        """Build a profile from its compact message form.
+
+        Args:
+            data: Decoded profile message.
+
+        Returns:
+            The profile.
+        """
+        data = data[PROFILE]
+        sections = {
+            name: SectionStats(count, total, max_time)
+            for name, (count, total, max_time) in data["sections"].items()
+        }
+        return cls(data["wall"], sections, data.get("final", False))
+
+    def fraction(self, section: str) -> float:
+        """Return the fraction of the program wall time spent in a section."""
+        stats = self.sections.get(section)
+        if stats is None or not self.wall_time:
+            return 0.0
+        return stats.total / self.wall_time
+
+    def unaccounted(self) -> float:
+        """Wall time not covered by any section, in seconds.
+
+        Nested sections are counted twice, so this can be negative.
+        """
+        return self.wall_time - sum(stats.total for stats in self.sections.values())
+
+    def __str__(self) -> str:
+        header = f"{'section':<24}{'count':>8}{'total(s)':>10}{'mean(s)':>10}{'max(s)':>10}{'share':>8}"
+        lines = [f"Program wall time: {self.wall_time:.3f}s", header]
+        for name, stats in sorted(
+            self.sections.items(), key=lambda item: -item[1].total
+        ):
+            lines.append(
+                f"{name:<24}{stats.count:>8}{stats.total:>10.3f}{stats.mean:>10.3f}"
+                f"{stats.max:>10.3f}{self.fraction(name):>8.1%}"
+            )
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} wall_time={self.wall_time:.3f} sections={list(self.sections)}>"
+
+
+class _ProfiledTask:
+    """Proxy of a :class:`quafu.Task` timing its round-trip methods."""
+
+    def __init__(self, task: Any, profiler: "ProgramProfiler"):
+        self._task = task
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._task, name)
+        if name not in _TASK_METHODS or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with self._profiler.section(f"task.{name}"):
+                return attr(*args, **kwargs)
+
+        return timed
+
+
+class ProgramProfiler:
+    """Collect section timings in a program and publish them through ``userpub``.
+
+    Summaries are published at most every ``publish_interval`` seconds while
+    sections are recorded, and once more by :meth:`publish`.
+    """
+
+    def __init__(self, userpub: Any, publish_interval: Optional[float] = 30.0):
+        """ProgramProfiler constructor.
+
+        Args:
+            userpub: The ``userpub`` argument of the program ``run`` method.
+            publish_interval: Minimum seconds between two periodic summaries.
+                ``None`` disables periodic publishing.
+        """
+        self._userpub = userpub
+        self._publish_interval = publish_interval
+        self._start = time.perf_counter()
+        self._last_publish = self._start
+        self._sections: Dict[str, SectionStats] = {}
+        self._lock = threading.Lock()
+
+    def wrap_task(self, task: Any) -> Any:
+        """Return a proxy of ``task`` timing ``send``, ``retrieve`` and the other round-trip methods."""
+        return _ProfiledTask(task, self)
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """Time the ``with`` block as a run of section ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record a run of section ``name`` measured by yourself.
+
+        Args:
+            name: Section name.
+            seconds: Wall time of the run.
+        """
+        with self._lock:
+            stats = self._sections.get(name)
+            if stats is None:
+                stats = self._sections[name] = SectionStats()
+            stats.add(seconds)
+            now = time.perf_counter()
+            due = (
+                self._publish_interval is not None
+                and now - self._last_publish >= self._publish_interval
+            )
+            if due:
+                # Claimed under the lock, so concurrent records publish once.
+                self._last_publish = now
+        if due:
+            self._publish(final=False)
+
+    def profile(self, final: bool = False) -> ProgramProfile:
+        """Return the current profile."""
+        with self._lock:
+            sections = {
+                name: SectionStats(stats.count, stats.total, stats.max)
+                for name, stats in self._sections.items()
+            }
+        return ProgramProfile(time.perf_counter() - self._start, sections, final)
+
+    def publish(self, final: bool = True) -> None:
+        """Publish the current profile summary to the client.
+
+        Args:
+            final: Whether this is the last summary of the program.
+        """
+        with self._lock:
+            self._last_publish = time.perf_counter()
+        self._publish(final)
+
+    def _publish(self, final: bool) -> None:
+        message = json.dumps(self.profile(final).to_dict(), separators=(",", ":"))
+        self._userpub.publish(message.encode("utf-8"))
+
+
+class ProfileDecoder(ResultDecoder):
+    """Result decoder turning profile summaries into :class:`ProgramProfile` objects.
+
+    Other messages are decoded by :class:`ResultDecoder`.
+    """
+
+    @classmethod
+    def decode(cls, data: str) -> Any:
+        decoded = super().decode(data)
+        if isinstance(decoded, dict) and PROFILE in decoded:
+            return ProgramProfile.from_dict(decoded)
+        return decoded
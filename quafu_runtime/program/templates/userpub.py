@@ -1,3 +1,40 @@
+"""Interim result publishing of runtime programs.
+
+Each ``userpub.publish`` call is one websocket message to every client
+streaming the job. Programs publishing often can wrap ``userpub`` in a
+:class:`CoalescingUserPub`, which sends the pending messages together::
+
+    from quafu_runtime.program.templates.userpub import CoalescingUserPub
+
+    def run(task, userpub, params):
+        with CoalescingUserPub(userpub, max_delay=1.0, max_rate=2) as pub:
+            for i in range(1000):
+                pub.publish(f"iteration {i}".encode(), topic="progress")
+                pub.publish(json.dumps(energies[i]).encode())
+
+``RuntimeJob.interim_results`` unpacks the batches, so the client callback
+still gets one message per ``publish``.
+
+Messages may be published to named channels, e.g. ``"progress"`` and
+``"debug"``, so clients subscribe only to the channels they need::
+
+    publish_channel(userpub, "progress", b"50%")
+    pub.publish(json.dumps(state).encode(), channel="debug")
+"""
+
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from ...utils.jsonutil import decode_checkpoint
+from ...utils.keywords import CHANNEL, CHECKPOINT, DEFAULT_CHANNEL, INTERIM_BATCH
+
+logger = logging.getLogger(__name__)
+
+
 class UserPub:
     """
     The class Used to publish interim result to user client. It must be the second param of run method.
@@ -16,3 +53,267 @@ class UserPub:
             message: Msg user want to publish when running.
         """
         pass
+
+    def checkpoint(self, state: Any):
+        """Save the state of the program, replacing the previous checkpoint.
+
+        The state is encoded with :func:`~quafu_runtime.utils.jsonutil.encode_checkpoint`,
+        so it may hold arrays, complex numbers and circuits. A job run with
+        ``resume_from`` set to this job gets it back with :func:`load_checkpoint`.
+
+        Args:
+            state: JSON serializable state.
+        """
+        pass
+
+
+def load_checkpoint(params: Any) -> Any:
+    """Return the checkpoint a resumed run starts from, ``None`` for a fresh run.
+
+    Usage::
+
+        def run(task, userpub, params):
+            state = load_checkpoint(params) or {"iteration": 0, "theta": initial_theta}
+            for i in range(state["iteration"], 10):
+                ...
+                userpub.checkpoint({"iteration": i + 1, "theta": theta})
+
+    Args:
+        params: Params given to the program.
+    """
+    if isinstance(params, dict) and params.get(CHECKPOINT) is not None:
+        return decode_checkpoint(params[CHECKPOINT])
+    return None
+
+
+def pack_interim_batch(messages: List[str], channel: Optional[str] = None) -> bytes:
+    """Return the message publishing several interim messages at once.
+
+    Args:
+        messages: Interim messages.
+        channel: Channel of the messages. Default to the default channel.
+    """
+    # The channel comes first, so the server reads it without parsing the batch.
+    envelope = {CHANNEL: channel} if channel not in (None, DEFAULT_CHANNEL) else {}
+    envelope[INTERIM_BATCH] = messages
+    return json.dumps(envelope, separators=(",", ":")).encode("utf-8")
+
+
+def publish_channel(userpub: UserPub, channel: str, message: bytes) -> None:
+    """Publish an interim message to a named channel.
+
+    Args:
+        userpub: UserPub given to the program.
+        channel: Channel name.
+        message: Message, UTF-8 encoded bytes.
+    """
+    if channel == DEFAULT_CHANNEL:
+        userpub.publish(message)
+        return
+    if isinstance(message, bytes):
+        message = message.decode("utf-8")
+    userpub.publish(pack_interim_batch([message], channel))
+
+
+class CoalescingUserPub:
+    """UserPub sending interim messages in batches.
+
+    Messages are queued and sent by a background thread, as one batch, when
+    the oldest one waited ``max_delay`` seconds or ``max_batch`` messages or
+    ``max_bytes`` bytes are pending. With ``max_rate``, batches are sent at
+    most that many times per second. A message published with a ``topic``
+    replaces the pending message of the same topic, so only the latest
+    value of a progress topic is sent. Consecutive messages of the same
+    channel are sent as one batch.
+
+    Call :meth:`close`, or use it as a context manager, so the last messages
+    are sent before the program returns.
+
+    If the wrapped ``userpub`` fails to send a batch in the background, the
+    batch is dropped, the thread keeps sending the next ones, and the error
+    is raised by the next :meth:`publish` or :meth:`close`.
+
+    Attributes:
+        stats: Counts of messages published, of batches sent and of topic
+            messages replaced before being sent.
+    """
+
+    def __init__(
+        self,
+        userpub: UserPub,
+        max_delay: float = 1.0,
+        max_batch: int = 100,
+        max_bytes: int = 1 << 20,
+        max_rate: Optional[float] = None,
+    ):
+        """CoalescingUserPub constructor.
+
+        Args:
+            userpub: UserPub given to the program.
+            max_delay: Max seconds a message waits before its batch is sent.
+            max_batch: Number of pending messages sending a batch.
+            max_bytes: Size of pending messages sending a batch.
+            max_rate: Max number of batches sent per second. No limit if ``None``.
+        """
+        self.userpub = userpub
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.stats = {"messages": 0, "batches": 0, "replaced": 0}
+        self._pending = []  # type: List[Tuple[str, str]]
+        # (channel, topic) -> index of its message in _pending.
+        self._topics = {}
+        self._pending_bytes = 0
+        self._oldest = 0.0
+        self._last_sent = float("-inf")
+        self._closed = False
+        self._condition = threading.Condition()
+        # Held while sending, so batches reach userpub in order.
+        self._send_lock = threading.Lock()
+        self._thread = None  # type: Optional[threading.Thread]
+        # Error of the last batch failed in the background, not raised yet.
+        self._error = None  # type: Optional[Exception]
+
+    def publish(
+        self,
+        message: bytes,
+        topic: Optional[str] = None,
+        channel: str = DEFAULT_CHANNEL,
+    ) -> None:
+        """Queue an interim message.
+
+        Args:
+            message: Message, UTF-8 encoded bytes.
+            topic: If given, the message replaces the pending message of the
+                same topic and channel.
+            channel: Channel of the message.
+
+        Raises:
+            Exception: The error of a batch that failed in the background
+                since the last call.
+        """
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        with self._condition:
+            if self._closed:
+                raise ValueError("Publishing on a closed CoalescingUserPub.")
+            self._raise_error()
+            self.stats["messages"] += 1
+            index = self._topics.get((channel, topic)) if topic is not None else None
+            if index is not None:
+                self._pending_bytes += len(message) - len(self._pending[index][1])
+                self._pending[index] = (channel, message)
+                self.stats["replaced"] += 1
+            else:
+                if not self._pending:
+                    self._oldest = time.monotonic()
+                if topic is not None:
+                    self._topics[(channel, topic)] = len(self._pending)
+                self._pending.append((channel, message))
+                self._pending_bytes += len(message)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="coalescing_userpub", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def flush(self) -> None:
+        """Send the pending messages now, whatever the rate limit."""
+        with self._send_lock:
+            with self._condition:
+                messages = self._take()
+            self._send(messages)
+
+    def checkpoint(self, state: Any) -> None:
+        """Send the pending messages, then save a checkpoint with the wrapped userpub."""
+        self.flush()
+        self.userpub.checkpoint(state)
+
+    def close(self) -> None:
+        """Send the pending messages and stop the background thread.
+
+        Raises:
+            Exception: The error of a batch that failed in the background
+                and was not raised by :meth:`publish` yet.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._condition:
+            self._raise_error()
+
+    def __enter__(self) -> "CoalescingUserPub":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _raise_error(self) -> None:
+        """Raise the error of a failed background batch once. Caller holds the condition."""
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _full(self) -> bool:
+        return len(self._pending) >= self.max_batch or self._pending_bytes >= self.max_bytes
+
+    def _take(self) -> List[Tuple[str, str]]:
+        """Return and clear the pending messages. Caller holds the condition."""
+        messages = self._pending
+        self._pending = []
+        self._topics = {}
+        self._pending_bytes = 0
+        return messages
+
+    def _send(self, messages: List[Tuple[str, str]]) -> None:
+        """Publish one batch per run of messages of the same channel. Caller holds the send lock."""
+        if not messages:
+            return
+        for channel, run in itertools.groupby(messages, key=lambda item: item[0]):
+            texts = [text for _, text in run]
+            if channel == DEFAULT_CHANNEL and len(texts) == 1:
+                # A lone message is sent as is, as userpub.publish would.
+                self.userpub.publish(texts[0].encode("utf-8"))
+            else:
+                self.userpub.publish(pack_interim_batch(texts, channel))
+            self.stats["batches"] += 1
+        self._last_sent = time.monotonic()
+
+    def _wait_time(self) -> Optional[float]:
+        """Return the seconds before the next batch is due, ``None`` if nothing is pending."""
+        if not self._pending:
+            return None
+        due = time.monotonic() if self._full() else self._oldest + self.max_delay
+        due = max(due, self._last_sent + self.min_interval)
+        return max(due - time.monotonic(), 0.0)
+
+    def _run(self) -> None:
+        """Send the batches when they are due, until closed."""
+        while True:
+            with self._condition:
+                timeout = self._wait_time()
+                while timeout != 0.0 and not self._closed:
+                    self._condition.wait(timeout)
+                    timeout = self._wait_time()
+                if self._closed:
+                    return
+            with self._send_lock:
+                with self._condition:
+                    # A flush may have sent the messages meanwhile.
+                    if self._wait_time() != 0.0:
+                        continue
+                    messages = self._take()
+                try:
+                    self._send(messages)
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.warning(
+                        "Failed to publish a batch of interim results.", exc_info=True
+                    )
+                    with self._condition:
+                        self._error = err
+                    self._last_sent = time.monotonic()
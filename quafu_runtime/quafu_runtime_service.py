@@ -1,13 +1,27 @@
+import logging
+import threading
+import traceback
+import uuid
 import warnings
+from concurrent import futures
 from .utils.jsonutil import to_base64_string, from_base64_string
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Union, Dict, Any, List
 from .rtexceptions.rtexceptions import *
 from .clients.account import Account
 from .program.program import RuntimeProgram
-from .clients.runtime_client import RuntimeClient
+from .clients.registry import get_account, get_client
+from .clients.runtime_client import BLOB_NOT_FOUND, RuntimeClient
+from .clients.metrics import RequestMetrics
+from .clients.concurrency import AdaptiveConcurrencyLimiter
+from .job.cache import RunCache, source_hash
 from .job.job import RuntimeJob
-from .utils.check_python import check
-from .utils.keywords import MESSAGE
+from .job.jobstatus import JOB_FINAL_STATES
+from .job.journal import FINAL, SUBMITTING, JobJournal
+from .job.timeline import JobTimeline
+from .utils.jsonutil import params_hash
+from .utils.keywords import CHECKPOINT, MESSAGE
+
+logger = logging.getLogger(__name__)
 
 
 class RuntimeService:
@@ -56,22 +70,45 @@ class RuntimeService:
     See more message about program templates in quafu_runtime.program.template
     """
 
-    def __init__(self, account: Account = None):
+    def __init__(
+        self,
+        account: Account = None,
+        api_client: Optional[RuntimeClient] = None,
+        run_cache: Optional[RunCache] = None,
+    ):
         """QiskitRuntimeService constructor
 
         Args:
             account: Account instance.
+            api_client: Client used to access the server. Default to the client
+                shared by every service of the account.
+            run_cache: Cache of the results of deterministic runs, see :meth:`run`.
 
         Returns:
             An instance of service.
         """
         if account is None:
-            account = Account()
+            account = get_account()
         self._account = account
         self._url = account.get_url()
         self._token = account.get_token()
-        self._client = RuntimeClient(self._token, self._url)
+        self._client = api_client
+        if self._client is None:
+            self._client = get_client(self._token, self._url)
+        self._run_cache = run_cache
         self._programs = {}
+        # Program IDs keyed by program name, so runs by name are resolved once.
+        self._program_ids = {}  # type: Dict[str, str]
+        # Guards `_programs` and `_program_ids`, the service can be shared between threads.
+        self._programs_lock = threading.RLock()
+
+    def metrics(self) -> RequestMetrics:
+        """Return the request metrics of the client used by this service and its jobs."""
+        return self._client.metrics
+
+    def limiter(self) -> AdaptiveConcurrencyLimiter:
+        """Return the concurrency limiter of the requests of this service and its jobs."""
+        return self._client.limiter
 
     def list_programs(
         self,
@@ -118,6 +155,11 @@ class RuntimeService:
         Returns:
             A list of runtime programs.
         """
+        with self._programs_lock:
+            return self._programs_page(refresh=refresh, limit=limit, skip=skip)
+
+    def _programs_page(self, refresh: bool, limit: int, skip: int):
+        """Fetch programs if needed and return a page of the cache. Caller holds the lock."""
         # Need to fetch
         if len(self._programs) == 0 or refresh:
             fetch_page_limit = 10
@@ -149,6 +191,8 @@ class RuntimeService:
                 for prog_dict in program_page:
                     program_id = prog_dict["program_id"]
                     self._programs[program_id] = prog_dict
+                    if prog_dict.get("name") is not None:
+                        self._program_ids[prog_dict["name"]] = program_id
                 if (
                     len(self._programs) == count
                     or len(self._programs) >= limit + skip
@@ -181,8 +225,13 @@ class RuntimeService:
         """
         # return result from cache
         if refresh is False:
-            if program_id in self._programs and "data" in self._programs[program_id]:
-                return self._programs[program_id]
+            with self._programs_lock:
+                if program_id is None:
+                    cached = self._programs.get(self._program_ids.get(name))
+                else:
+                    cached = self._programs.get(program_id)
+            if cached is not None and "data" in cached:
+                return cached
 
         if name is None and program_id is None:
             raise ArgsException(f"name or program_id is a required field.")
@@ -208,9 +257,12 @@ class RuntimeService:
         if "data" in response:
             response["data"] = from_base64_string(response["data"]).decode("utf-8")
         program.update(response)
-        if self._programs is None:
-            self._programs = {}
-        self._programs[program_id] = response
+        # Cached under the ID of the program found, never under None for a lookup by name.
+        if program.program_id is not None:
+            with self._programs_lock:
+                self._programs[program.program_id] = response
+                if program.name is not None:
+                    self._program_ids[program.name] = program.program_id
         return program
 
     def upload_program(self, data: str, metadata: dict = None):
@@ -247,6 +299,9 @@ class RuntimeService:
             file = open(filename, "w")
             file.write(data)
             file.close()
+        # Imported here, pyflakes is only needed when uploading.
+        from .utils.check_python import check
+
         check(data, filename)
 
         # Upload it.
@@ -319,6 +374,8 @@ class RuntimeService:
                 file = open(filename, "w")
                 file.write(data)
                 file.close()
+            from .utils.check_python import check
+
             check(data, filename)
             data = to_base64_string(data)
 
@@ -355,9 +412,8 @@ class RuntimeService:
             response["data"] = from_base64_string(response["data"]).decode("utf-8")
         program.update(response)
         print("After update, the program is:\n", program)
-        if self._programs is None:
-            self._programs = {}
-        self._programs[program_id] = response
+        with self._programs_lock:
+            self._programs[program_id] = response
         return
 
     def delete_program(self, program_id: str):
@@ -373,8 +429,10 @@ class RuntimeService:
             raise ProgramNotFoundException(f"Program not found: {program_id}") from None
         elif status_code != 200:
             raise UpdateException(f"Failed to delete program: Unkown Error.") from None
-        if program_id in self._programs:
-            del self._programs[program_id]
+        with self._programs_lock:
+            self._programs.pop(program_id, None)
+            for name in [n for n, pid in self._program_ids.items() if pid == program_id]:
+                del self._program_ids[name]
         print(f"Program {program_id} deleted.")
         return
 
@@ -384,30 +442,255 @@ class RuntimeService:
         name: str = None,
         backend: str = None,
         params: dict = None,
+        max_retries: int = 3,
+        idempotency_key: Optional[str] = None,
+        journal: Optional[JobJournal] = None,
+        use_cache: bool = True,
+        base_params: Any = None,
+        resume_from: Union[str, RuntimeJob, None] = None,
     ) -> RuntimeJob:
         """
         Run a program on the server.
 
+        The submission carries an idempotency key, so it is safely retried on
+        connection errors and transient server errors: the server never
+        creates two jobs for one call.
+
         Args:
             program_id: Program ID.
             name: Optional, use it to find Program ID.
             backend: Optional, it will be used in the program. It's useless up to now.
             params: Program input parameters. These input values are passed
                 to the runtime program.
+            max_retries: Max number of retries of the submission.
+            idempotency_key: Key identifying the submission. A random one is generated if not provided.
+                Pass the same key to resubmit safely from another call or process.
+            journal: Journal recording the submission, the job id and its final
+                state, see :meth:`reattach`.
+            use_cache: Whether to use the run cache of the service. If a
+                cached run has the same program, program source, backend and
+                params, its completed job is returned without submitting.
+                Pass ``False`` to always submit.
+            base_params: Params shared by many runs, e.g. a Hamiltonian. They are
+                uploaded once as a blob named by their hash, and runs only send
+                the hash. The job params are ``base_params`` updated with the
+                keys of ``params``.
+            resume_from: Job, or job ID, whose last checkpoint the program
+                starts from. The encoded checkpoint is added to ``params``,
+                the program reads it with ``load_checkpoint(params)``, so
+                ``params`` and ``base_params`` must be dicts or ``None``.
 
         Returns:
             A ``Job`` instance representing the execution.
 
+        Raises:
+            InputValueException: If the job of ``resume_from`` saved no checkpoint,
+                or its params are not a dict.
         """
         if program_id is None and name is None:
             raise ArgsException("one of program_id and name is needed.")
+        if resume_from is not None:
+            params = self._resume_params(resume_from, params, base_params)
+        params_blob = params_hash(base_params) if base_params is not None else None
+        cache_key = None
+        if use_cache and self._run_cache is not None:
+            cache_key, ttl, job = self._lookup_run_cache(
+                program_id, name, backend, params, params_blob, base_params
+            )
+            if job is not None:
+                return job
+        if journal is None:
+            job = self._submit(
+                program_id,
+                name,
+                backend,
+                params,
+                max_retries,
+                idempotency_key,
+                params_blob,
+                base_params,
+            )
+        else:
+            job = self._submit_journaled(
+                journal,
+                program_id,
+                name,
+                backend,
+                params,
+                max_retries,
+                idempotency_key,
+                params_blob,
+                base_params,
+            )
+        if cache_key is not None:
+            self._run_cache.watch(cache_key, job, ttl)
+        return job
 
-        status_code, response = self._client.program_run(
-            program_id=program_id,
-            name=name,
-            backend=backend,
+    def _resume_params(
+        self, resume_from: Union[str, RuntimeJob], params: Any, base_params: Any = None
+    ) -> dict:
+        """Return params with the last checkpoint of a job added."""
+        for value in (params, base_params):
+            if value is not None and not isinstance(value, dict):
+                raise InputValueException(
+                    "A run resumed from a checkpoint needs dict params, the "
+                    f"checkpoint is passed under the key {CHECKPOINT!r}, got "
+                    f"{type(value).__name__}."
+                ) from None
+        if not isinstance(resume_from, RuntimeJob):
+            resume_from = RuntimeJob(
+                job_id=resume_from, account=self._account, api_client=self._client
+            )
+        checkpoint = resume_from.checkpoint(decode=False)
+        if checkpoint is None:
+            raise InputValueException(
+                f"Job {resume_from.job_id()} saved no checkpoint to resume from."
+            ) from None
+        params = dict(params or {})
+        params[CHECKPOINT] = checkpoint
+        return params
+
+    def resolve_program(
+        self, program_id: Optional[str] = None, name: Optional[str] = None
+    ) -> RuntimeProgram:
+        """Return a program by id or name, from the program cache if fetched before.
+
+        Unlike :meth:`program`, the program is always a :class:`RuntimeProgram`.
+
+        Args:
+            program_id: Program ID.
+            name: Program name, if ``program_id`` is not given.
+
+        Returns:
+            The program.
+
+        Raises:
+            ProgramNotFoundException: If the program is not found.
+        """
+        program = self.program(program_id=program_id, name=name)
+        if isinstance(program, dict):
+            cached, program = program, RuntimeProgram(program_id=program_id)
+            program.update(cached)
+        return program
+
+    def _lookup_run_cache(
+        self,
+        program_id: Optional[str],
+        name: Optional[str],
+        backend: Optional[str],
+        params: Optional[dict],
+        params_blob: Optional[str],
+        base_params: Any = None,
+    ) -> tuple:
+        """Look a run up in the run cache.
+
+        Returns:
+            The cache key and ttl of the run, ``None`` if its policy does not
+            cache it, and the cached job, ``None`` if missing.
+        """
+        program = self.resolve_program(program_id, name)
+        backend = backend or program.backend
+        policy = self._run_cache.policy(program.program_id, program.name)
+        if not policy.applies(backend):
+            return None, None, None
+        key_params = params
+        if params_blob is not None:
+            key_params = {"params_blob": params_blob, "params": params}
+        key = RunCache.key(program.program_id, source_hash(program.data), backend, key_params)
+        cached = self._run_cache.get(key)
+        if cached is None:
+            return key, policy.ttl, None
+        if base_params is not None:
+            params = base_params if params is None else {**base_params, **params}
+        job = RuntimeJob(
+            job_id=cached["job_id"],
+            account=self._account,
+            status=2,
+            api_client=self._client,
+            backend=cached["backend"],
+            program_id=program.program_id,
             params=params,
+            result=cached["result"],
+            finish_time=cached["finish_time"],
         )
+        print(f"job reused from the run cache, job_id is {job.job_id()}")
+        return key, policy.ttl, job
+
+    def _submit_journaled(
+        self,
+        journal: JobJournal,
+        program_id: Optional[str],
+        name: Optional[str],
+        backend: Optional[str],
+        params: Optional[dict],
+        max_retries: int,
+        idempotency_key: Optional[str],
+        params_blob: Optional[str] = None,
+        base_params: Any = None,
+    ) -> RuntimeJob:
+        """Submit a run and record it in a journal, see :meth:`run`."""
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
+        journal.record_submitting(
+            idempotency_key, program_id, name, backend, params, params_blob, base_params
+        )
+        try:
+            job = self._submit(
+                program_id,
+                name,
+                backend,
+                params,
+                max_retries,
+                idempotency_key,
+                params_blob,
+                base_params,
+            )
+        except ClientExceptions as err:
+            # Refused by the server. Connection errors stay pending, the
+            # server may have created the job.
+            journal.record_rejected(idempotency_key, str(err))
+            raise
+        journal.record_submitted(idempotency_key, job)
+        journal.watch(idempotency_key, job)
+        return job
+
+    def _submit(
+        self,
+        program_id: Optional[str],
+        name: Optional[str],
+        backend: Optional[str],
+        params: Optional[dict],
+        max_retries: int,
+        idempotency_key: Optional[str],
+        params_blob: Optional[str] = None,
+        base_params: Any = None,
+    ) -> RuntimeJob:
+        """Submit a run and return its job, see :meth:`run`.
+
+        ``base_params`` is uploaded as the blob ``params_blob`` if the server
+        does not have it, ``params_blob`` alone must already be uploaded.
+        """
+        timeline = JobTimeline()
+        timeline.mark("submitted")
+        reupload = base_params is not None
+        if base_params is not None:
+            self._client.ensure_blob(base_params)
+        while True:
+            status_code, response = self._client.program_run(
+                program_id=program_id,
+                name=name,
+                backend=backend,
+                params=params,
+                idempotency_key=idempotency_key,
+                max_retries=max_retries,
+                params_blob=params_blob,
+            )
+            if status_code != BLOB_NOT_FOUND or not reupload:
+                break
+            # The server dropped the blob, upload it again.
+            self._client.forget_blob(params_blob)
+            self._client.ensure_blob(base_params)
+            reupload = False
         if status_code == 201:
             raise CheckApiTokenError("API_TOKEN ERROR", response[MESSAGE]) from None
         elif status_code == 404:
@@ -416,6 +699,14 @@ class RuntimeService:
             ) from None
         elif status_code == 401:
             raise InputValueException(f"params of run is invalid:{params}") from None
+        elif status_code == BLOB_NOT_FOUND:
+            raise InputValueException(
+                f"Params blob not found on the server: {params_blob}"
+            ) from None
+        elif status_code == 422:
+            raise ArgsException(
+                f"Idempotency key {idempotency_key} already used for another submission."
+            ) from None
         elif status_code == 405:
             raise ProgramNotValidException(
                 f"Program is invalid, please check it and update it"
@@ -427,6 +718,8 @@ class RuntimeService:
             backend = response["backend"]
         if program_id is None:
             program_id = response["program_id"]
+        if base_params is not None:
+            params = base_params if params is None else {**base_params, **params}
         job = RuntimeJob(
             account=self._account,
             status=response["status"],
@@ -436,10 +729,125 @@ class RuntimeService:
             creation_date=response["creation_time"],
             program_id=program_id,
             params=params,
+            timeline=timeline,
         )
         print(f"job created, job_id is {job.job_id()}")
         return job
 
+    def run_many(
+        self, runs: List[Dict[str, Any]], max_workers: int = 8
+    ) -> List[RuntimeJob]:
+        """Submit many runs concurrently.
+
+        Each submission is retried on its own with its own idempotency key,
+        see :meth:`run`.
+
+        Args:
+            runs: Keyword arguments of :meth:`run`, one dict per run.
+            max_workers: Max number of submissions in flight.
+
+        Returns:
+            The jobs, in the order of ``runs``.
+        """
+        with futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="runtime_run"
+        ) as executor:
+            submitted = [executor.submit(self.run, **run) for run in runs]
+            return [future.result() for future in submitted]
+
+    def reattach(
+        self,
+        journal: JobJournal,
+        resubmit: bool = True,
+        refresh: bool = True,
+        max_workers: int = 8,
+    ) -> List[RuntimeJob]:
+        """Restore the handles of the jobs journaled and not finished yet.
+
+        Finished jobs are skipped, their results are read from the journal
+        with :meth:`JobJournal.finished`. Restored jobs keep being journaled.
+
+        Args:
+            journal: Journal given to :meth:`run` before the crash.
+            resubmit: Whether to resubmit the submissions not answered before
+                the crash. They are resubmitted with their idempotency key, so
+                the server returns the job it created, if any, instead of a new one.
+            refresh: Whether to fetch the status of the restored jobs.
+            max_workers: Max number of requests in flight.
+
+        Returns:
+            The restored jobs, in submission order.
+        """
+        jobs = []  # type: List[Optional[RuntimeJob]]
+        submissions = []
+        for entry in journal.entries():
+            if entry.job_id is not None and entry.event != FINAL:
+                params, base_params = entry.params(), entry.base_params()
+                if base_params is not None:
+                    params = base_params if params is None else {**base_params, **params}
+                job = RuntimeJob(
+                    job_id=entry.job_id,
+                    account=self._account,
+                    status=entry.status or 0,
+                    api_client=self._client,
+                    backend=entry.backend,
+                    program_id=entry.program_id,
+                    params=params,
+                )
+                journal.watch(entry.idempotency_key, job)
+                jobs.append(job)
+            elif entry.event == SUBMITTING and resubmit:
+                submissions.append((len(jobs), entry))
+                jobs.append(None)
+
+        def _resubmit(entry) -> Optional[RuntimeJob]:
+            try:
+                return self._submit_journaled(
+                    journal,
+                    entry.program_id,
+                    entry.program_name,
+                    entry.backend,
+                    entry.params(),
+                    max_retries=3,
+                    idempotency_key=entry.idempotency_key,
+                    params_blob=entry.params_blob,
+                    base_params=entry.base_params(),
+                )
+            except ClientExceptions:
+                logger.warning(
+                    "Failed to resubmit %s:\n%s",
+                    entry.idempotency_key,
+                    traceback.format_exc(),
+                )
+                return None
+
+        def _refresh(job: RuntimeJob) -> None:
+            try:
+                job._refresh_status()
+            except ClientExceptions:
+                logger.warning(
+                    "Failed to refresh job %s:\n%s", job.job_id(), traceback.format_exc()
+                )
+
+        with futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="runtime_reattach"
+        ) as executor:
+            resubmitted = executor.map(_resubmit, [entry for _, entry in submissions])
+            for (index, _), job in zip(submissions, resubmitted):
+                jobs[index] = job
+            if refresh:
+                list(
+                    executor.map(
+                        _refresh,
+                        [
+                            job
+                            for job in jobs
+                            if job is not None and job._status not in JOB_FINAL_STATES
+                        ],
+                    )
+                )
+        return [job for job in jobs if job is not None]
+
     def _read_metadata(self, metadata: Optional[str] = None) -> dict:
         """Read metadata.
 
@@ -71,6 +71,10 @@ class RunFailedException(ClientExceptions):
     """Exception raised when program run failed."""
 
 
+class CircuitFailedException(ClientExceptions):
+    """Exception raised when a circuit of a program still fails after its retries."""
+
+
 class InputValueException(ClientExceptions):
     """Exception raised when program input is invalid."""
 
@@ -1,10 +1,20 @@
 import base64
+import binascii
+import hashlib
 import importlib
 import inspect
 import io
+import json
 import zlib
 
-from typing import Any, Callable, Dict
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Union
+
+# Keys of the JSON object encoding a value of a registered type.
+TYPE_KEY = "__type__"
+VALUE_KEY = "__value__"
+
+# Bytes of base64 text decoded, or of raw data encoded, per step of the streaming codecs.
+DEFAULT_CHUNK_SIZE = 1 << 20
 
 
 def to_base64_string(data: str) -> str:
@@ -31,6 +41,38 @@ def from_base64_string(data: str) -> str:
     return base64.b64decode(data)
 
 
+def canonical_json(data: Any) -> str:
+    """Dump data as JSON with sorted keys and no whitespace.
+
+    Equal data always gives the same string, whatever the order of its dict keys.
+
+    Args:
+        data: JSON serializable data.
+
+    Returns:
+        Canonical JSON string.
+    """
+    return json.dumps(
+        data,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        cls=ParamsEncoder,
+    )
+
+
+def params_hash(params: Any) -> str:
+    """Return the SHA-256 hex digest of the canonical JSON of program params.
+
+    Args:
+        params: Program input parameters.
+
+    Returns:
+        Hash of the params.
+    """
+    return hashlib.sha256(canonical_json(params).encode("utf-8")).hexdigest()
+
+
 def _serialize_and_encode(
     data: Any, serializer: Callable, compress: bool = True, **kwargs: Any
 ) -> str:
@@ -47,12 +89,13 @@ def _serialize_and_encode(
     """
     with io.BytesIO() as buff:
         serializer(buff, data, **kwargs)
-        buff.seek(0)
-        serialized_data = buff.read()
-
-    if compress:
-        serialized_data = zlib.compress(serialized_data)
-    return base64.standard_b64encode(serialized_data).decode("utf-8")
+        serialized_data = buff.getbuffer()
+        if compress:
+            serialized_data = zlib.compress(serialized_data)
+        encoded = base64.standard_b64encode(serialized_data).decode("utf-8")
+        # Release the view, a BytesIO cannot be closed while exported.
+        del serialized_data
+    return encoded
 
 
 def _decode_and_deserialize(
@@ -68,17 +111,197 @@ def _decode_and_deserialize(
     Returns:
         Deserialized data.
     """
-    buff = io.BytesIO()
     decoded = base64.standard_b64decode(data)
     if decompress:
         decoded = zlib.decompress(decoded)
-
-    with io.BytesIO() as buff:
-        buff.write(decoded)
-        buff.seek(0)
+    # BytesIO shares the buffer of the bytes it is created from.
+    with io.BytesIO(decoded) as buff:
+        del decoded
         return deserializer(buff)
 
 
+def _iter_chunks(source: Any, chunk_size: int) -> Iterator[bytes]:
+    """Yield a str, bytes-like or file object in chunks of bytes."""
+    if isinstance(source, (str, bytes, bytearray, memoryview)):
+        if isinstance(source, memoryview):
+            source = source.cast("B")
+        for start in range(0, len(source), chunk_size):
+            chunk = source[start : start + chunk_size]
+            yield chunk.encode("ascii") if isinstance(chunk, str) else bytes(chunk)
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk.encode("ascii") if isinstance(chunk, str) else chunk
+
+
+class Base64DecodeReader(io.RawIOBase):
+    """Readable stream of the bytes of base64 data, decompressed on the fly.
+
+    The data is decoded chunk by chunk, so at most about ``chunk_size``
+    bytes are held besides the source, whatever its size. Wrap it in an
+    ``io.BufferedReader`` to use it as a regular binary file::
+
+        with Base64DecodeReader(response["data"]) as reader:
+            header = reader.read(16)
+
+    Args:
+        source: Base64 data as str, bytes-like or a text or binary file object.
+            Whitespace in the data is ignored.
+        decompress: Whether the data is zlib compressed.
+        chunk_size: Bytes of base64 text decoded per step.
+    """
+
+    def __init__(
+        self, source: Any, decompress: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ):
+        super().__init__()
+        self._chunks = _iter_chunks(source, chunk_size)
+        self._chunk_size = chunk_size
+        self._inflater = zlib.decompressobj() if decompress else None
+        # Base64 text left over from the previous chunk, less than 4 characters.
+        self._remainder = b""
+        self._pending = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> bool:
+        """Decode the next piece of output into ``_pending``.
+
+        Returns:
+            Whether there is more output.
+        """
+        while not self._eof:
+            if self._inflater is not None and self._inflater.unconsumed_tail:
+                out = self._inflater.decompress(
+                    self._inflater.unconsumed_tail, self._chunk_size
+                )
+            else:
+                raw = next(self._chunks, None)
+                if raw is None:
+                    self._eof = True
+                    if self._remainder.strip(b"="):
+                        raise ValueError("Truncated base64 data.")
+                    out = self._inflater.flush() if self._inflater is not None else b""
+                else:
+                    raw = self._remainder + raw.translate(None, b" \t\r\n")
+                    cut = len(raw) - len(raw) % 4
+                    self._remainder = raw[cut:]
+                    out = binascii.a2b_base64(raw[:cut])
+                    if self._inflater is not None:
+                        out = self._inflater.decompress(out, self._chunk_size)
+            if out:
+                self._pending = memoryview(out)
+                return True
+        return False
+
+    def readinto(self, buffer: Any) -> int:
+        target = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(target):
+            if not self._pending and not self._fill():
+                break
+            size = min(len(self._pending), len(target) - written)
+            target[written : written + size] = self._pending[:size]
+            self._pending = self._pending[size:]
+            written += size
+        return written
+
+
+def decode_into(
+    data: Any, buffer: Any, decompress: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Decode base64 data into a preallocated buffer.
+
+    Args:
+        data: Base64 data, see :class:`Base64DecodeReader`.
+        buffer: Writable bytes-like object, e.g. a bytearray, memoryview or
+            contiguous NumPy array.
+        decompress: Whether the data is zlib compressed.
+        chunk_size: Bytes of base64 text decoded per step.
+
+    Returns:
+        Number of bytes written.
+
+    Raises:
+        ValueError: If the decoded data does not fit in the buffer.
+    """
+    with Base64DecodeReader(data, decompress, chunk_size) as reader:
+        written = reader.readinto(buffer)
+        if reader.read(1):
+            raise ValueError("Decoded data is larger than the buffer.")
+    return written
+
+
+def decode_to_file(
+    data: Any,
+    file: Union[str, BinaryIO],
+    decompress: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """Decode base64 data into a file, with bounded memory.
+
+    Args:
+        data: Base64 data, see :class:`Base64DecodeReader`.
+        file: Path or binary file object to write to.
+        decompress: Whether the data is zlib compressed.
+        chunk_size: Bytes of base64 text decoded per step.
+
+    Returns:
+        Number of bytes written.
+    """
+    if isinstance(file, str):
+        with open(file, "wb") as out:
+            return decode_to_file(data, out, decompress, chunk_size)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    written = 0
+    with Base64DecodeReader(data, decompress, chunk_size) as reader:
+        while True:
+            size = reader.readinto(view)
+            if not size:
+                return written
+            file.write(view[:size])
+            written += size
+
+
+def iter_encode(
+    source: Any, compress: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """Encode data to base64 chunk by chunk.
+
+    The concatenation of the chunks is the base64 encoding of the data,
+    zlib compressed if ``compress``.
+
+    Args:
+        source: Bytes-like object or binary file object.
+        compress: Whether to compress the data.
+        chunk_size: Bytes of data read per step.
+
+    Yields:
+        Base64 text.
+    """
+    deflater = zlib.compressobj() if compress else None
+    remainder = b""
+    chunks = _iter_chunks(source, chunk_size)
+    while True:
+        raw = next(chunks, None)
+        if raw is None:
+            out = remainder + (deflater.flush() if deflater is not None else b"")
+            if out:
+                yield base64.standard_b64encode(out).decode("ascii")
+            return
+        out = remainder + (deflater.compress(raw) if deflater is not None else raw)
+        # Encode whole groups of 3 bytes, so the chunks concatenate.
+        cut = len(out) - len(out) % 3
+        remainder = out[cut:]
+        if cut:
+            yield base64.standard_b64encode(out[:cut]).decode("ascii")
+
+
 def _deserialize_from_settings(mod_name: str, class_name: str, settings: Dict) -> Any:
     """Deserialize an object from its settings.
 
@@ -98,3 +321,188 @@ def _deserialize_from_settings(mod_name: str, class_name: str, settings: Dict) -
         if name == class_name:
             return clz(**settings)
     raise ValueError(f"Unable to find class {class_name} in module {mod_name}")
+
+
+# (type name, predicate, encoder) in registration order, and type name -> decoder.
+_ENCODERS = []
+_DECODERS = {}
+
+
+def register_serializer(
+    type_name: str,
+    predicate: Callable[[Any], bool],
+    encoder: Callable[[Any], Any],
+    decoder: Callable[[Any], Any],
+) -> None:
+    """Register how to encode the values of a type in params.
+
+    A value matching ``predicate`` is encoded as
+    ``{"__type__": type_name, "__value__": encoder(value)}``, and decoded
+    by :func:`decode_params` with ``decoder``. Registering a type name again
+    replaces its serializer.
+
+    Args:
+        type_name: Name of the type in the encoded params.
+        predicate: Returns whether a value is of the type.
+        encoder: Converts a value to JSON serializable data.
+        decoder: Converts the data back to a value.
+    """
+    _ENCODERS[:] = [entry for entry in _ENCODERS if entry[0] != type_name]
+    _ENCODERS.append((type_name, predicate, encoder))
+    _DECODERS[type_name] = decoder
+
+
+def _is_instance(module: str, name: str) -> Callable[[Any], bool]:
+    """Return a predicate matching instances of a class by module and name,
+    so the module is not imported to check the type of a value."""
+
+    def predicate(obj: Any) -> bool:
+        return any(
+            cls.__name__ == name and cls.__module__.split(".")[0] == module
+            for cls in type(obj).__mro__
+        )
+
+    return predicate
+
+
+def _encode_ndarray(obj: Any) -> str:
+    import numpy as np
+
+    return _serialize_and_encode(obj, np.save, allow_pickle=False)
+
+
+def _decode_ndarray(value: str) -> Any:
+    import numpy as np
+    from numpy.lib import format as npy_format
+
+    # Decode the data straight into the array, without intermediate copies.
+    with Base64DecodeReader(value) as reader:
+        version = npy_format.read_magic(reader)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(reader)
+        else:
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(reader)
+        count = 1
+        for size in shape:
+            count *= size
+        array = np.empty(count, dtype=dtype)
+        if reader.readinto(array.view(np.uint8)) != array.nbytes:
+            raise ValueError("Truncated array data.")
+    return array.reshape(shape, order="F" if fortran_order else "C")
+
+
+def _encode_circuit(obj: Any) -> dict:
+    return {"num": obj.num, "qasm": obj.to_openqasm()}
+
+
+def _decode_circuit(value: dict) -> Any:
+    from quafu import QuantumCircuit
+
+    circuit = QuantumCircuit(value["num"])
+    circuit.from_openqasm(value["qasm"])
+    return circuit
+
+
+register_serializer(
+    "complex",
+    lambda obj: isinstance(obj, complex),
+    lambda obj: [obj.real, obj.imag],
+    lambda value: complex(*value),
+)
+register_serializer(
+    "ndarray", _is_instance("numpy", "ndarray"), _encode_ndarray, _decode_ndarray
+)
+register_serializer(
+    "QuantumCircuit",
+    _is_instance("quafu", "QuantumCircuit"),
+    _encode_circuit,
+    _decode_circuit,
+)
+
+
+class ParamsEncoder(json.JSONEncoder):
+    """JSON encoder of program params holding values of registered types.
+
+    NumPy arrays are sent as compressed binary, complex numbers as their real
+    and imaginary parts, and quafu circuits as OpenQASM, see
+    :func:`register_serializer` to add types. NumPy scalars are sent as plain
+    numbers. Programs get the values back with :func:`decode_params`.
+    """
+
+    def default(self, obj: Any) -> Any:
+        for type_name, predicate, encoder in _ENCODERS:
+            if predicate(obj):
+                return {TYPE_KEY: type_name, VALUE_KEY: encoder(obj)}
+        if _is_instance("numpy", "generic")(obj):
+            return obj.item()
+        return super().default(obj)
+
+
+def _decode_object(obj: dict) -> Any:
+    type_name = obj.get(TYPE_KEY)
+    if type_name is None or VALUE_KEY not in obj or len(obj) != 2:
+        return obj
+    decoder = _DECODERS.get(type_name)
+    if decoder is None:
+        return obj
+    return decoder(obj[VALUE_KEY])
+
+
+class ParamsDecoder(json.JSONDecoder):
+    """JSON decoder of params encoded by :class:`ParamsEncoder`."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        kwargs.setdefault("object_hook", _decode_object)
+        super().__init__(*args, **kwargs)
+
+
+def decode_params(params: Any) -> Any:
+    """Decode the values of registered types in program params.
+
+    Use it in a program to get back the arrays, complex numbers and circuits
+    given to :meth:`RuntimeService.run`::
+
+        from quafu_runtime.utils.jsonutil import decode_params
+
+        def run(task, userpub, params):
+            params = decode_params(params)
+
+    Args:
+        params: Params as a JSON string, or as data already parsed from JSON.
+
+    Returns:
+        Decoded params.
+    """
+    if isinstance(params, (str, bytes)):
+        return json.loads(params, cls=ParamsDecoder)
+    return _decode_parsed(params)
+
+
+def _decode_parsed(data: Any) -> Any:
+    if isinstance(data, dict):
+        return _decode_object({key: _decode_parsed(value) for key, value in data.items()})
+    if isinstance(data, list):
+        return [_decode_parsed(value) for value in data]
+    return data
+
+
+def encode_checkpoint(state: Any) -> str:
+    """Encode the checkpoint state of a program.
+
+    The state is dumped as compact JSON with :class:`ParamsEncoder`, so it
+    may hold arrays, complex numbers and circuits, then compressed with
+    zlib and base64 encoded.
+
+    Args:
+        state: Checkpoint state.
+
+    Returns:
+        Encoded state.
+    """
+    data = json.dumps(state, separators=(",", ":"), ensure_ascii=False, cls=ParamsEncoder)
+    return base64.standard_b64encode(zlib.compress(data.encode("utf-8"))).decode("ascii")
+
+
+def decode_checkpoint(data: str) -> Any:
+    """Decode a checkpoint state encoded with :func:`encode_checkpoint`."""
+    return decode_params(zlib.decompress(base64.standard_b64decode(data)))
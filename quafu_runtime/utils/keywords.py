@@ -16,3 +16,16 @@
 
 
 MESSAGE = "msg"
+
+# Key of the profile summaries published by ProgramProfiler
+PROFILE = "__profile__"
+
+# Key of the batches of interim messages published by CoalescingUserPub
+INTERIM_BATCH = "__interim_batch__"
+
+# Key of the channel of a batch of interim messages, and channel of the other messages
+CHANNEL = "__channel__"
+DEFAULT_CHANNEL = "default"
+
+# Key of the params of a run resumed from the checkpoint of another job
+CHECKPOINT = "__checkpoint__"
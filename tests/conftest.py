@@ -0,0 +1,50 @@
+"""Fixtures running the client against an in-process LocalRuntimeServer."""
+import textwrap
+
+import pytest
+
+from quafu_runtime import Account, RuntimeService
+from quafu_runtime.clients.local_runtime import LocalRuntimeServer
+from quafu_runtime.clients.runtime_client import RuntimeClient
+
+TOKEN = "local-token"
+
+
+@pytest.fixture
+def server():
+    return LocalRuntimeServer()
+
+
+@pytest.fixture
+def client(server):
+    client = RuntimeClient(TOKEN, "http://local", session_factory=server.session)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def make_service(client):
+    """Return a factory of services sharing the local server, e.g. with a run cache."""
+
+    def make(**kwargs):
+        return RuntimeService(Account(TOKEN), api_client=client, **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def service(make_service):
+    return make_service()
+
+
+@pytest.fixture
+def upload(service, tmp_path):
+    """Return a function uploading a program source, returning its ID."""
+
+    def upload_source(source, name, backend="py_simu", target=None):
+        path = tmp_path / f"{name}.py"
+        path.write_text(textwrap.dedent(source))
+        metadata = {"name": name, "backend": backend}
+        return (target or service).upload_program(str(path), metadata=metadata)
+
+    return upload_source
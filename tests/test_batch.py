@@ -0,0 +1,113 @@
+"""BatchedTask against a fake quafu Task."""
+import itertools
+
+import pytest
+
+from quafu_runtime.program.batch import BatchedTask
+from quafu_runtime.rtexceptions.rtexceptions import CircuitFailedException
+
+
+class FakeResult:
+    def __init__(self, taskid, circuit, shots, task_status):
+        self.taskid = taskid
+        self.circuit = circuit
+        self.shots = shots
+        self.task_status = task_status
+
+
+class FakeTask:
+    """Task finishing every circuit after ``polls`` retrievals.
+
+    ``failures`` maps a circuit to the outcomes of its first attempts,
+    ``"raise"`` for a submission raising, or a final task status.
+    """
+
+    def __init__(self, polls=1, failures=None):
+        self.shots = 100
+        self.polls = polls
+        self.failures = {
+            circuit: list(outcomes) for circuit, outcomes in (failures or {}).items()
+        }
+        self.sent = []
+        self.in_flight = {}
+        self.max_in_flight = 0
+        self._ids = itertools.count()
+
+    def send(self, circuit, name="", wait=True):
+        assert not wait
+        self.sent.append((circuit, self.shots))
+        outcomes = self.failures.get(circuit)
+        outcome = outcomes.pop(0) if outcomes else None
+        if outcome == "raise":
+            raise ConnectionError("backend unreachable")
+        taskid = f"t{next(self._ids)}"
+        status = outcome or "In Queue"
+        self.in_flight[taskid] = [circuit, self.shots, self.polls, status]
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        return FakeResult(taskid, circuit, self.shots, status)
+
+    def retrieve(self, taskid):
+        state = self.in_flight[taskid]
+        circuit, shots, _, status = state
+        if status == "In Queue":
+            state[2] -= 1
+            if state[2] <= 0:
+                status = "Completed"
+        if status != "In Queue":
+            del self.in_flight[taskid]
+        return FakeResult(taskid, circuit, shots, status)
+
+
+def batched(task, **kwargs):
+    kwargs.setdefault("poll_interval", 0.0)
+    return BatchedTask(task, **kwargs)
+
+
+def test_results_in_circuit_order():
+    task = FakeTask(polls=2)
+    circuits = [f"qc{i}" for i in range(10)]
+    results = batched(task, max_in_flight=3).run(circuits)
+    assert [result.circuit for result in results] == circuits
+    assert all(result.task_status == "Completed" for result in results)
+    assert task.max_in_flight == 3
+
+
+def test_shots_per_circuit_and_restored():
+    task = FakeTask()
+    results = batched(task).run(["a", "b", "c"], shots=[10, None, 30])
+    assert [result.shots for result in results] == [10, 100, 30]
+    assert task.shots == 100
+    batched(task).run(["d"], shots=5)
+    assert task.sent[-1] == ("d", 5)
+    assert task.shots == 100
+    with pytest.raises(ValueError, match="one value per circuit"):
+        batched(task).run(["a", "b"], shots=[1])
+
+
+def test_failed_circuits_retried():
+    task = FakeTask(failures={"b": ["raise", "Failed"], "c": ["Canceled"]})
+    runner = batched(task, max_retries=2)
+    results = runner.run(["a", "b", "c"])
+    assert [result.circuit for result in results] == ["a", "b", "c"]
+    assert [circuit for circuit, _ in task.sent].count("b") == 3
+    assert runner.stats["retries"] == 3
+    assert runner.stats["submitted"] == 5
+
+
+def test_circuit_failing_after_retries():
+    task = FakeTask(failures={"b": ["Failed", "raise"]})
+    with pytest.raises(CircuitFailedException, match="Circuit 1 failed after 2 attempts"):
+        batched(task, max_retries=1).run(["a", "b", "c"])
+
+
+def test_timeout():
+    task = FakeTask(polls=10 ** 6)
+    with pytest.raises(TimeoutError, match="2 not finished"):
+        batched(task, timeout=0.01).run(["a", "b"])
+
+
+def test_task_attributes_forwarded():
+    task = FakeTask()
+    assert batched(task).shots == 100
+    with pytest.raises(ValueError):
+        BatchedTask(task, max_in_flight=0)
@@ -0,0 +1,65 @@
+"""Program checkpoints and runs resumed from them."""
+import numpy as np
+import pytest
+
+from quafu_runtime.rtexceptions.rtexceptions import InputValueException
+
+PROGRAM = """
+import numpy as np
+
+from quafu_runtime.program.templates.userpub import load_checkpoint
+
+def run(task, userpub, params):
+    state = load_checkpoint(params) or {"iteration": 0, "theta": np.zeros(2)}
+    for i in range(state["iteration"], params["iterations"]):
+        state = {"iteration": i + 1, "theta": state["theta"] + params["step"]}
+        userpub.checkpoint(state)
+        if i + 1 == params.get("fail_at"):
+            raise RuntimeError("backend lost")
+    return {"iteration": state["iteration"], "theta": state["theta"].tolist()}
+"""
+
+
+def test_resume_from_checkpoint(service, upload):
+    upload(PROGRAM, "iterate")
+    failed = service.run(
+        name="iterate", params={"iterations": 5, "step": 1.0, "fail_at": 3}
+    )
+    failed.result(wait=True)
+    state = failed.checkpoint()
+    assert state["iteration"] == 3
+    np.testing.assert_array_equal(state["theta"], [3.0, 3.0])
+
+    resumed = service.run(
+        name="iterate", params={"iterations": 5, "step": 1.0}, resume_from=failed
+    )
+    assert resumed.result(wait=True)["result"] == {"iteration": 5, "theta": [5.0, 5.0]}
+
+
+def test_resume_with_base_params(service, upload):
+    upload(PROGRAM, "iterate")
+    base = {"iterations": 4, "step": 0.5}
+    failed = service.run(name="iterate", base_params=base, params={"fail_at": 2})
+    failed.result(wait=True)
+    resumed = service.run(name="iterate", base_params=base, resume_from=failed.job_id())
+    assert resumed.result(wait=True)["result"] == {"iteration": 4, "theta": [2.0, 2.0]}
+
+
+def test_resume_needs_dict_params(service, upload):
+    upload(PROGRAM, "iterate")
+    failed = service.run(
+        name="iterate", params={"iterations": 2, "step": 1.0, "fail_at": 1}
+    )
+    failed.result(wait=True)
+    with pytest.raises(InputValueException, match="dict params"):
+        service.run(name="iterate", params=[1, 2], resume_from=failed)
+    with pytest.raises(InputValueException, match="dict params"):
+        service.run(name="iterate", base_params=[1, 2], resume_from=failed)
+
+
+def test_resume_without_checkpoint(service, upload):
+    upload(PROGRAM, "iterate")
+    done = service.run(name="iterate", params={"iterations": 0, "step": 1.0})
+    done.result(wait=True)
+    with pytest.raises(InputValueException, match="no checkpoint"):
+        service.run(name="iterate", params={}, resume_from=done)
@@ -0,0 +1,99 @@
+"""Chunked base64 and zlib codecs of jsonutil, against the one-shot codecs."""
+import base64
+import io
+import os
+import zlib
+
+import numpy as np
+import pytest
+
+from quafu_runtime.utils.jsonutil import (
+    Base64DecodeReader,
+    _decode_and_deserialize,
+    _serialize_and_encode,
+    decode_into,
+    decode_to_file,
+    iter_encode,
+)
+
+DATA = os.urandom(5000) + bytes(20000)
+
+
+def encoded(data=DATA, compress=True):
+    return base64.standard_b64encode(zlib.compress(data) if compress else data).decode()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("compress", [True, False])
+def test_reader_matches_one_shot_decode(chunk_size, compress):
+    with Base64DecodeReader(encoded(compress=compress), compress, chunk_size) as reader:
+        assert reader.read() == DATA
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        lambda text: text.encode(),
+        lambda text: bytearray(text.encode()),
+        lambda text: memoryview(text.encode()),
+        lambda text: io.StringIO(text),
+        lambda text: io.BytesIO(text.encode()),
+    ],
+    ids=["bytes", "bytearray", "memoryview", "text file", "binary file"],
+)
+def test_reader_sources(source):
+    with Base64DecodeReader(source(encoded()), chunk_size=100) as reader:
+        assert io.BufferedReader(reader).read() == DATA
+
+
+def test_reader_ignores_whitespace():
+    text = base64.encodebytes(zlib.compress(DATA)).decode().replace("\n", "\r\n \t")
+    with Base64DecodeReader(text, chunk_size=50) as reader:
+        assert reader.read() == DATA
+
+
+def test_reader_rejects_truncated_data():
+    with Base64DecodeReader(encoded(compress=False)[:-1], decompress=False) as reader:
+        with pytest.raises(ValueError, match="Truncated"):
+            reader.read()
+
+
+def test_decode_into():
+    buffer = bytearray(len(DATA))
+    assert decode_into(encoded(), buffer, chunk_size=1000) == len(DATA)
+    assert buffer == DATA
+
+    array = np.empty(len(DATA), dtype=np.uint8)
+    assert decode_into(encoded(), array) == len(DATA)
+    assert array.tobytes() == DATA
+
+    with pytest.raises(ValueError, match="larger than the buffer"):
+        decode_into(encoded(), bytearray(len(DATA) - 1))
+
+
+def test_decode_to_file(tmp_path):
+    path = str(tmp_path / "data.bin")
+    assert decode_to_file(encoded(), path, chunk_size=1000) == len(DATA)
+    with open(path, "rb") as file:
+        assert file.read() == DATA
+
+    out = io.BytesIO()
+    assert decode_to_file(io.StringIO(encoded()), out, chunk_size=64) == len(DATA)
+    assert out.getvalue() == DATA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1000, 1 << 20])
+def test_iter_encode_matches_one_shot_encode(chunk_size):
+    assert "".join(iter_encode(DATA, False, chunk_size)) == encoded(compress=False)
+    text = "".join(iter_encode(io.BytesIO(DATA), chunk_size=chunk_size))
+    assert zlib.decompress(base64.standard_b64decode(text)) == DATA
+    assert list(iter_encode(b"")) == [base64.standard_b64encode(zlib.compress(b"")).decode()]
+    assert list(iter_encode(b"", compress=False)) == []
+
+
+def test_array_codec_round_trip():
+    array = np.arange(1000, dtype=np.float64).reshape(10, 100)
+    text = _serialize_and_encode(array, np.save, allow_pickle=False)
+    np.testing.assert_array_equal(_decode_and_deserialize(text, np.load), array)
+    with Base64DecodeReader(text) as reader:
+        np.testing.assert_array_equal(np.lib.format.read_array(reader), array)
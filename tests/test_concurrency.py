@@ -0,0 +1,73 @@
+"""Adaptive concurrency limiter of the runtime client."""
+from quafu_runtime.clients.concurrency import AdaptiveConcurrencyLimiter
+from quafu_runtime.clients.runtime_client import RuntimeClient
+
+from conftest import TOKEN
+
+
+def request(limiter, status_code=200, latency=0.0, endpoint="job_status"):
+    start = limiter.acquire()
+    limiter.release(start - latency, status_code, endpoint=endpoint)
+
+
+def test_additive_increase_per_round():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=10)
+    # About one more slot per round of limit healthy requests.
+    for _ in range(5):
+        request(limiter)
+    assert limiter.limit == 5
+    for _ in range(5):
+        request(limiter)
+    assert limiter.limit == 6
+
+
+def test_multiplicative_decrease_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=10)
+    request(limiter, status_code=503)
+    assert limiter.limit == 4
+    request(limiter, status_code=429)
+    assert limiter.limit == 2
+    # A connection error.
+    limiter.release(limiter.acquire(), error=True)
+    assert limiter.limit == 1
+    assert limiter.stats()["decreases"] == 3
+
+
+def test_one_decrease_per_burst():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=10)
+    starts = [limiter.acquire() for _ in range(6)]
+    for start in starts:
+        limiter.release(start, 503)
+    assert limiter.limit == 4
+    stats = limiter.stats()
+    assert stats["errors"] == 6 and stats["decreases"] == 1
+    # Requests started after the decrease can decrease again.
+    request(limiter, status_code=503)
+    assert limiter.limit == 2
+
+
+def test_latency_spikes_per_endpoint():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=8)
+    for _ in range(5):
+        request(limiter, latency=0.01)
+    # A slow upload has its own baseline, it is not a spike of job_status.
+    request(limiter, latency=2.0, endpoint="blob_upload")
+    assert limiter.limit == 8
+    request(limiter, latency=2.0)
+    assert limiter.limit == 4
+    assert set(limiter.stats()["baseline_latency"]) == {"job_status", "blob_upload"}
+
+
+def test_client_backs_off_on_body_status(server):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=8)
+    client = RuntimeClient(
+        TOKEN, "http://local", session_factory=server.session, limiter=limiter
+    )
+    server.overloaded = 1
+    # The server answers HTTP 200 with the overload status in the body.
+    status, _ = client.program_get(name="missing")
+    assert status == 503
+    assert limiter.limit == 4
+    status, _ = client.program_get(name="missing")
+    assert status == 404
+    assert limiter.stats()["errors"] == 1
@@ -0,0 +1,74 @@
+"""Counts container, against plain dict computations."""
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from quafu_runtime.program.counts import Counts
+
+DATA = {"000": 5, "101": 3, "110": 2, "011": 7, "111": 1}
+
+
+def reference_marginal(data, bits):
+    marginal = Counter()
+    for bitstring, count in data.items():
+        marginal["".join(bitstring[b] for b in bits)] += count
+    return dict(marginal)
+
+
+def test_dict_round_trip():
+    counts = Counts.from_dict(DATA)
+    assert counts.num_bits == 3
+    assert len(counts) == 5 and counts.shots == 18
+    assert counts.outcomes.tolist() == [0, 5, 3, 6, 7]
+    assert counts["011"] == 7 and counts["010"] == 0
+
+    rebuilt = Counts(counts.outcomes, counts.counts, num_bits=3)
+    assert rebuilt.to_dict() == DATA
+    assert rebuilt["101"] == 3 and rebuilt["010"] == 0
+    np.testing.assert_allclose(rebuilt.normalize(), np.array(list(DATA.values())) / 18)
+
+
+@pytest.mark.parametrize("bits", [[0], [2], [0, 2], [2, 0], [1, 2, 0], []])
+def test_marginal_matches_reference(bits):
+    marginal = Counts.from_dict(DATA).marginal(bits)
+    assert marginal.num_bits == len(bits)
+    assert marginal.to_dict() == reference_marginal(DATA, bits)
+    assert marginal.shots == 18
+
+
+def test_marginal_bits_out_of_range():
+    with pytest.raises(ValueError, match="out of range"):
+        Counts.from_dict(DATA).marginal([3])
+
+
+def test_merge_matches_reference():
+    other = {"000": 1, "111": 4, "100": 2}
+    merged = Counts.merge([Counts.from_dict(DATA), other])
+    assert merged.to_dict() == dict(Counter(DATA) + Counter(other))
+    assert (Counts.from_dict(DATA) + Counts.from_dict(other)).to_dict() == merged.to_dict()
+    assert Counts.merge([]).shots == 0
+    with pytest.raises(ValueError, match="same number of bits"):
+        Counts.merge([Counts.from_dict(DATA), {"01": 1}])
+
+
+def test_wide_registers():
+    data = {"1" + "0" * 63: 2, "0" * 63 + "1": 3}
+    counts = Counts.from_dict(data)
+    assert counts.outcomes.tolist() == [1, 2**63]
+    assert counts.marginal([63, 0]).to_dict() == {"01": 2, "10": 3}
+    assert Counts(counts.outcomes, counts.counts, num_bits=64).to_dict() == data
+    with pytest.raises(ValueError, match="64 bits"):
+        Counts(num_bits=65)
+
+
+def test_random_counts_match_reference():
+    rng = np.random.default_rng(2)
+    data = {}
+    for _ in range(200):
+        bitstring = "".join(rng.choice(["0", "1"], size=12))
+        data[bitstring] = data.get(bitstring, 0) + int(rng.integers(1, 50))
+    counts = Counts.from_dict(data)
+    bits = [11, 3, 7, 0]
+    assert counts.marginal(bits).to_dict() == reference_marginal(data, bits)
+    assert Counts.merge([counts, counts]).to_dict() == {k: 2 * v for k, v in data.items()}
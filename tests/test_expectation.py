@@ -0,0 +1,107 @@
+"""Expectation values from counts, against a per-bitstring reference."""
+import numpy as np
+import pytest
+
+from quafu_runtime.program.counts import Counts
+from quafu_runtime.program.expectation import (
+    energy,
+    expectation_values,
+    group_expectation,
+    parity,
+    term_expectations,
+)
+from quafu_runtime.program.hamiltonian import PauliHamiltonian
+
+H2 = [
+    -1.052373, [],
+    0.397937, ["Z0"],
+    -0.397937, ["Z1"],
+    -0.011280, ["Z0", "Z1"],
+    0.180931, ["X0", "X1"],
+]
+
+
+def random_counts(rng, num_bits, num_outcomes=20):
+    counts = {}
+    for _ in range(num_outcomes):
+        bits = "".join(rng.choice(["0", "1"], size=num_bits))
+        counts[bits] = counts.get(bits, 0) + int(rng.integers(1, 100))
+    return counts
+
+
+def reference_eigenvalue(bits, mask):
+    # Character j of the bitstring is classical bit j.
+    return (-1) ** sum(int(bits[j]) for j in np.flatnonzero(mask))
+
+
+def reference_expectation(counts, mask):
+    shots = sum(counts.values())
+    return sum(n * reference_eigenvalue(bits, mask) for bits, n in counts.items()) / shots
+
+
+def reference_group(counts, masks, coeffs):
+    """Mean and standard error of a group observable, shot by shot."""
+    samples = []
+    for bits, n in counts.items():
+        value = sum(c * reference_eigenvalue(bits, m) for c, m in zip(coeffs, masks))
+        samples += [value] * n
+    samples = np.array(samples)
+    return samples.mean(), samples.std() / np.sqrt(len(samples))
+
+
+def test_expectation_values_match_reference():
+    rng = np.random.default_rng(3)
+    counts = random_counts(rng, 6)
+    masks = rng.integers(0, 2, size=(10, 6)).astype(bool)
+    values, errors = expectation_values(counts, masks)
+    expected = [reference_expectation(counts, mask) for mask in masks]
+    np.testing.assert_allclose(values, expected)
+    shots = sum(counts.values())
+    np.testing.assert_allclose(errors, np.sqrt((1 - np.square(expected)) / shots))
+    counts_values, _ = expectation_values(Counts.from_dict(counts), masks)
+    np.testing.assert_allclose(counts_values, values)
+
+
+def test_wide_registers():
+    bits = "1" + "0" * 62 + "1"
+    mask = np.zeros((2, 64), dtype=bool)
+    mask[0, 63] = True
+    mask[1, [0, 63]] = True
+    values, _ = expectation_values({bits: 3, "0" * 64: 1}, mask)
+    np.testing.assert_allclose(values, [-0.5, 1.0])
+    assert parity(np.array([2**63 + 1, 2**63, 7], dtype=np.uint64)).tolist() == [0, 1, 1]
+
+
+def test_energy_matches_reference():
+    rng = np.random.default_rng(11)
+    hamiltonian = PauliHamiltonian.from_list(H2)
+    groups = hamiltonian.groups()
+    counts = [random_counts(rng, len(group.qubits)) for group in groups]
+
+    expected = hamiltonian.constant
+    variance = 0.0
+    for group, group_counts in zip(groups, counts):
+        mean, error = reference_group(group_counts, group.masks, group.coeffs)
+        assert group_expectation(group, group_counts) == pytest.approx((mean, error))
+        expected += mean
+        variance += error**2
+    value, error = energy(hamiltonian, counts)
+    assert value == pytest.approx(expected)
+    assert error == pytest.approx(np.sqrt(variance))
+
+    values, errors = term_expectations(hamiltonian, counts)
+    assert values[0] == 1.0 and errors[0] == 0.0
+    assert values @ hamiltonian.coeffs == pytest.approx(value)
+
+
+def test_energy_needs_counts_of_every_group():
+    hamiltonian = PauliHamiltonian.from_list(H2)
+    with pytest.raises(ValueError, match="2 groups"):
+        energy(hamiltonian, [{"00": 1}])
+    with pytest.raises(ValueError, match="2 groups"):
+        term_expectations(hamiltonian, [])
+
+
+def test_energy_of_identity():
+    hamiltonian = PauliHamiltonian.from_list([2.5, [], -0.5, []])
+    assert energy(hamiltonian, []) == (2.0, 0.0)
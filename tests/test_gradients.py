@@ -0,0 +1,119 @@
+"""Batched parameter shift and SPSA gradients."""
+import numpy as np
+import pytest
+
+from quafu_runtime.program.gradients import (
+    SPSA,
+    make_evaluator,
+    parameter_shift_gradient,
+    parameter_shift_points,
+)
+
+
+def energy(theta):
+    # Expectation value shape of Pauli rotations: trigonometric in each parameter.
+    return np.cos(theta[0]) + np.cos(theta[0]) * np.sin(theta[1]) - 0.5 * np.sin(theta[2])
+
+
+def analytic_gradient(theta):
+    return np.array(
+        [
+            -np.sin(theta[0]) - np.sin(theta[0]) * np.sin(theta[1]),
+            np.cos(theta[0]) * np.cos(theta[1]),
+            -0.5 * np.cos(theta[2]),
+        ]
+    )
+
+
+class FakeBatched:
+    """BatchedTask whose results are the circuits themselves."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, circuits, shots=None):
+        self.batches.append(len(circuits))
+        return list(circuits)
+
+
+@pytest.fixture
+def batched():
+    return FakeBatched()
+
+
+@pytest.fixture
+def evaluate(batched):
+    # Two "circuits" per parameter set, whose results are summed.
+    return make_evaluator(
+        batched,
+        build=lambda point: [point, point],
+        reduce=lambda results: sum(energy(point) for point in results) / 2,
+    )
+
+
+def test_evaluator_runs_one_batch(evaluate, batched):
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 2.0, 3.0]])
+    np.testing.assert_allclose(evaluate(points), [energy(p) for p in points])
+    np.testing.assert_allclose(evaluate(points[1]), [energy(points[1])])
+    assert batched.batches == [4, 2]
+
+
+@pytest.mark.parametrize("theta", [[0.0, 0.0, 0.0], [0.3, -1.2, 2.5], [np.pi, 0.5, -0.7]])
+def test_parameter_shift_matches_analytic_gradient(evaluate, batched, theta):
+    gradient = parameter_shift_gradient(evaluate, np.array(theta))
+    np.testing.assert_allclose(gradient, analytic_gradient(theta), atol=1e-12)
+    # All 2 * n shifted sets in one batch.
+    assert batched.batches == [12]
+
+
+def test_parameter_shift_other_shift(evaluate):
+    theta = np.array([0.3, -1.2, 2.5])
+    gradient = parameter_shift_gradient(evaluate, theta, shift=0.4)
+    np.testing.assert_allclose(gradient, analytic_gradient(theta), atol=1e-12)
+
+
+def test_parameter_shift_points():
+    points = parameter_shift_points([1.0, 2.0], shift=0.5)
+    np.testing.assert_array_equal(points, [[1.5, 2.0], [1.0, 2.5], [0.5, 2.0], [1.0, 1.5]])
+
+
+def test_spsa_deterministic_with_seed(evaluate):
+    trajectories = []
+    for _ in range(2):
+        spsa = SPSA(seed=7, resamplings=2)
+        theta = np.array([0.3, -1.2, 2.5])
+        for _ in range(5):
+            theta = spsa.step(evaluate, theta)
+        trajectories.append(theta)
+    np.testing.assert_array_equal(trajectories[0], trajectories[1])
+    assert spsa.iteration == 5
+    theta = np.array([0.3, -1.2, 2.5])
+    seven = SPSA(seed=7).gradient(evaluate, theta)
+    eight = SPSA(seed=8).gradient(evaluate, theta)
+    assert not np.array_equal(seven, eight)
+
+
+def test_spsa_evaluates_one_batch(evaluate, batched):
+    SPSA(seed=1, resamplings=3).gradient(evaluate, np.zeros(3))
+    assert batched.batches == [2 * 3 * 2]
+
+
+def test_spsa_exact_for_linear_function():
+    spsa = SPSA(c=0.2, seed=3)
+    slope = lambda points: 3.0 * points[:, 0]
+    assert spsa.gradient(slope, np.array([0.7])) == pytest.approx([3.0])
+
+
+def test_spsa_gains():
+    spsa = SPSA(a=0.2, c=0.1, alpha=0.602, gamma=0.101, stability=10.0)
+    assert spsa.learning_rate() == pytest.approx(0.2 / 11 ** 0.602)
+    assert spsa.perturbation(3) == pytest.approx(0.1 / 4 ** 0.101)
+
+
+def test_spsa_descends(evaluate):
+    spsa = SPSA(a=0.3, c=0.1, seed=11)
+    theta = np.array([0.3, -1.2, 2.5])
+    start = energy(theta)
+    for _ in range(200):
+        theta = spsa.step(evaluate, theta)
+    assert energy(theta) < start - 0.2
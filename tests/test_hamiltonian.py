@@ -0,0 +1,122 @@
+"""PauliHamiltonian terms and qubit-wise commuting measurement groups."""
+import numpy as np
+import pytest
+
+from quafu_runtime.program.hamiltonian import PauliHamiltonian
+
+# H2 at bond length 0.735 A, reduced to two qubits.
+H2 = [
+    -1.052373, [],
+    0.397937, ["Z0"],
+    -0.397937, ["Z1"],
+    -0.011280, ["Z0", "Z1"],
+    0.180931, ["X0", "X1"],
+]
+
+
+class FakeCircuit:
+    """Circuit recording the gates appended to it."""
+
+    def __init__(self):
+        self.gates = []
+
+    def h(self, qubit):
+        self.gates.append(("h", qubit))
+
+    def sdg(self, qubit):
+        self.gates.append(("sdg", qubit))
+
+    def measure(self, qubits, cbits):
+        self.gates.append(("measure", qubits, cbits))
+
+
+def test_list_round_trip():
+    terms = [0.5, [], 1.0, ["X0", "Y2"], -2.0, ["z1"]]
+    hamiltonian = PauliHamiltonian.from_list(terms)
+    assert hamiltonian.num_qubits == 3
+    assert hamiltonian.num_terms == 3
+    np.testing.assert_array_equal(hamiltonian.x, [[0, 0, 0], [1, 0, 1], [0, 0, 0]])
+    np.testing.assert_array_equal(hamiltonian.z, [[0, 0, 0], [0, 0, 1], [0, 1, 0]])
+    assert hamiltonian.to_list() == [0.5, [], 1.0, ["X0", "Y2"], -2.0, ["Z1"]]
+    assert PauliHamiltonian.from_list(terms, num_qubits=5).num_qubits == 5
+    assert hamiltonian.constant == 0.5
+    np.testing.assert_array_equal(hamiltonian.identity_terms(), [True, False, False])
+
+
+def test_invalid_terms():
+    with pytest.raises(ValueError, match="Unknown Pauli"):
+        PauliHamiltonian.from_list([1.0, ["W0"]])
+    with pytest.raises(ValueError, match="alternate"):
+        PauliHamiltonian.from_list([1.0, ["X0"], 2.0])
+    with pytest.raises(ValueError, match="one row per term"):
+        PauliHamiltonian([[True]], [[False]], [1.0, 2.0])
+
+
+def test_arrays_read_only():
+    x = np.array([[True, False]])
+    hamiltonian = PauliHamiltonian(x, np.zeros_like(x), [1.0])
+    x[0, 1] = True
+    assert not hamiltonian.x[0, 1]
+    with pytest.raises(ValueError):
+        hamiltonian.coeffs[0] = 2.0
+
+
+def test_simplify():
+    hamiltonian = PauliHamiltonian.from_list(
+        [
+            1.0, ["Z0"],
+            0.5, [],
+            2.0, ["Z0"],
+            1.0, ["X1"],
+            -1.0, ["X1"],
+            0.25, [],
+            1e-9, ["Y0"],
+        ]
+    )
+    simplified = hamiltonian.simplify()
+    terms = dict(zip(map(tuple, simplified.to_list()[1::2]), simplified.to_list()[0::2]))
+    assert terms == {(): 0.75, ("Z0",): 3.0, ("Y0",): 1e-9}
+    assert simplified.num_qubits == 2
+    assert len(hamiltonian.simplify(atol=1e-6).to_list()) == 4
+
+
+def test_h2_groups():
+    hamiltonian = PauliHamiltonian.from_list(H2)
+    groups = hamiltonian.groups()
+    assert len(groups) == 2
+    assert groups is hamiltonian.groups()
+    z_group, x_group = groups
+    assert z_group.bases == "ZZ" and z_group.terms.tolist() == [1, 2, 3]
+    np.testing.assert_array_equal(z_group.masks, [[1, 0], [0, 1], [1, 1]])
+    np.testing.assert_allclose(z_group.coeffs, [0.397937, -0.397937, -0.011280])
+    assert x_group.bases == "XX" and x_group.terms.tolist() == [4]
+    assert x_group.qubits.tolist() == [0, 1]
+
+
+def test_groups_are_qubit_wise_commuting():
+    rng = np.random.default_rng(5)
+    labels = ["X", "Y", "Z", None]
+    terms = []
+    for _ in range(60):
+        paulis = rng.choice(4, size=5)
+        terms += [
+            float(rng.normal()),
+            [f"{labels[p]}{q}" for q, p in enumerate(paulis) if labels[p]],
+        ]
+    hamiltonian = PauliHamiltonian.from_list(terms, num_qubits=5)
+    grouped = sorted(t for group in hamiltonian.groups() for t in group.terms.tolist())
+    assert grouped == np.flatnonzero(~hamiltonian.identity_terms()).tolist()
+    for group in hamiltonian.groups():
+        for term in group.terms:
+            for qubit, basis in zip(group.qubits, group.bases):
+                x, z = hamiltonian.x[term, qubit], hamiltonian.z[term, qubit]
+                if x or z:
+                    assert basis == ("Y" if x and z else "X" if x else "Z")
+
+
+def test_measurement_circuits():
+    hamiltonian = PauliHamiltonian.from_list([1.0, ["Y0", "Z2"], 0.5, ["X1"]])
+    circuits = hamiltonian.measurement_circuits(FakeCircuit)
+    assert [circuit.gates for circuit in circuits] == [
+        [("sdg", 0), ("h", 0), ("h", 1), ("measure", [0, 1, 2], [0, 1, 2])],
+    ]
@@ -0,0 +1,75 @@
+"""Idempotent submissions and concurrent runs, against a flaky LocalRuntimeServer."""
+import pytest
+
+from quafu_runtime.rtexceptions.rtexceptions import (
+    ArgsException,
+    ProgramNotFoundException,
+)
+
+PROGRAM = """
+def run(task, userpub, params):
+    return params
+"""
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(client, monkeypatch):
+    monkeypatch.setattr(client, "_backoff_time", lambda factor, attempt: 0.0)
+
+
+def submissions(server):
+    return [request for request in server.requests if request[1] == "programs_run_deploy"]
+
+
+def test_lost_response_retried_creates_one_job(service, server, upload):
+    upload(PROGRAM, "prog")
+    server.lost_responses = 2
+    job = service.run(name="prog", params={"x": 1}, idempotency_key="key")
+    assert len(submissions(server)) == 3
+    assert list(server.jobs()) == [job.job_id()]
+    assert job.result(wait=True)["result"] == {"x": 1}
+
+    again = service.run(name="prog", params={"x": 1}, idempotency_key="key")
+    assert again.job_id() == job.job_id()
+    assert len(server.jobs()) == 1
+
+
+def test_lost_response_not_retried_without_retries(client, server, upload):
+    upload(PROGRAM, "prog")
+    server.lost_responses = 1
+    with pytest.raises(ConnectionError):
+        client.program_run(name="prog", idempotency_key="key", max_retries=0)
+    # The job was created, the retry with the same key returns it.
+    status, response = client.program_run(name="prog", idempotency_key="key")
+    assert status == 200
+    assert list(server.jobs()) == [response["data"]["job_id"]]
+
+
+def test_key_reused_with_another_payload(client, service, server, upload):
+    upload(PROGRAM, "prog")
+    service.run(name="prog", params={"x": 1}, idempotency_key="key")
+    status, _ = client.program_run(name="prog", params={"x": 2}, idempotency_key="key")
+    assert status == 422
+    with pytest.raises(ArgsException, match="already used"):
+        service.run(name="prog", params={"x": 2}, idempotency_key="key")
+    assert len(server.jobs()) == 1
+
+
+def test_run_many_keeps_order(service, server, upload):
+    upload(PROGRAM, "prog")
+    jobs = service.run_many(
+        [{"name": "prog", "params": {"i": i}} for i in range(10)], max_workers=4
+    )
+    assert [job.result(wait=True)["result"] for job in jobs] == [{"i": i} for i in range(10)]
+    assert len({job.job_id() for job in jobs}) == 10
+    assert len(server.jobs()) == 10
+
+
+def test_run_many_raises_first_error(service, server, upload):
+    upload(PROGRAM, "prog")
+    runs = [{"name": "prog", "params": {"i": i}} for i in range(3)]
+    runs.insert(1, {"name": "missing"})
+    with pytest.raises(ProgramNotFoundException):
+        service.run_many(runs)
+    # The other runs were submitted anyway.
+    assert len(server.jobs()) == 3
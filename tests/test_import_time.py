@@ -0,0 +1,64 @@
+"""Benchmark guarding the import time of quafu_runtime.
+
+Run it with pytest, or directly to print the measured import times::
+
+    python tests/test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must only be imported when needed.
+HEAVY_MODULES = ("requests", "urllib3", "websocket", "pyflakes", "numpy", "quafu")
+
+# Generous budget, a lazy import takes a few milliseconds.
+IMPORT_TIME_BUDGET = 0.1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import quafu_runtime
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_import(repeat: int = 5) -> dict:
+    """Import quafu_runtime in fresh interpreters.
+
+    Returns:
+        The best import time in seconds and the modules loaded by the import.
+    """
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _SCRIPT],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "QUAFU_RUNTIME_PROFILE": ""},
+        ).stdout
+        result = json.loads(out.splitlines()[-1])
+        if best is None or result["elapsed"] < best["elapsed"]:
+            best = result
+    return best
+
+
+def test_import_does_not_load_heavy_modules():
+    modules = set(measure_import(repeat=1)["modules"])
+    assert not [name for name in HEAVY_MODULES if name in modules]
+
+
+def test_import_time_budget():
+    assert measure_import()["elapsed"] < IMPORT_TIME_BUDGET
+
+
+if __name__ == "__main__":
+    result = measure_import()
+    loaded = [name for name in HEAVY_MODULES if name in result["modules"]]
+    print(f"import quafu_runtime: {result['elapsed'] * 1000:.2f} ms")
+    print(f"heavy modules loaded: {loaded or 'none'}")
@@ -0,0 +1,185 @@
+"""Interim results published on channels and streamed to a job callback."""
+import queue
+import time
+
+import pytest
+
+from quafu_runtime.job.decoder import ResultDecoder, unpack_interim
+from quafu_runtime.program.templates.userpub import CoalescingUserPub
+
+PROGRAM = """
+from quafu_runtime.program.templates.userpub import publish_channel
+
+def run(task, userpub, params):
+    userpub.publish(b"plain")
+    publish_channel(userpub, "progress", b"half")
+    publish_channel(userpub, "debug", b"state")
+    return None
+"""
+
+
+COALESCING = """
+import json
+
+from quafu_runtime.program.templates.userpub import CoalescingUserPub
+
+def run(task, userpub, params):
+    with CoalescingUserPub(userpub, max_delay=60.0) as pub:
+        for i in range(5):
+            pub.publish(f"{i}/5".encode(), topic="progress", channel="progress")
+            pub.publish(json.dumps({"energy": -i}).encode())
+        pub.publish(b"state", channel="debug")
+    return None
+"""
+
+
+class Collector:
+    """UserPub keeping the published messages."""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message.decode("utf-8"))
+
+
+class UpperDecoder(ResultDecoder):
+    @classmethod
+    def decode(cls, data):
+        return data.upper()
+
+
+def stream(job, messages, **kwargs):
+    """Feed messages to the streaming loop of a job and return what the callback got."""
+    received = []
+    result_queue = queue.Queue()
+    for message in messages:
+        result_queue.put(message)
+    result_queue.put(job._POISON_PILL)
+    if kwargs.get("with_channel"):
+        callback = lambda channel, data: received.append((channel, data))
+    else:
+        callback = received.append
+    job._stream_results(result_queue, callback, **kwargs)
+    return received
+
+
+def run_program(service, server, upload, source=PROGRAM):
+    upload(source, "interim")
+    job = service.run(name="interim")
+    job.result(wait=True)
+    return job, server.interim_results(job.job_id())
+
+
+def test_callback_gets_data_only_by_default(service, server, upload):
+    job, messages = run_program(service, server, upload)
+    assert stream(job, messages) == ["plain", "half", "state"]
+    assert stream(job, messages, channels=["progress"]) == ["half"]
+
+
+def test_callback_gets_channel_when_asked(service, server, upload):
+    job, messages = run_program(service, server, upload)
+    received = stream(
+        job,
+        messages,
+        channels=["default", "progress"],
+        decoders={"progress": UpperDecoder},
+        with_channel=True,
+    )
+    assert received == [("default", "plain"), ("progress", "HALF")]
+    assert stream(job, messages, with_channel=True)[-1] == ("debug", "state")
+
+
+def test_server_filters_channels(service, server, upload):
+    job, _ = run_program(service, server, upload)
+    messages = server.interim_results(job.job_id(), channels=["debug"])
+    assert stream(job, messages) == ["state"]
+
+
+def test_coalescing_batches_until_flushed():
+    collector = Collector()
+    with CoalescingUserPub(collector, max_delay=60.0) as pub:
+        for i in range(3):
+            pub.publish(f"m{i}".encode())
+        assert collector.messages == []
+        pub.flush()
+        assert [unpack_interim(m) for m in collector.messages] == [
+            ("default", ["m0", "m1", "m2"])
+        ]
+        pub.publish(b"alone")
+    assert collector.messages[-1] == "alone"
+    assert pub.stats == {"messages": 4, "batches": 2, "replaced": 0}
+
+
+def test_coalescing_sends_full_batches():
+    collector = Collector()
+    with CoalescingUserPub(collector, max_delay=60.0, max_batch=2) as pub:
+        pub.publish(b"m0")
+        pub.publish(b"m1")
+        deadline = time.monotonic() + 5.0
+        while not collector.messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Sent without waiting for max_delay.
+        assert [unpack_interim(m) for m in collector.messages] == [("default", ["m0", "m1"])]
+
+
+def test_coalescing_replaces_topics_and_groups_channels():
+    collector = Collector()
+    with CoalescingUserPub(collector, max_delay=60.0) as pub:
+        pub.publish(b"1/3", topic="progress", channel="progress")
+        pub.publish(b"a")
+        pub.publish(b"2/3", topic="progress", channel="progress")
+        pub.publish(b"b")
+        pub.publish(b"3/3", topic="progress", channel="progress")
+    assert [unpack_interim(m) for m in collector.messages] == [
+        ("progress", ["3/3"]),
+        ("default", ["a", "b"]),
+    ]
+    assert pub.stats["replaced"] == 2
+
+
+def test_coalesced_channels_filtered(service, server, upload):
+    job, messages = run_program(service, server, upload, COALESCING)
+    assert stream(job, messages, channels=["progress"]) == ["4/5"]
+    energies = stream(job, server.interim_results(job.job_id(), channels=["default"]))
+    assert energies == [{"energy": -i} for i in range(5)]
+    debug = stream(job, messages, channels=["debug"], with_channel=True)
+    assert debug == [("debug", "state")]
+
+
+class FailingOnce(Collector):
+    """UserPub failing to send the first message."""
+
+    def publish(self, message):
+        if not hasattr(self, "failed"):
+            self.failed = True
+            raise ConnectionError("websocket closed")
+        super().publish(message)
+
+
+def test_coalescing_survives_failed_batch():
+    collector = FailingOnce()
+    pub = CoalescingUserPub(collector, max_delay=0.0)
+    pub.publish(b"lost")
+    deadline = time.monotonic() + 5.0
+    while pub._error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(ConnectionError, match="websocket closed"):
+        pub.publish(b"first")
+    pub.publish(b"second")
+    pub.close()
+    # The thread kept sending after the failure.
+    assert collector.messages == ["second"]
+    assert pub._thread is not None and not pub._thread.is_alive()
+
+
+def test_coalescing_close_raises_failed_batch():
+    collector = FailingOnce()
+    pub = CoalescingUserPub(collector, max_delay=0.0)
+    pub.publish(b"lost")
+    deadline = time.monotonic() + 5.0
+    while pub._error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(ConnectionError):
+        pub.close()
+    pub.close()
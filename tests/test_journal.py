@@ -0,0 +1,58 @@
+"""Job journal and reattaching to journaled jobs."""
+import numpy as np
+import pytest
+
+from quafu_runtime.job.journal import JobJournal
+from quafu_runtime.utils.jsonutil import params_hash
+
+PROGRAM = """
+from quafu_runtime.utils.jsonutil import decode_params
+
+def run(task, userpub, params):
+    params = decode_params(params)
+    return {key: float(sum(params[key])) for key in sorted(params)}
+"""
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def test_reattach_restores_live_jobs(service, upload, journal_path):
+    upload(PROGRAM, "sums")
+    with JobJournal(journal_path) as journal:
+        job = service.run(name="sums", params={"x": [1, 2]}, journal=journal)
+
+    with JobJournal(journal_path) as journal:
+        (restored,) = service.reattach(journal, refresh=False)
+        assert restored.job_id() == job.job_id()
+        assert restored.result(wait=True)["result"] == {"x": 3.0}
+        assert journal.get(job.job_id()).result() == {"x": 3.0}
+        assert service.reattach(journal) == []
+
+
+def test_journal_decodes_params(service, upload, journal_path):
+    upload(PROGRAM, "sums")
+    with JobJournal(journal_path) as journal:
+        job = service.run(name="sums", params={"x": np.arange(3.0)}, journal=journal)
+        entry = journal.get(job.job_id())
+    assert isinstance(entry.params()["x"], np.ndarray)
+    np.testing.assert_array_equal(entry.params()["x"], [0.0, 1.0, 2.0])
+
+
+def test_reattach_resubmits_blob_run(server, make_service, upload, journal_path):
+    upload(PROGRAM, "sums")
+    base = {"h": np.array([0.5, 0.25])}
+    # A crash after journaling the submission, before the blob was uploaded.
+    with JobJournal(journal_path) as journal:
+        journal.record_submitting(
+            "key-1", None, "sums", None, {"x": [1, 2]}, params_hash(base), base
+        )
+
+    with JobJournal(journal_path) as journal:
+        (job,) = make_service().reattach(journal)
+        assert job is not None
+        assert job.result(wait=True)["result"] == {"h": 0.75, "x": 3.0}
+        assert journal.get(job.job_id()).finished
+    assert sum(1 for request in server.requests if request[1] == "blob_upload") == 1
@@ -0,0 +1,100 @@
+"""Typed params serializers of jsonutil."""
+import json
+from fractions import Fraction
+
+import numpy as np
+import pytest
+from quafu import QuantumCircuit
+
+from quafu_runtime.utils import jsonutil
+from quafu_runtime.utils.jsonutil import (
+    ParamsDecoder,
+    ParamsEncoder,
+    TYPE_KEY,
+    VALUE_KEY,
+    decode_params,
+    register_serializer,
+)
+
+
+def round_trip(params):
+    return decode_params(json.dumps(params, cls=ParamsEncoder))
+
+
+def test_arrays_round_trip():
+    arrays = {
+        "vector": np.arange(5, dtype=np.float64),
+        "matrix": np.asfortranarray(np.arange(6, dtype=np.int32).reshape(2, 3)),
+        "complex": np.array([1 + 2j, -0.5j]),
+        "empty": np.zeros((0, 3)),
+    }
+    decoded = round_trip(arrays)
+    for name, array in arrays.items():
+        assert decoded[name].dtype == array.dtype
+        np.testing.assert_array_equal(decoded[name], array)
+    assert decoded["matrix"].shape == (2, 3)
+
+
+def test_scalars_and_nesting():
+    params = {
+        "theta": np.float32(0.5),
+        "steps": np.int64(3),
+        "amplitudes": [1j, {"inner": 2 - 1j}],
+        "plain": [1, "a", None],
+    }
+    encoded = json.loads(json.dumps(params, cls=ParamsEncoder))
+    assert encoded["theta"] == 0.5 and encoded["steps"] == 3
+    assert encoded["amplitudes"][0] == {TYPE_KEY: "complex", VALUE_KEY: [0.0, 1.0]}
+    assert decode_params(encoded) == {
+        "theta": 0.5,
+        "steps": 3,
+        "amplitudes": [1j, {"inner": 2 - 1j}],
+        "plain": [1, "a", None],
+    }
+
+
+def test_circuit_round_trip():
+    circuit = QuantumCircuit(2)
+    circuit.h(0)
+    circuit.cnot(0, 1)
+    decoded = round_trip({"circuit": circuit})["circuit"]
+    assert isinstance(decoded, QuantumCircuit)
+    assert decoded.num == 2
+    assert decoded.to_openqasm() == circuit.to_openqasm()
+
+
+def test_unknown_and_partial_objects_kept():
+    unknown = {TYPE_KEY: "unknown", VALUE_KEY: 1}
+    extra = {TYPE_KEY: "complex", VALUE_KEY: [1, 0], "other": True}
+    assert decode_params({"a": unknown, "b": extra}) == {"a": unknown, "b": extra}
+    assert json.loads(json.dumps([unknown]), cls=ParamsDecoder) == [unknown]
+    with pytest.raises(TypeError):
+        json.dumps({"value": object()}, cls=ParamsEncoder)
+
+
+@pytest.fixture
+def restore_registry():
+    encoders, decoders = list(jsonutil._ENCODERS), dict(jsonutil._DECODERS)
+    yield
+    jsonutil._ENCODERS[:] = encoders
+    jsonutil._DECODERS.clear()
+    jsonutil._DECODERS.update(decoders)
+
+
+def test_register_serializer(restore_registry):
+    register_serializer(
+        "Fraction",
+        lambda obj: isinstance(obj, Fraction),
+        lambda obj: [obj.numerator, obj.denominator],
+        lambda value: Fraction(*value),
+    )
+    assert round_trip({"ratio": Fraction(3, 4)}) == {"ratio": Fraction(3, 4)}
+
+    # Registering a name again replaces its serializer.
+    register_serializer(
+        "Fraction", lambda obj: isinstance(obj, Fraction), str, Fraction
+    )
+    encoded = json.loads(json.dumps(Fraction(1, 3), cls=ParamsEncoder))
+    assert encoded == {TYPE_KEY: "Fraction", VALUE_KEY: "1/3"}
+    assert decode_params(encoded) == Fraction(1, 3)
+    assert [entry[0] for entry in jsonutil._ENCODERS].count("Fraction") == 1
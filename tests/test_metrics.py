@@ -0,0 +1,104 @@
+"""Per-endpoint request metrics of the runtime client."""
+import pytest
+
+from quafu_runtime.clients.metrics import RequestMetrics
+from quafu_runtime.utils.jsonutil import canonical_json, params_hash
+
+
+def test_aggregates_per_endpoint():
+    metrics = RequestMetrics(buckets=(0.1, 1.0))
+    metrics.record("job_status", "GET", 0.05, 200, response_bytes=10)
+    metrics.record("job_status", "GET", 0.5, 503, retry=True)
+    metrics.record("job_status", "GET", 2.0, None, retry=True)
+    metrics.record("blob_upload", "POST", 0.01, 200, request_bytes=100)
+
+    status = metrics.endpoint("job_status")
+    assert status["calls"] == 3
+    assert status["errors"] == 1
+    assert status["retries"] == 2
+    assert status["response_bytes"] == 10
+    assert status["status_codes"] == {200: 1, 503: 1}
+    assert status["latency_sum"] == pytest.approx(2.55)
+    assert status["histogram"] == [(0.1, 1), (1.0, 2), (float("inf"), 3)]
+    assert metrics.snapshot()["blob_upload"]["request_bytes"] == 100
+    assert metrics.endpoint("job_cancel") is None
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_percentiles_interpolated_in_buckets():
+    metrics = RequestMetrics(buckets=(0.1, 1.0))
+    assert metrics.endpoint("job_status") is None
+    for _ in range(8):
+        metrics.record("job_status", "GET", 0.05, 200)
+    for _ in range(2):
+        metrics.record("job_status", "GET", 0.5, 200)
+    status = metrics.endpoint("job_status")
+    assert status["latency_p50"] == pytest.approx(0.1 * 5 / 8)
+    assert status["latency_p90"] == pytest.approx(0.1 + 0.9 * 1 / 2)
+    assert status["latency_p99"] == pytest.approx(0.1 + 0.9 * 1.9 / 2)
+
+    metrics.record("slow", "GET", 5.0, 200)
+    # Above the largest bound, the largest bound is the best estimate.
+    assert metrics.endpoint("slow")["latency_p50"] == 1.0
+
+
+def test_prometheus_text():
+    metrics = RequestMetrics(buckets=(0.1,))
+    metrics.record("job_status", "GET", 0.05, 200, request_bytes=3, response_bytes=7)
+    metrics.record("job_status", "GET", 0.25, None, retry=True)
+    lines = metrics.to_prometheus(prefix="rt").splitlines()
+    assert lines[:2] == [
+        "# HELP rt_requests_total Requests sent per endpoint and status code.",
+        "# TYPE rt_requests_total counter",
+    ]
+    for line in (
+        'rt_requests_total{endpoint="job_status",code="200"} 1',
+        'rt_requests_total{endpoint="job_status",code="error"} 1',
+        'rt_retries_total{endpoint="job_status"} 1',
+        'rt_request_bytes_total{endpoint="job_status"} 3',
+        'rt_response_bytes_total{endpoint="job_status"} 7',
+        "# TYPE rt_request_latency_seconds histogram",
+        'rt_request_latency_seconds_bucket{endpoint="job_status",le="0.1"} 1',
+        'rt_request_latency_seconds_bucket{endpoint="job_status",le="+Inf"} 2',
+        'rt_request_latency_seconds_sum{endpoint="job_status"} 0.3',
+        'rt_request_latency_seconds_count{endpoint="job_status"} 2',
+    ):
+        assert line in lines
+
+
+def test_hooks_get_records_and_failures_are_ignored():
+    metrics = RequestMetrics()
+    records = []
+
+    def failing(record):
+        raise ValueError("broken hook")
+
+    metrics.add_hook(failing)
+    metrics.add_hook(records.append)
+    metrics.record("job_status", "GET", 0.01, 200, retry=True)
+    metrics.remove_hook(records.append)
+    metrics.record("job_status", "GET", 0.01, 200)
+    assert records == [
+        {
+            "endpoint": "job_status",
+            "method": "GET",
+            "latency": 0.01,
+            "status_code": 200,
+            "request_bytes": 0,
+            "response_bytes": 0,
+            "retry": True,
+        }
+    ]
+    assert metrics.endpoint("job_status")["calls"] == 2
+
+
+def test_client_counts_request_bytes(client):
+    data = {"name": "énergie", "coefficients": [0.5, -1.0]}
+    client.blob_upload(data)
+    body = '{"hash":"%s","data":%s}' % (params_hash(data), canonical_json(data))
+    assert len(body.encode("utf-8")) > len(body)
+    assert client.metrics.endpoint("blob_upload")["request_bytes"] == len(
+        body.encode("utf-8")
+    )
@@ -0,0 +1,83 @@
+"""ParametricCircuit templates, against the circuits of the builder."""
+import numpy as np
+import pytest
+from quafu import QuantumCircuit
+
+from quafu_runtime.program.templates.parametric import BoundCircuit, ParametricCircuit
+
+
+def ansatz(theta):
+    qc = QuantumCircuit(3)
+    qc.ry(0, theta[0])
+    qc.cnot(0, 1)
+    qc.rz(1, theta[2])
+    qc.rx(2, 0.25)
+    qc.ry(2, theta[0])
+    qc.rz(0, theta[1])
+    qc.measure([0, 1, 2], cbits=[0, 1, 2])
+    return qc
+
+
+def test_qasm_matches_builder():
+    template = ParametricCircuit(ansatz, num_params=3)
+    assert template.num_qubits == 3
+    rng = np.random.default_rng(0)
+    for theta in [np.zeros(3), np.array([np.pi, -0.5, 1e-12]), *rng.normal(size=(5, 3))]:
+        assert template.qasm(theta) == ansatz(theta).to_openqasm()
+        assert template.circuit(theta).to_openqasm() == template.qasm(theta)
+
+
+def test_bound_circuits():
+    template = ParametricCircuit(ansatz, num_params=3)
+    points = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+    bound = template.bind_many(points)
+    assert all(isinstance(circuit, BoundCircuit) for circuit in bound)
+    assert [circuit.to_openqasm() for circuit in bound] == [
+        ansatz(point).to_openqasm() for point in points
+    ]
+    np.testing.assert_array_equal(bound[1].values, points[1])
+    assert bound[0].num == 3
+    assert [gate.name for gate in bound[0].gates] == [
+        gate.name for gate in ansatz(points[0]).gates
+    ]
+    with pytest.raises(ValueError, match="Expected 3 parameters, got 2"):
+        template.bind([0.1, 0.2])
+
+
+def test_rejects_structure_depending_on_parameters():
+    calls = []
+
+    def build(theta):
+        calls.append(theta)
+        qc = QuantumCircuit(2)
+        qc.ry(0, theta[0])
+        if len(calls) > 1:
+            qc.cnot(0, 1)
+        return qc
+
+    with pytest.raises(ValueError, match="structure of the circuit"):
+        ParametricCircuit(build, num_params=1)
+
+
+def test_rejects_measures_depending_on_parameters():
+    calls = []
+
+    def build(theta):
+        calls.append(theta)
+        qc = QuantumCircuit(2)
+        qc.ry(0, theta[0])
+        qc.measure([len(calls) - 1], cbits=[0])
+        return qc
+
+    with pytest.raises(ValueError, match="structure of the circuit"):
+        ParametricCircuit(build, num_params=1)
+
+
+def test_rejects_derived_angles():
+    def build(theta):
+        qc = QuantumCircuit(1)
+        qc.ry(0, 2 * theta[0])
+        return qc
+
+    with pytest.raises(ValueError, match="parameters or constants"):
+        ParametricCircuit(build, num_params=1)
@@ -0,0 +1,52 @@
+"""Base params uploaded once as blobs and shared by runs."""
+import pytest
+
+from quafu_runtime.rtexceptions.rtexceptions import InputValueException
+from quafu_runtime.utils.jsonutil import params_hash
+
+PROGRAM = """
+def run(task, userpub, params):
+    return params
+"""
+
+BASE = {"hamiltonian": [[1.0, "Z0"], [0.5, "X0"]], "shots": 100}
+
+
+def uploads(server):
+    return sum(1 for _, identifier in server.requests if identifier == "blob_upload")
+
+
+def test_blob_uploaded_once(service, server, upload):
+    upload(PROGRAM, "echo")
+    first = service.run(name="echo", base_params=BASE, params={"theta": 0.1})
+    second = service.run(name="echo", base_params=BASE, params={"theta": 0.2})
+    assert first.result(wait=True)["result"] == {**BASE, "theta": 0.1}
+    assert second.result(wait=True)["result"] == {**BASE, "theta": 0.2}
+    assert uploads(server) == 1
+
+
+def test_blob_uploaded_again_when_dropped(service, server, upload):
+    upload(PROGRAM, "echo")
+    service.run(name="echo", base_params=BASE).result(wait=True)
+    # The server expired the blob, the client still believes it is there.
+    server._blobs.clear()
+
+    job = service.run(name="echo", base_params=BASE, params={"theta": 0.3})
+    assert job.result(wait=True)["result"] == {**BASE, "theta": 0.3}
+    assert uploads(server) == 2
+    runs = [request for request in server.requests if request[1] == "programs_run_deploy"]
+    assert len(runs) == 3
+
+
+def test_unknown_blob_without_base_params(service, server, upload):
+    upload(PROGRAM, "echo")
+    with pytest.raises(InputValueException, match="blob not found"):
+        service._submit(
+            program_id=None,
+            name="echo",
+            backend=None,
+            params=None,
+            max_retries=0,
+            idempotency_key=None,
+            params_blob=params_hash(BASE),
+        )
@@ -0,0 +1,107 @@
+"""In-program profiler and its client-side decoder."""
+import threading
+
+import pytest
+
+from quafu_runtime.program.templates.profiler import (
+    ProfileDecoder,
+    ProgramProfile,
+    ProgramProfiler,
+    SectionStats,
+)
+
+
+class Collector:
+    """UserPub keeping the published messages."""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message.decode("utf-8"))
+
+
+def test_periodic_publish_claimed_once():
+    collector = Collector()
+    profiler = ProgramProfiler(collector, publish_interval=3600.0)
+    profiler._last_publish -= 7200.0
+    barrier = threading.Barrier(8)
+
+    def record():
+        barrier.wait()
+        profiler.record("step", 0.01)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(collector.messages) == 1
+    assert profiler.profile().sections["step"].count == 8
+
+
+class FakeTask:
+    def send(self, circuit, wait=True):
+        return f"sent {circuit}"
+
+    def name(self):
+        return "task"
+
+    backend = "py_simu"
+
+
+def test_profile_round_trip():
+    collector = Collector()
+    profiler = ProgramProfiler(collector, publish_interval=None)
+    task = profiler.wrap_task(FakeTask())
+    assert task.send("qc") == "sent qc"
+    assert task.send("qc", wait=False) == "sent qc"
+    # Other attributes are not timed.
+    assert task.name() == "task" and task.backend == "py_simu"
+    with profiler.section("build"):
+        pass
+    profiler.record("build", 0.5)
+    profiler.publish()
+
+    assert len(collector.messages) == 1
+    profile = ProfileDecoder.decode(collector.messages[0])
+    assert isinstance(profile, ProgramProfile)
+    assert profile.final
+    assert set(profile.sections) == {"task.send", "build"}
+    assert profile.sections["task.send"].count == 2
+    assert profile.sections["build"].count == 2
+    assert profile.sections["build"].max == 0.5
+    assert profile.sections["build"].total == pytest.approx(0.5, abs=0.01)
+    assert profile.wall_time >= 0.0
+
+    again = ProgramProfile.from_dict(profile.to_dict())
+    assert again.to_dict() == profile.to_dict()
+    assert "build" in str(again)
+
+
+def test_profile_fractions():
+    profile = ProgramProfile(
+        2.0, {"a": SectionStats(2, 1.0, 0.75), "b": SectionStats(1, 0.5, 0.5)}
+    )
+    assert profile.fraction("a") == 0.5
+    assert profile.fraction("missing") == 0.0
+    assert profile.unaccounted() == 0.5
+    assert profile.sections["a"].mean == 0.5
+    lines = str(profile).splitlines()
+    assert lines[0] == "Program wall time: 2.000s"
+    assert [line.split()[0] for line in lines[2:]] == ["a", "b"]
+
+
+def test_decoder_passes_other_messages():
+    assert ProfileDecoder.decode('{"energy": -1.0}') == {"energy": -1.0}
+    assert ProfileDecoder.decode("plain text") == "plain text"
+
+
+def test_periodic_publish():
+    collector = Collector()
+    profiler = ProgramProfiler(collector, publish_interval=0.0)
+    profiler.record("step", 0.01)
+    profiler.record("step", 0.01)
+    profiles = [ProfileDecoder.decode(message) for message in collector.messages]
+    assert [profile.final for profile in profiles] == [False, False]
+    assert [profile.sections["step"].count for profile in profiles] == [1, 2]
@@ -0,0 +1,77 @@
+"""Opt-in profiling of client operations."""
+import pstats
+import time
+
+import pytest
+
+from quafu_runtime import RuntimeService, profiling
+
+PROGRAM = """
+def run(task, userpub, params):
+    return params
+"""
+
+
+def test_profile_captures_outer_operations(service, upload, tmp_path):
+    upload(PROGRAM, "prog")
+    run = RuntimeService.run
+    with profiling.profile() as prof:
+        assert RuntimeService.run is not run
+        job = service.run(name="prog", params={"x": 1})
+        job.result(wait=True)
+    assert RuntimeService.run is run
+
+    operations = prof.operations()
+    assert operations["RuntimeService.run"]["calls"] == 1
+    assert operations["RuntimeJob.result"]["calls"] == 1
+    # Client calls made by the service are part of the service operation.
+    assert "RuntimeClient.program_run" not in operations
+    for operation in operations.values():
+        assert set(operation["categories"]) == set(profiling.CATEGORIES)
+    assert isinstance(prof.stats("RuntimeService.run"), pstats.Stats)
+    assert prof.stats("RuntimeService.upload_program") is None
+
+    lines = prof.report().splitlines()
+    assert lines[0].split() == ["operation", "calls", "wall(s)", *profiling.CATEGORIES]
+    assert lines[2].startswith("RuntimeJob.result")
+    assert lines[3].startswith("RuntimeService.run")
+    assert lines[-1].split()[0] == "total"
+    assert len(lines[-1].split()) == len(profiling.CATEGORIES) + 1
+
+    paths = prof.dump(str(tmp_path / "profiles"))
+    assert sorted(path.rsplit("/", 1)[-1] for path in paths) == [
+        "RuntimeJob.result.prof",
+        "RuntimeService.run.prof",
+    ]
+
+
+def test_callbacks_timed_apart():
+    def interim_results(job, callback=None):
+        callback("message")
+
+    wrapped = profiling._wrap("RuntimeJob.interim_results", interim_results)
+    received = []
+    with profiling.profile() as prof:
+        wrapped(None, callback=lambda message: (time.sleep(0.01), received.append(message)))
+    assert received == ["message"]
+    assert prof.operations()["RuntimeJob.interim_results"]["calls"] == 1
+    assert prof.summary()["callbacks"] >= 0.01
+
+
+def test_one_profile_at_a_time():
+    with profiling.profile():
+        with pytest.raises(RuntimeError, match="already active"):
+            profiling.start()
+    assert profiling.stop() is None
+
+
+def test_enable_from_env(monkeypatch):
+    monkeypatch.setenv(profiling.ENV_VAR, "0")
+    assert profiling.enable_from_env() is None
+    monkeypatch.setenv(profiling.ENV_VAR, "1")
+    monkeypatch.setattr(profiling.atexit, "register", lambda *args: None)
+    prof = profiling.enable_from_env()
+    try:
+        assert isinstance(prof, profiling.Profile)
+    finally:
+        assert profiling.stop() is prof
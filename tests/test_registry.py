@@ -0,0 +1,32 @@
+"""Shared clients and accounts of the registry."""
+import pytest
+
+from quafu_runtime import Account
+from quafu_runtime.clients import registry
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    registry.clear()
+    yield tmp_path
+    registry.clear()
+
+
+def test_saved_account_follows_saved_token():
+    Account(api_token="first").save_api_token("first")
+    assert registry.get_account().get_token() == "first"
+    assert registry.get_account() is registry.get_account()
+
+    Account(api_token="second").save_api_token("second")
+    assert registry.get_account().get_token() == "second"
+
+
+def test_clear_closes_clients():
+    client = registry.get_client("token", "http://local")
+    generation, session = client._checkout_session()
+    client._checkin_session(generation, session)
+    assert client.open_sessions == 1
+    registry.clear()
+    assert client.open_sessions == 0
+    assert registry.get_client("token", "http://local") is not client
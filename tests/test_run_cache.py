@@ -0,0 +1,80 @@
+"""Tests of the run cache of RuntimeService, against LocalRuntimeServer."""
+from quafu_runtime.job.cache import CachePolicy, RunCache
+
+ECHO = """
+def run(task, userpub, params):
+    return {"program": "%s", "params": params}
+"""
+
+
+def test_cache_hit_returns_completed_job(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    program_id = upload(ECHO % "a", "a", target=service)
+    first = service.run(program_id=program_id, params={"x": 1})
+    result = first.result(wait=True)["result"]
+    second = service.run(program_id=program_id, params={"x": 1})
+    assert second.job_id() == first.job_id()
+    assert second.result(wait=True)["result"] == result
+    assert len(server.jobs()) == 1
+
+
+def test_cache_keys_params_and_bypass(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    program_id = upload(ECHO % "a", "a", target=service)
+    service.run(program_id=program_id, params={"x": 1}).result(wait=True)
+    other = service.run(program_id=program_id, params={"x": 2})
+    assert other.result(wait=True)["result"]["params"] == {"x": 2}
+    service.run(program_id=program_id, params={"x": 1}, use_cache=False).result(wait=True)
+    assert len(server.jobs()) == 3
+
+
+def test_cache_skips_non_deterministic_backends(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    program_id = upload(ECHO % "a", "a", backend="ScQ-P18", target=service)
+    service.run(program_id=program_id, params={"x": 1}).result(wait=True)
+    service.run(program_id=program_id, params={"x": 1}).result(wait=True)
+    assert len(server.jobs()) == 2
+
+
+def test_cache_policy_per_program(make_service, upload, server):
+    cache = RunCache()
+    service = make_service(run_cache=cache)
+    program_id = upload(ECHO % "a", "a", target=service)
+    cache.set_policy("a", CachePolicy(enabled=False))
+    service.run(program_id=program_id, params={"x": 1}).result(wait=True)
+    service.run(program_id=program_id, params={"x": 1}).result(wait=True)
+    assert len(server.jobs()) == 2
+
+
+def test_programs_differing_only_by_name(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    upload(ECHO % "a", "a", target=service)
+    upload(ECHO % "b", "b", target=service)
+    first = service.run(name="a", params={"x": 1}).result(wait=True)["result"]
+    second = service.run(name="b", params={"x": 1}).result(wait=True)["result"]
+    assert first["program"] == "a"
+    assert second["program"] == "b"
+    assert len(server.jobs()) == 2
+
+
+def test_name_resolved_once(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    upload(ECHO % "a", "a", target=service)
+    for x in range(3):
+        service.run(name="a", params={"x": x}).result(wait=True)
+    lookups = [r for r in server.requests if r[1] == "program"]
+    assert len(lookups) == 1
+
+
+def test_cache_hit_with_base_params(make_service, upload, server):
+    service = make_service(run_cache=RunCache())
+    program_id = upload(ECHO % "a", "a", target=service)
+    base = {"H": [1, 2, 3]}
+    first = service.run(program_id=program_id, base_params=base, params={"a": 3})
+    first.result(wait=True)
+    second = service.run(program_id=program_id, base_params=base, params={"a": 3})
+    assert second.job_id() == first.job_id()
+    assert second.params == first.params == {"H": [1, 2, 3], "a": 3}
+    other = service.run(program_id=program_id, base_params={"H": [4]}, params={"a": 3})
+    assert other.job_id() != first.job_id()
+    assert len(server.jobs()) == 2
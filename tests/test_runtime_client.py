@@ -0,0 +1,55 @@
+"""RuntimeClient sessions, retries and metrics, against LocalRuntimeServer."""
+import threading
+
+from quafu_runtime.clients.runtime_client import RuntimeClient
+
+from conftest import TOKEN
+
+
+class CountingSessions:
+    """Session factory counting the sessions created and closed."""
+
+    def __init__(self, server):
+        self.server = server
+        self.created = 0
+        self.closed = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        counter = self
+        session = self.server.session()
+        close = session.close
+
+        def closing():
+            with counter._lock:
+                counter.closed += 1
+            close()
+
+        session.close = closing
+        with self._lock:
+            self.created += 1
+        return session
+
+
+def test_sessions_pooled_across_threads(server):
+    sessions = CountingSessions(server)
+    client = RuntimeClient(TOKEN, "http://local", max_connections=4, session_factory=sessions)
+    barrier = threading.Barrier(10)
+
+    def request():
+        barrier.wait()
+        client.program_get(name="missing")
+
+    for _ in range(5):
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # 50 short-lived threads, never more sessions than requests in flight.
+    assert sessions.created <= 4
+    assert client.open_sessions == sessions.created - sessions.closed <= 4
+    client.close()
+    assert client.open_sessions == 0
+    assert sessions.closed == sessions.created
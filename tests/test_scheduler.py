@@ -0,0 +1,126 @@
+"""JobScheduler priorities and caps, against a LocalRuntimeServer running no job."""
+import time
+
+import pytest
+
+from quafu_runtime.clients.local_runtime import LocalRuntimeServer
+from quafu_runtime.job.scheduler import JobScheduler
+
+PROGRAM = """
+def run(task, userpub, params):
+    return params
+"""
+
+
+@pytest.fixture
+def server():
+    # Jobs stay queued on the server until cancelled, so they stay in flight.
+    return LocalRuntimeServer(execute=False)
+
+
+@pytest.fixture
+def scheduler_factory(service):
+    schedulers = []
+
+    def make(**kwargs):
+        scheduler = JobScheduler(service, poll_interval=0.02, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown(wait=False, cancel_queued=True)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def submitted(runs):
+    return [run for run in runs if run.future.done()]
+
+
+def test_backend_cap_releases_runs_as_jobs_finish(upload, scheduler_factory):
+    upload(PROGRAM, "prog")
+    scheduler = scheduler_factory(backend_limits={"py_simu": 2})
+    runs = [
+        scheduler.submit(name="prog", backend="py_simu", params={"i": i}) for i in range(5)
+    ]
+    wait_for(lambda: len(submitted(runs)) == 2)
+    time.sleep(0.05)
+    assert len(submitted(runs)) == 2
+    assert scheduler.queue_depth() == 3
+
+    runs[0].job().cancel()
+    wait_for(lambda: len(submitted(runs)) == 3)
+    assert scheduler.stats()["in_flight_per_backend"] == {"py_simu": 2}
+
+
+def test_higher_priority_runs_first(upload, scheduler_factory):
+    upload(PROGRAM, "prog")
+    scheduler = scheduler_factory(backend_limits={"py_simu": 1})
+    first = scheduler.submit(name="prog", backend="py_simu", params={"run": "first"})
+    wait_for(lambda: first.future.done())
+    low = scheduler.submit(name="prog", backend="py_simu", params={"run": "low"}, priority=0)
+    high = scheduler.submit(name="prog", backend="py_simu", params={"run": "high"}, priority=5)
+    same = scheduler.submit(name="prog", backend="py_simu", params={"run": "same"}, priority=5)
+
+    first.job().cancel()
+    wait_for(lambda: high.future.done())
+    assert not low.future.done() and not same.future.done()
+    high.job().cancel()
+    wait_for(lambda: same.future.done())
+    assert not low.future.done()
+
+
+def test_capped_program_does_not_block_others(upload, scheduler_factory):
+    upload(PROGRAM, "capped")
+    upload(PROGRAM, "free")
+    scheduler = scheduler_factory(program_limits={"capped": 1})
+    capped = [scheduler.submit(name="capped", priority=9) for _ in range(3)]
+    free = [scheduler.submit(name="free") for _ in range(2)]
+    wait_for(lambda: len(submitted(free)) == 2)
+    assert len(submitted(capped)) == 1
+
+    capped[0].job().cancel()
+    wait_for(lambda: len(submitted(capped)) == 2)
+
+
+def test_program_cap_shared_by_id_and_name(upload, scheduler_factory):
+    program_id = upload(PROGRAM, "prog")
+    scheduler = scheduler_factory(program_limits={"prog": 1})
+    runs = [
+        scheduler.submit(program_id=program_id),
+        scheduler.submit(name="prog"),
+        scheduler.submit(program_id=program_id),
+    ]
+    wait_for(lambda: len(submitted(runs)) == 1)
+    time.sleep(0.05)
+    assert len(submitted(runs)) == 1
+    assert scheduler.stats()["queued_per_program"] == {program_id: 2}
+
+
+def test_program_resolved_once(service, upload, scheduler_factory, monkeypatch):
+    program_id = upload(PROGRAM, "prog")
+    lookups = []
+    resolve_program = service.resolve_program
+
+    def counting(*args):
+        lookups.append(args)
+        return resolve_program(*args)
+
+    monkeypatch.setattr(service, "resolve_program", counting)
+    scheduler = scheduler_factory(backend_limits={"py_simu": 2})
+    runs = [scheduler.submit(name="prog", backend="py_simu") for _ in range(3)]
+    runs.append(scheduler.submit(program_id=program_id, backend="py_simu"))
+    # The service has no run cache, so only the scheduler looks programs up.
+    assert lookups == [(None, "prog"), (program_id, None)]
+
+    wait_for(lambda: len(submitted(runs)) == 2)
+    for run in submitted(runs):
+        run.job().cancel()
+    wait_for(lambda: scheduler.stats()["completed"] == 2)
+    wait_for(lambda: len(submitted(runs)) == 4)
@@ -0,0 +1,19 @@
+"""Shot allocation across measurement groups."""
+import pytest
+
+from quafu_runtime.program.hamiltonian import PauliHamiltonian
+from quafu_runtime.program.shots import ShotAllocator, allocate_shots
+
+
+def test_allocate_shots_proportional_with_floor():
+    assert allocate_shots([3.0, 1.0], 400).tolist() == [300, 100]
+    assert allocate_shots([5.0, 1e-9, 1e-9], 100, 1).tolist() == [98, 1, 1]
+
+
+@pytest.mark.parametrize("min_shots", [0, -1])
+def test_min_shots_must_be_positive(min_shots):
+    with pytest.raises(ValueError, match="min_shots"):
+        allocate_shots([1.0, 1.0], 100, min_shots)
+    hamiltonian = PauliHamiltonian.from_list([1.0, ["Z0"], 0.5, ["X0"]])
+    with pytest.raises(ValueError, match="min_shots"):
+        ShotAllocator(hamiltonian, total_shots=100, min_shots=min_shots)
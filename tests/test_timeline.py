@@ -0,0 +1,75 @@
+"""Client-measured job timelines: queueing, execution and result transfer."""
+import time
+
+import pytest
+
+from quafu_runtime.clients.local_runtime import LocalRuntimeServer
+from quafu_runtime.job.timeline import JobTimeline, TimelineSummary
+
+SLEEP = """
+import time
+
+def run(task, userpub, params):
+    time.sleep(params["seconds"])
+    return params["seconds"]
+"""
+
+
+@pytest.fixture
+def server():
+    # One program at a time, so a second job waits queued.
+    return LocalRuntimeServer(max_workers=1)
+
+
+def test_result_wait_separates_queue_run_and_fetch(service, upload):
+    upload(SLEEP, "sleep")
+    blocker = service.run(name="sleep", params={"seconds": 0.3})
+    job = service.run(name="sleep", params={"seconds": 0.2})
+    job.result(wait=True, poll_interval=0.01)
+    blocker.result(wait=True)
+
+    timeline = job.timeline()
+    assert timeline.queue_time() >= 0.2
+    assert 0.15 <= timeline.run_time() < 0.5
+    assert timeline.result_fetch_time() < 0.05
+    assert timeline.total_time() == pytest.approx(
+        timeline.queue_time() + timeline.run_time() + timeline.result_fetch_time(),
+        abs=0.05,
+    )
+    # The blocker finished before its result was asked, it was never seen running.
+    stats = TimelineSummary([job, blocker]).stats()
+    assert stats["queue_time"]["count"] == stats["run_time"]["count"] == 1
+    assert stats["result_fetch_time"]["count"] == 2
+
+
+def test_long_poll_wait_not_counted_as_fetch(service, upload):
+    upload(SLEEP, "sleep")
+    job = service.run(name="sleep", params={"seconds": 0.2})
+    time.sleep(0.05)
+    job.result(wait=True, poll_interval=None)
+    timeline = job.timeline()
+    assert timeline.get("final") - timeline.get("submitted") >= 0.15
+    assert timeline.result_fetch_time() < 0.05
+
+
+def test_finished_job_never_seen_running(service, upload, server):
+    upload(SLEEP, "sleep")
+    job = service.run(name="sleep", params={"seconds": 0.0})
+    server.jobs()[job.job_id()]["done"].wait()
+    assert job.result(wait=True)["result"] == 0.0
+    timeline = job.timeline()
+    assert timeline.run_time() is None
+    assert timeline.result_fetch_time() < 0.05
+    assert timeline.total_time() is not None
+
+
+def test_timeline_marks_first_time_only():
+    timeline = JobTimeline()
+    timeline.mark("submitted", 1.0)
+    timeline.mark("running", 3.0)
+    timeline.mark("running", 4.0)
+    timeline.mark("final", 6.0)
+    assert timeline.queue_time() == 2.0
+    assert timeline.run_time() == 3.0
+    with pytest.raises(ValueError):
+        timeline.mark("unknown")